@@ -0,0 +1,160 @@
+"""On-disk store of finished backtests, shared by the API and the scripts.
+
+evaluate_performance.py, defense_overlay.py and parameter_sweep.py all start
+with the same full-history run_backtest, and the API runs it again after
+every restart. An ArtifactStore keeps each finished backtest under a key
+made of the request, the engine's data_version and its config fingerprint
+(see app/cache.py), so any of them can load it instead of recomputing:
+
+    <root>/<key>/manifest.json   request, versions, the result minus its series
+    <root>/<key>/curves.parquet  dates, portfolio and SPY equity curves
+    <root>/<key>/daily.parquet   strategy (pre-overlay) and SPY daily returns
+    <root>/<key>/weights.parquet weights held from each rebalance date
+
+Entries are written to a temporary directory and renamed into place, so
+readers (other processes included) never see a half-written artifact. The
+least recently used entries beyond ARTIFACT_MAX_ENTRIES are pruned.
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from app.cache import request_key
+from app.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+# "" disables the store (the API then only keeps its in-memory cache).
+ARTIFACT_DIR = os.environ.get(
+    "BL_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "artifacts")
+)
+ARTIFACT_MAX_ENTRIES = int(os.environ.get("BL_ARTIFACT_MAX_ENTRIES", "64"))
+MANIFEST = "manifest.json"
+SERIES_KEYS = ("dates", "portfolio", "spy")
+
+
+class ArtifactStore:
+    """Directory of backtest artifacts keyed by request / data / config."""
+
+    def __init__(self, root=ARTIFACT_DIR, max_entries=ARTIFACT_MAX_ENTRIES):
+        self.root = root
+        self.max_entries = max_entries
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    @timed("artifact_load")
+    def load(self, key):
+        """(result, frames) for ``key``, or None if absent or unreadable."""
+        folder = self.path(key)
+        manifest_path = os.path.join(folder, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            curves = pd.read_parquet(os.path.join(folder, "curves.parquet"))
+            frames = {name: pd.read_parquet(os.path.join(folder, f"{name}.parquet")) for name in manifest["frames"]}
+        except Exception as e:
+            logger.warning("Ignoring unreadable artifact %s: %s", key, e)
+            return None
+        os.utime(manifest_path)  # recently used: pruned last
+        result = dict(manifest["result"])
+        result["dates"] = np.asarray(curves.index, dtype="datetime64[D]").astype(str).tolist()
+        result["portfolio"] = curves["portfolio"].tolist()
+        result["spy"] = curves["spy"].tolist()
+        return result, frames
+
+    @timed("artifact_save")
+    def save(self, key, result, frames, request=None, meta=None):
+        """Write one artifact atomically (a concurrent writer of the same key wins harmlessly)."""
+        folder = self.path(key)
+        if os.path.exists(folder):
+            return
+        tmp = os.path.join(self.root, f".tmp-{key}-{uuid.uuid4().hex[:8]}")
+        try:
+            os.makedirs(tmp)
+            curves = pd.DataFrame(
+                {"portfolio": result["portfolio"], "spy": result["spy"]},
+                index=pd.to_datetime(pd.Index(result["dates"], name="date")),
+            )
+            curves.to_parquet(os.path.join(tmp, "curves.parquet"))
+            for name, frame in frames.items():
+                frame.to_parquet(os.path.join(tmp, f"{name}.parquet"))
+            manifest = {
+                "key": key,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "request": request,
+                **(meta or {}),
+                "frames": sorted(frames),
+                "result": {k: v for k, v in result.items() if k not in SERIES_KEYS},
+            }
+            with open(os.path.join(tmp, MANIFEST), "w") as f:
+                json.dump(manifest, f, default=str)
+            os.replace(tmp, folder)
+        except OSError as e:
+            if not os.path.exists(folder):
+                logger.warning("Could not store artifact %s: %s", key, e)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._prune()
+
+    def entries(self):
+        """Manifests (without the stored result), most recently used first."""
+        out = []
+        for key in self._keys_by_use():
+            try:
+                with open(os.path.join(self.path(key), MANIFEST)) as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            manifest.pop("result", None)
+            out.append(manifest)
+        return out
+
+    def _keys_by_use(self):
+        if not os.path.isdir(self.root):
+            return []
+        stamped = []
+        for key in os.listdir(self.root):
+            manifest_path = os.path.join(self.path(key), MANIFEST)
+            if not key.startswith(".") and os.path.exists(manifest_path):
+                stamped.append((os.path.getmtime(manifest_path), key))
+        return [key for _, key in sorted(stamped, reverse=True)]
+
+    def _prune(self):
+        for key in self._keys_by_use()[self.max_entries:]:
+            shutil.rmtree(self.path(key), ignore_errors=True)
+
+
+def default_store():
+    """The configured store, or None when BL_ARTIFACT_DIR is empty."""
+    return ArtifactStore() if ARTIFACT_DIR else None
+
+
+def load_or_run_backtest(engine, start_date, end_date, user_views, initial_capital=10000.0,
+                         mode="standard", rebalance_freq=None, store=None):
+    """engine.run_backtest(...), served from ``store`` when this exact backtest
+    (same request, data_version and engine constants) was stored before."""
+    if store is None:
+        return engine.run_backtest(start_date, end_date, user_views, initial_capital, mode, rebalance_freq)
+    request = {"start_date": start_date, "end_date": end_date, "views": user_views,
+               "initial_capital": initial_capital, "mode": mode, "rebalance_freq": rebalance_freq}
+    key = request_key("backtest", request, engine.data_version, engine.config_fingerprint())
+    hit = store.load(key)
+    if hit is not None:
+        logger.info("Backtest loaded from artifact %s.", key)
+        return hit[0]
+    result, frames = engine.run_backtest_frames(start_date, end_date, user_views, initial_capital, mode,
+                                                rebalance_freq)
+    if frames is not None:
+        store.save(key, result, frames, request=request,
+                   meta={"data_version": engine.data_version, "config": engine.config_fingerprint()})
+    return result
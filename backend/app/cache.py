@@ -0,0 +1,161 @@
+"""Caches of finished API results: in-process, or shared by the workers of
+one host through a SQLite file (SharedResultCache).
+
+Keys combine the endpoint, the canonical JSON of the request, the engine's
+data version and a fingerprint of the engine configuration, so a data refresh
+or a changed constant (see parameter_sweep.py) can never serve a stale result.
+Values are shared between callers and must be treated as read-only.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAX_ENTRIES = int(os.environ.get("BL_CACHE_SIZE", "128"))
+# Seconds a SharedResultCache waits for another worker's write lock.
+SHARED_CACHE_TIMEOUT = 30.0
+# A hit refreshes an entry's LRU timestamp only when it is older than this,
+# so hot entries are read without taking SQLite's write lock each time.
+SHARED_CACHE_TOUCH_S = 60.0
+
+
+def request_key(kind, payload, data_version="", config=""):
+    """Stable hex key for one request of endpoint ``kind``."""
+    blob = json.dumps([kind, payload, data_version, config], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+def config_fingerprint(module):
+    """Hash of a module's UPPERCASE scalar / tuple constants."""
+    consts = {
+        k: v for k, v in vars(module).items()
+        if k.isupper() and isinstance(v, (int, float, str, bool, tuple, type(None)))
+    }
+    blob = json.dumps(consts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def shared_connection(local, path):
+    """This thread's connection to the SQLite file at ``path`` (kept on the
+    threading.local ``local``); WAL lets readers run beside a writer."""
+    db = getattr(local, "db", None)
+    if db is None:
+        db = sqlite3.connect(path, timeout=SHARED_CACHE_TIMEOUT)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        local.db = db
+    return db
+
+
+class ResultCache:
+    """Thread-safe LRU of computed results with hit/miss counters."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Cached value for ``key``, computing (and storing) it on a miss.
+
+        Results carrying an "error" are returned but never stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        value = compute()
+        if not (isinstance(value, dict) and "error" in value):
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedResultCache(ResultCache):
+    """ResultCache kept in a SQLite file, so every worker process on the host
+    reads what any of them computed.
+
+    Values are pickled: the file must only be writable by the service. Hit
+    and miss counters are this process's; entries and LRU order are shared.
+    """
+
+    def __init__(self, path, max_entries=CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+        self.path = path
+        self._local = threading.local()
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, used REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    def _db(self):
+        return shared_connection(self._local, self.path)
+
+    def get(self, key):
+        with self._db() as db:
+            row = db.execute("SELECT value, used FROM results WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is not None and now - row[1] > SHARED_CACHE_TOUCH_S:
+                db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if row is None else pickle.loads(row[0])
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, blob, time.time()))
+            db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used DESC "
+                       "LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self._db() as db:
+            db.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {"entries": len(self), "max_entries": self.max_entries, "hits": hits, "misses": misses,
+                "shared": self.path}
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -0,0 +1,183 @@
+"""Range queries over a finished equity curve.
+
+Reports keep asking the same curve for stats over many windows: crash
+periods, the last 1/3/5 years, calendar years. Slicing the Series and
+recomputing from scratch costs O(window) per query. A CurveIndex is built
+once per curve (O(n)) and then answers any [start, end] window with
+
+  * total return / CAGR from the curve values (O(1));
+  * mean, vol and downside deviation of the daily returns from prefix sums
+    of r, r^2 and the negative part of r (O(1));
+  * max drawdown from a segment tree over log values (O(log n)). Each node
+    keeps (max, min, worst drawdown), and two adjacent nodes merge as
+    dd = min(dd_left, dd_right, min_right - max_left).
+
+Results match the pandas formulas in evaluate_performance.py (sample std,
+drawdown against the running peak inside the window) up to float rounding.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class DrawdownTree:
+    """Segment tree answering the worst peak-to-trough drop of ``log_values[l..r]``."""
+
+    def __init__(self, log_values):
+        n = len(log_values)
+        size = 1
+        while size < max(n, 1):
+            size *= 2
+        self.size = size
+        self.hi = np.full(2 * size, -np.inf)
+        self.lo = np.full(2 * size, np.inf)
+        self.dd = np.zeros(2 * size)
+        self.hi[size:size + n] = log_values
+        self.lo[size:size + n] = log_values
+        # Build level by level, bottom-up (vectorized per level).
+        level = size
+        while level > 1:
+            parents = np.arange(level // 2, level)
+            left, right = 2 * parents, 2 * parents + 1
+            self.hi[parents] = np.maximum(self.hi[left], self.hi[right])
+            self.lo[parents] = np.minimum(self.lo[left], self.lo[right])
+            cross = self.lo[right] - self.hi[left]
+            cross = np.where(np.isfinite(cross), cross, 0.0)
+            self.dd[parents] = np.minimum(np.minimum(self.dd[left], self.dd[right]), cross)
+            level //= 2
+
+    @classmethod
+    def from_arrays(cls, hi, lo, dd):
+        """Tree over arrays saved from another one's ``hi``/``lo``/``dd``."""
+        tree = cls.__new__(cls)
+        tree.size = len(hi) // 2
+        tree.hi, tree.lo, tree.dd = hi, lo, dd
+        return tree
+
+    @staticmethod
+    def _merge(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2], b[1] - a[0]))
+
+    def query(self, l, r):
+        """Worst log drawdown (<= 0) within positions l..r inclusive."""
+        left, right = None, None
+        l += self.size
+        r += self.size + 1
+        while l < r:
+            if l & 1:
+                left = self._merge(left, (self.hi[l], self.lo[l], self.dd[l]))
+                l += 1
+            if r & 1:
+                r -= 1
+                right = self._merge((self.hi[r], self.lo[r], self.dd[r]), right)
+            l //= 2
+            r //= 2
+        merged = self._merge(left, right)
+        return 0.0 if merged is None else float(merged[2])
+
+
+class CurveIndex:
+    """O(1) / O(log n) window stats for one equity curve (a pandas Series)."""
+
+    def __init__(self, curve, rf_daily=None):
+        curve = curve.dropna()
+        self.index = pd.DatetimeIndex(curve.index)
+        self.values = curve.to_numpy(dtype=float)
+        rets = np.zeros(len(self.values))
+        rets[1:] = self.values[1:] / self.values[:-1] - 1.0
+        neg = np.minimum(rets, 0.0)
+        neg[0] = 0.0
+
+        def prefix(x):
+            return np.concatenate([[0.0], np.cumsum(x)])
+
+        # Entry k of each prefix array sums returns 1..k-1, so a window of
+        # positions s..e covers returns s+1..e: prefix[e + 1] - prefix[s + 1].
+        self._sum = prefix(rets)
+        self._sq = prefix(rets ** 2)
+        self._neg_n = prefix((rets < 0).astype(float))
+        self._neg_sum = prefix(neg)
+        self._neg_sq = prefix(neg ** 2)
+        rf = np.zeros(len(self.values)) if rf_daily is None else (
+            rf_daily.reindex(self.index).fillna(0.0).to_numpy(dtype=float))
+        self._rf = prefix(rf)
+        self._tree = DrawdownTree(np.log(self.values))
+
+    # State kept by arrays() / restored by from_arrays(), besides dates and the tree.
+    _ARRAYS = ("values", "_sum", "_sq", "_neg_n", "_neg_sum", "_neg_sq", "_rf")
+
+    def arrays(self):
+        """The index as a dict of plain numpy arrays (e.g. to cache or pickle it)."""
+        out = {name.lstrip("_"): getattr(self, name) for name in self._ARRAYS}
+        out.update(dates=self.index.asi8, dd_hi=self._tree.hi, dd_lo=self._tree.lo, dd_dd=self._tree.dd)
+        return out
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """CurveIndex over ``arrays()`` output, without recomputing (or copying) them."""
+        index = cls.__new__(cls)
+        index.index = pd.DatetimeIndex(np.asarray(arrays["dates"]).view("datetime64[ns]"))
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name.lstrip("_")])
+        index._tree = DrawdownTree.from_arrays(arrays["dd_hi"], arrays["dd_lo"], arrays["dd_dd"])
+        return index
+
+    def __len__(self):
+        return len(self.values)
+
+    def positions(self, start=None, end=None):
+        """(s, e) positions of the first/last points inside [start, end], or None."""
+        s = 0 if start is None else int(self.index.searchsorted(pd.Timestamp(start), side="left"))
+        e = len(self.values) - 1 if end is None else int(self.index.searchsorted(pd.Timestamp(end), side="right")) - 1
+        if e - s < 1:
+            return None
+        return s, e
+
+    @staticmethod
+    def _std(n, total, sq):
+        if n < 2:
+            return np.nan
+        var = (sq - total * total / n) / (n - 1)
+        return float(np.sqrt(max(var, 0.0)))
+
+    def stats(self, start=None, end=None):
+        """Return/risk stats for the window, or None if it holds < 2 points.
+
+        Sharpe and Sortino are annualized excess ratios using the window's
+        average daily risk-free rate.
+        """
+        pos = self.positions(start, end)
+        if pos is None:
+            return None
+        s, e = pos
+        a, b = s + 1, e + 1
+        n = e - s
+        total = self._sum[b] - self._sum[a]
+        mean = total / n
+        vol = self._std(n, total, self._sq[b] - self._sq[a]) * np.sqrt(252)
+        neg_n = int(round(self._neg_n[b] - self._neg_n[a]))
+        down = self._std(neg_n, self._neg_sum[b] - self._neg_sum[a], self._neg_sq[b] - self._neg_sq[a]) * np.sqrt(252)
+        rf_ann = (self._rf[b] - self._rf[a]) / n * 252
+        total_return = self.values[e] / self.values[s] - 1.0
+        years = (self.index[e] - self.index[s]).days / 365.25
+        cagr = (self.values[e] / self.values[s]) ** (1 / years) - 1 if years > 0 else np.nan
+        max_dd = float(np.expm1(self._tree.query(s, e)))
+        excess = mean * 252 - rf_ann
+        out = {
+            "start": str(self.index[s].date()),
+            "end": str(self.index[e].date()),
+            "days": n,
+            "total_return": float(total_return),
+            "cagr": float(cagr),
+            "vol": vol,
+            "sharpe": float(excess / vol) if vol > 0 else 0.0,
+            "sortino": float(excess / down) if down > 0 else 0.0,
+            "max_dd": max_dd,
+            "calmar": float(cagr / abs(max_dd)) if max_dd < 0 else np.nan,
+        }
+        # JSON has no NaN: undefined ratios (e.g. a one-day window) become None.
+        return {k: None if isinstance(v, float) and not np.isfinite(v) else v for k, v in out.items()}
@@ -4,12 +4,17 @@ import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
 
+from app.telemetry import stage, timed
+
 logger = logging.getLogger(__name__)
 
 # Configuration
 # Use absolute paths to ensure it works on Render
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PRICES_FILE = os.path.join(BASE_DIR, "data", "prices.parquet")
+PRICES_FILE = os.environ.get("BL_PRICES_FILE") or os.path.join(BASE_DIR, "data", "prices.parquet")
+# Serve PRICES_FILE as it is, without the freshness check or any download
+# (offline runs, load tests on a fixed or synthetic panel).
+DATA_OFFLINE = os.environ.get("BL_DATA_OFFLINE", "0").lower() in ("1", "true", "yes")
 
 # Your Tickers
 TICKERS = [
@@ -28,6 +33,9 @@ FRESHNESS_TOLERANCE_DAYS = 4
 
 def ensure_data_freshness():
     """Checks if cached data is recent enough. If not, updates it in place."""
+    if DATA_OFFLINE:
+        logger.info("BL_DATA_OFFLINE is set; using %s as it is.", PRICES_FILE)
+        return
     # Ensure directory exists
     if not os.path.exists(os.path.dirname(PRICES_FILE)):
         os.makedirs(os.path.dirname(PRICES_FILE))
@@ -51,6 +59,7 @@ def ensure_data_freshness():
     _refresh_data(existing)
 
 
+@timed("data_download")
 def download_and_flatten(tickers, start_date):
     """Download prices from Yahoo Finance and flatten them into a single-level
     price DataFrame (Adj Close preferred, then Close) with a tz-naive
@@ -92,6 +101,7 @@ def download_and_flatten(tickers, start_date):
     return px
 
 
+@timed("data_read")
 def _read_cache():
     """Load the cached price frame, or None if missing/empty/unreadable."""
     if not os.path.exists(PRICES_FILE):
@@ -106,6 +116,7 @@ def _read_cache():
         return None
 
 
+@timed("data_save")
 def _save_cache(px):
     try:
         px.to_parquet(PRICES_FILE)
@@ -182,7 +193,8 @@ def load_data():
         logger.error("Error: Prices file not found after download attempt.")
         return pd.DataFrame()
 
-    df = pd.read_parquet(PRICES_FILE)
+    with stage("data_read"):
+        df = pd.read_parquet(PRICES_FILE)
     # Double check timezone on load
     if df.index.tz is not None:
         df.index = df.index.tz_localize(None)
@@ -0,0 +1,97 @@
+"""Shape-preserving downsampling of chart series (Largest-Triangle-Three-Buckets).
+
+A full-history backtest has ~5,000 daily points per curve; a chart a few
+hundred pixels wide cannot show more than that many. ``downsample_result``
+keeps at most ``max_points`` rows of a result's aligned series, chosen so
+the plotted shape survives:
+
+  * LTTB picks, per bucket of rows, the point spanning the largest triangle
+    with its neighbours, so turning points are kept and flat runs thinned;
+  * every series' maximum, minimum and the peak and trough of its maximum
+    drawdown are always kept, so the chart's drawdown and extremes stay
+    exact.
+
+Several series on one x axis (portfolio and SPY, or Monte Carlo bands) get
+an equal share of the budget and the union of their rows is kept, so all
+series keep sharing one set of dates.
+"""
+
+import numpy as np
+
+# Each series needs room for its must-keep rows plus a few LTTB picks.
+DOWNSAMPLE_MIN_POINTS_PER_SERIES = 10
+
+
+def lttb(y, n_out):
+    """Indices of the ``n_out`` rows of ``y`` chosen by LTTB (first and last included)."""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=int)
+    x = np.arange(n, dtype=float)
+    every = (n - 2) / (n_out - 2)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt = slice(end, min(int((i + 2) * every) + 1, n))
+        avg_x, avg_y = x[nxt].mean(), y[nxt].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def extreme_points(y):
+    """Rows of y's maximum, minimum and its maximum drawdown's peak and trough."""
+    y = np.asarray(y, dtype=float)
+    running_peak = np.maximum.accumulate(y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(running_peak > 0, y / running_peak - 1.0, 0.0)
+    trough = int(np.argmin(drawdown))
+    peak = int(np.argmax(y[:trough + 1]))
+    return {int(np.argmax(y)), int(np.argmin(y)), peak, trough}
+
+
+def select_rows(series, max_points):
+    """Sorted row indices keeping at most ``max_points`` rows of equal-length ``series``."""
+    n = len(series[0])
+    if max_points >= n:
+        return np.arange(n)
+    budget = max_points // len(series)
+    keep = set()
+    for y in series:
+        must = extreme_points(y)
+        keep |= must
+        keep.update(lttb(y, budget - len(must)).tolist())
+    return np.array(sorted(keep), dtype=int)
+
+
+def downsample_result(result, max_points, index_key, series_keys, matrix_keys=()):
+    """Copy of ``result`` with its aligned series cut to about ``max_points`` rows.
+
+    ``index_key`` names the x values (e.g. "dates"), ``series_keys`` the
+    1-D series and ``matrix_keys`` lists of series (e.g. Monte Carlo sample
+    paths), all aligned with the index. Adds {"downsampled": {"points",
+    "of"}}. Returns an {"error": ...} dict when ``max_points`` is too small.
+    """
+    series = [result[k] for k in series_keys] + [row for k in matrix_keys for row in result[k]]
+    minimum = DOWNSAMPLE_MIN_POINTS_PER_SERIES * len(series)
+    if max_points < minimum:
+        return {"error": f"max_points must be at least {minimum} for this result."}
+    n = len(result[index_key])
+    if max_points >= n:
+        return result
+    rows = select_rows(series, max_points)
+    out = dict(result)
+    out[index_key] = [result[index_key][i] for i in rows]
+    for k in series_keys:
+        out[k] = np.asarray(result[k])[rows].tolist()
+    for k in matrix_keys:
+        out[k] = np.asarray(result[k])[:, rows].tolist()
+    out["downsampled"] = {"points": len(rows), "of": n}
+    return out
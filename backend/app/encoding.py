@@ -0,0 +1,246 @@
+"""Compact columnar encodings of API results, chosen by the Accept header.
+
+A full-history backtest is ~5,000 ISO date strings plus two lists of
+Python floats; Monte Carlo is five 252-day bands plus sample paths. As JSON
+that is mostly digits and quotes. Two binary alternatives are offered, each
+only when its (optional) library is installed; JSON stays the default:
+
+  * MessagePack (``application/x-msgpack``, needs ``msgpack``): the result
+    keeps its shape, but every long numeric list becomes a typed column
+    ``{"dtype": "float32" | "int32" | "date32", "shape": [...], "data": <bytes>}``
+    (little-endian). date32 values are int32 days since 1970-01-01.
+  * Arrow IPC stream (``application/vnd.apache.arrow.stream``, needs
+    ``pyarrow``): one record batch whose rows are the result's dates (or
+    Monte Carlo days). Every series of that length, at any depth, is a
+    column named by its dotted path ("weights.XLK"); a list of such series
+    becomes one column per item ("sample_paths.0"). Everything else is JSON
+    in the schema metadata under "result".
+
+``from_columnar`` turns a decoded MessagePack body back into plain lists.
+Both libraries are in requirements.txt; a process without one answers a
+request that accepts only that type with 406 rather than falling back to JSON.
+
+JSON bodies go through orjson (about 10x faster than the stdlib encoder,
+and it writes NumPy arrays directly). Bodies of COMPRESS_MIN_BYTES or more
+are compressed with brotli or gzip, whichever the client's Accept-Encoding
+prefers. orjson and brotli are in requirements.txt; without them JSON falls
+back to ``json`` and only gzip is offered.
+"""
+
+import gzip
+import json
+import os
+import re
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # optional: the API then only speaks JSON
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON = "application/json"
+MSGPACK = "application/x-msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+# Shorter lists stay plain arrays (metrics, warnings, small tables).
+COLUMNAR_MIN_LENGTH = 16
+INDEX_KEYS = ("dates", "days")
+
+# Smaller bodies are sent as they are ("0" compresses everything).
+COMPRESS_MIN_BYTES = int(os.environ.get("BL_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_EPOCH = np.datetime64("1970-01-01", "D")
+_MOVED = object()
+
+
+def available_types():
+    """Media types this process can produce, JSON first."""
+    return [JSON] + [t for t, lib in ((MSGPACK, msgpack), (ARROW, pa)) if lib is not None]
+
+
+def _ranked(header):
+    """[(token, q)] of an Accept-style header, best first (ties keep header order)."""
+    ranked = []
+    for n, part in enumerate((header or "").split(",")):
+        fields = [f.strip() for f in part.split(";")]
+        q = 1.0
+        for f in fields[1:]:
+            if f.startswith("q="):
+                try:
+                    q = float(f[2:])
+                except ValueError:
+                    q = 0.0
+        if fields[0] and q > 0:
+            ranked.append((-q, n, fields[0].lower()))
+    return [(token, -q) for q, _, token in sorted(ranked)]
+
+
+def negotiate(accept):
+    """The media type to answer with for an Accept header (JSON if nothing better
+    fits), or None when the header names only binary types this process cannot
+    produce (their library is not installed): the API answers that with 406."""
+    offered = available_types()
+    ranked = [t for t, _ in _ranked(accept)]
+    chosen = next((t for t in ranked if t in offered), None)
+    if chosen is not None:
+        return chosen
+    if {MSGPACK, ARROW} & set(ranked) and not {"*/*", "application/*"} & set(ranked):
+        return None
+    return JSON
+
+
+def content_coding(accept_encoding):
+    """"br", "gzip" or None for an Accept-Encoding header (brotli wins ties)."""
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    ranked = [(t, q) for t, q in _ranked(accept_encoding) if t in offered]
+    if not ranked:
+        return None
+    return min((t for t, q in ranked if q == ranked[0][1]), key=offered.index)
+
+
+def compress(body, coding):
+    """``body`` compressed with ``coding`` (see content_coding), or None when it
+    is too small to be worth it or no coding was accepted."""
+    if coding is None or len(body) < COMPRESS_MIN_BYTES:
+        return None
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _numeric(values):
+    return all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+
+
+def _column(values):
+    """(dtype, 1-D numpy array) for a list that should be a typed column, else None."""
+    if len(values) < COLUMNAR_MIN_LENGTH:
+        return None
+    if all(isinstance(v, str) and _DATE.match(v) for v in values):
+        days = (np.array(values, dtype="datetime64[D]") - _EPOCH).astype("<i4")
+        return "date32", days
+    if _numeric(values):
+        if all(isinstance(v, int) for v in values):
+            return "int32", np.asarray(values, dtype="<i4")
+        return "float32", np.asarray(values, dtype="<f4")
+    return None
+
+
+def _matrix(values):
+    """("float32", 2-D array) for a rectangular list of numeric lists of COLUMNAR_MIN_LENGTH+ values."""
+    if (values and all(isinstance(v, list) for v in values) and len({len(v) for v in values}) == 1
+            and len(values) * len(values[0]) >= COLUMNAR_MIN_LENGTH and all(_numeric(v) for v in values)):
+        return "float32", np.asarray(values, dtype="<f4")
+    return None
+
+
+def to_columnar(obj):
+    """``obj`` with every long numeric / date list replaced by a typed column."""
+    if isinstance(obj, dict):
+        return {k: to_columnar(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        col = _column(obj) or _matrix(obj)
+        if col is not None:
+            dtype, arr = col
+            return {"dtype": dtype, "shape": list(arr.shape), "data": arr.tobytes()}
+        return [to_columnar(v) for v in obj]
+    return obj
+
+
+def from_columnar(obj):
+    """Inverse of to_columnar (float32 values come back as their float32 value)."""
+    if isinstance(obj, dict):
+        if set(obj) == {"dtype", "shape", "data"} and isinstance(obj["data"], bytes):
+            dtype = {"float32": "<f4", "int32": "<i4", "date32": "<i4"}[obj["dtype"]]
+            arr = np.frombuffer(obj["data"], dtype=dtype).reshape(obj["shape"])
+            if obj["dtype"] == "date32":
+                return [str(d) for d in arr.astype("datetime64[D]")]
+            return arr.tolist()
+        return {k: from_columnar(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [from_columnar(v) for v in obj]
+    return obj
+
+
+def encode_msgpack(result):
+    return msgpack.packb(to_columnar(result), use_bin_type=True)
+
+
+def encode_arrow(result):
+    """One Arrow IPC stream: the result's series as columns, the rest as metadata."""
+    index_key = next((k for k in INDEX_KEYS if isinstance(result.get(k), list)), None)
+    n = len(result[index_key]) if index_key else None
+    columns = {}
+
+    def split(obj, path):
+        # Returns what is left of obj after moving its row-aligned series into columns.
+        if isinstance(obj, dict):
+            kept = {k: split(v, f"{path}{k}.") for k, v in obj.items()}
+            return {k: v for k, v in kept.items() if v is not _MOVED}
+        if n and isinstance(obj, list) and len(obj) == n:
+            col = _column(obj)
+            if col is not None:
+                columns[path[:-1]] = col
+                return _MOVED
+        if n and isinstance(obj, list) and obj and all(isinstance(v, list) and len(v) == n for v in obj):
+            cols = [_column(v) for v in obj]
+            if all(c is not None for c in cols):
+                for i, c in enumerate(cols):
+                    columns[f"{path}{i}"] = c
+                return _MOVED
+        return obj
+
+    rest = split(result, "")
+    arrays, names = [], []
+    for name, (dtype, arr) in columns.items():
+        names.append(name)
+        if dtype == "date32":
+            arrays.append(pa.array(arr, type=pa.date32()))
+        else:
+            arrays.append(pa.array(arr, type=pa.float32() if dtype == "float32" else pa.int32()))
+    batch = pa.RecordBatch.from_arrays(arrays, names=names) if arrays else pa.RecordBatch.from_pylist([])
+    schema = batch.schema.with_metadata({"result": json.dumps(rest, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+    return sink.getvalue().to_pybytes()
+
+
+def _json_default(obj):
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(result):
+    """Compact JSON bytes; NumPy arrays and scalars are accepted as values."""
+    if orjson is not None:
+        return orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(result, separators=(",", ":"), default=_json_default).encode()
+
+
+def encode(result, media_type):
+    """Body bytes of ``result`` for a media type returned by ``negotiate``."""
+    if media_type == MSGPACK:
+        return encode_msgpack(result)
+    if media_type == ARROW:
+        return encode_arrow(result)
+    return encode_json(result)
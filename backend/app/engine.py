@@ -1,13 +1,31 @@
+import os
+import time
 import pandas as pd
 import numpy as np
 import yfinance as yf
 from pypfopt import black_litterman, risk_models, EfficientFrontier
+import copy
+import hashlib
+import itertools
+import sys
 import warnings
 import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
 
+from app import optimizer
+from app.cache import ResultCache, config_fingerprint, request_key
+from app.curves import CurveIndex
+from app.metrics import performance_matrix, returns_from_curves
+from app.overlay import OVERLAY_MAX_VARIANTS, STRESS_WINDOWS, OverlayGrid, grid_params, grid_size
+from app.signals import SignalPanel
+from app.telemetry import merge, stage, timed, traced
+
 warnings.filterwarnings("ignore")
 logger = logging.getLogger(__name__)
 
@@ -30,6 +48,7 @@ CONC_BREADTH_OFF = 0.40
 MANUAL_EXTRA_CAP = 0.15
 CONF_CAP_LO, CONF_CAP_HI = 0.05, 0.85
 DEFAULT_RF = 0.02  # fallback annual risk-free rate when ^IRX is unavailable
+SCENARIO_MAX_WEIGHT = 0.40  # single-sector cap of the live recommendation
 
 # --- Defensive volatility-targeting overlay -------------------------------
 # When VOL_TARGET is not None (annualized, e.g. 0.10 = 10%), daily portfolio
@@ -43,10 +62,94 @@ VOL_TARGET_LOOKBACK = 21
 EXPOSURE_FLOOR = 0.00
 EXPOSURE_CAP = 1.00
 
+# --- Parallel walk-forward ------------------------------------------------
+# The per-date work inside run_backtest (Ledoit-Wolf covariance, regime
+# detection, leadership features, raw view signals and the BL optimization) is
+# independent across rebalance dates and is fanned out over a process pool.
+# Only the delta smoothing, the ML training set and the turnover/prev_weights
+# recurrence are sequential; they run in the parent, in date order. Workers are
+# forked per backtest so runtime overrides of the constants above (see
+# parameter_sweep.py) are inherited. BACKTEST_WORKERS = 1 runs everything
+# inline; short backtests (< PARALLEL_MIN_PERIODS rebalances) always do, and
+# so does any backtest started off the main thread: forking a threaded process
+# can deadlock the child, and under the API every request is its own thread
+# (scale the server with uvicorn --workers instead). The pool is for scripts.
+BACKTEST_WORKERS = int(os.environ.get("BL_BACKTEST_WORKERS", "0")) or (os.cpu_count() or 1)
+PARALLEL_MIN_PERIODS = 8
+
+# --- Fast (high-frequency) backtest mode ----------------------------------
+# run_backtest(mode="fast") replays the walk-forward on app.signals.SignalPanel
+# (every input precomputed as a rolling statistic, covariance updated
+# incrementally) and the array-level BL / max-Sharpe solver in app.optimizer,
+# warm-started from the previous rebalance. It handles any rebalance frequency
+# down to daily; FAST_LATENCY_TARGET_S is the published wall-clock target: 6
+# seconds for a cold, daily, full-history run (2006-2026, one CPU, SignalPanel
+# build included), checked on every benchmarks/run.py run. The ML
+# classifier keeps the standard cadence: one labelled row and one refit every
+# ML_LABEL_HORIZON trading days, with the latest model scoring every rebalance
+# in between.
+BACKTEST_MODES = ("standard", "fast", "triggered")
+FAST_REBALANCE_FREQ = 1
+FAST_LATENCY_TARGET_S = 6.0
+ML_LABEL_HORIZON = 63
+
+# --- Triggered (event-driven) rebalancing ---------------------------------
+# mode="triggered" runs on the same fast path but only re-optimizes when a
+# cheap daily check fires: the volatility or concentration regime flips, a
+# user view's date window opens or closes, or the drifted holdings have moved
+# DRIFT_TRIGGER (half-L1) away from the last target. REBALANCE_FREQ stays the
+# longest gap between optimizations and TRIGGER_MIN_GAP the shortest, so a
+# regime that flickers around its threshold cannot force daily re-solves.
+DRIFT_TRIGGER = 0.08
+TRIGGER_MIN_GAP = 5
+TRIGGER_REASONS = ("start", "schedule", "vol_regime", "concentration", "views", "drift")
+
+# --- Batch backtests -------------------------------------------------------
+# run_backtest_batch compares several user view sets over one date range,
+# sharing everything that does not depend on the user's views.
+BATCH_MAX_VIEW_SETS = 25
+# run_scenario_batch evaluates what-if grids against one shared prior; its
+# posteriors are stacked linear solves, so the limit is about response size.
+SCENARIO_BATCH_MAX_SETS = 1000
+
+# --- Recommendation history ----------------------------------------------
+# recommendation_history replays run_scenario over many dates from the cached
+# SignalPanel. HISTORY_FREQS maps the accepted range frequencies to pandas
+# periods (the last trading day of each period is used).
+HISTORY_FREQS = {"D": "D", "W": "W", "M": "M", "Q": "Q", "Y": "Y"}
+HISTORY_MAX_DATES = 6000
+
+# --- Window metrics --------------------------------------------------------
+# backtest_windows answers many [start, end] stat queries against one
+# backtest's equity curves (see app/curves.py). Presets are trailing windows
+# ending at the last date; "YTD" and "MAX" are also accepted.
+WINDOW_PRESETS = {"1Y": 1, "3Y": 3, "5Y": 5, "10Y": 10}
+WINDOWS_MAX = 2000
+
+# --- Backtest checkpoints --------------------------------------------------
+# A standard backtest saves its walk-forward state at the end of the last
+# complete REBALANCE_FREQ period (held weights, smoothed delta, ML training
+# rows and the settled periods). When the same backtest is requested on data
+# that only appends closes, it resumes from there and recomputes just the
+# newer periods and the partial tail. Checkpoints live in a store shared
+# across engine rebuilds (see main._build_engine).
+CHECKPOINT_MAX_ENTRIES = 32
+
+# --- Streamed backtests ----------------------------------------------------
+# stream_backtest yields one event per rebalance period of a standard
+# backtest as soon as it settles. The fast modes finish almost at once, so
+# their curves are cut into STREAM_CHUNK_DAYS-day chunks instead.
+STREAM_CHUNK_DAYS = 63
+
 
 # ==========================================
 # 1. HELPER FUNCTIONS
 # ==========================================
+def iso_dates(index):
+    """'YYYY-MM-DD' strings of a DatetimeIndex (vectorized str(d.date()))."""
+    return np.asarray(index, dtype="datetime64[D]").astype(str).tolist()
+
+
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
@@ -78,8 +181,14 @@ def inverse_vol_anchor(cov: pd.DataFrame) -> pd.Series:
     return pd.Series(w, index=cov.index)
 
 
-def get_equilibrium_from_anchor(prices_train, market_prices_train, prev_delta=None):
-    S = risk_models.CovarianceShrinkage(prices_train).ledoit_wolf()
+def equilibrium_inputs(prices_train, market_prices_train):
+    """State-free part of the equilibrium: (S, raw delta, anchor weights).
+
+    The raw market-implied risk aversion is clamped but NOT smoothed; smoothing
+    depends on the previous rebalance and is applied by the caller.
+    """
+    with stage("covariance"):
+        S = risk_models.CovarianceShrinkage(prices_train).ledoit_wolf()
     try:
         delta_raw = black_litterman.market_implied_risk_aversion(market_prices_train)
         if not np.isfinite(delta_raw):
@@ -87,12 +196,22 @@ def get_equilibrium_from_anchor(prices_train, market_prices_train, prev_delta=No
     except Exception:
         delta_raw = 2.5
     delta_raw = clamp(float(delta_raw), DELTA_MIN, DELTA_MAX)
-    delta = delta_raw if prev_delta is None else (DELTA_SMOOTH * prev_delta + (1 - DELTA_SMOOTH) * delta_raw)
     w_anchor = inverse_vol_anchor(S)
+    return S, delta_raw, w_anchor
+
+
+def smooth_delta(delta_raw, prev_delta=None):
+    return delta_raw if prev_delta is None else (DELTA_SMOOTH * prev_delta + (1 - DELTA_SMOOTH) * delta_raw)
+
+
+def get_equilibrium_from_anchor(prices_train, market_prices_train, prev_delta=None):
+    S, delta_raw, w_anchor = equilibrium_inputs(prices_train, market_prices_train)
+    delta = smooth_delta(delta_raw, prev_delta)
     pi = pd.Series(delta * (S @ w_anchor), index=prices_train.columns)
     return S, delta, pi, w_anchor
 
 
+@timed("regimes")
 def detect_vol_regime(market_prices, current_date):
     mkt_hist = market_prices.loc[:current_date].dropna()
     if len(mkt_hist) < 100:
@@ -106,6 +225,7 @@ def detect_vol_regime(market_prices, current_date):
     return regime, realized_vol, hist_median
 
 
+@timed("regimes")
 def detect_concentration_regime(prices_train: pd.DataFrame):
     if prices_train.shape[0] < 260:
         return False, None, np.nan, np.nan
@@ -120,8 +240,37 @@ def detect_concentration_regime(prices_train: pd.DataFrame):
     return bool(is_conc), str(leader), leader_z, breadth
 
 
-def generate_dynamic_views(prices_train, pi, market_prices_train, vol_regime, mom_weight_override=None):
-    spy_trend = market_prices_train.pct_change(252).iloc[-1]
+@timed("signals")
+def view_signals(prices_train, market_prices_train):
+    """Raw momentum / reversal / volatility inputs for generate_dynamic_views.
+
+    Split out because they depend only on the training window, so the backtest
+    can compute them in parallel before the (sequential) prior and ML override
+    are known.
+    """
+    return {
+        "spy_trend": market_prices_train.pct_change(252).iloc[-1],
+        "raw_mom": prices_train.pct_change(252).iloc[-1].dropna(),
+        "raw_rev": -prices_train.pct_change(21).iloc[-1].dropna(),
+        "asset_vol": prices_train.pct_change().std() * np.sqrt(252),
+    }
+
+
+def _zscore(x):
+    """(x - mean) / (sample std + 1e-12); NaN for a single value. Spells out
+    x.std(ddof=1) step by step (same values), which is much cheaper per call
+    on these few-element arrays."""
+    d = x - x.mean()
+    std = np.sqrt((d * d).sum() / (len(x) - 1)) if len(x) > 1 else np.nan
+    return d / (std + 1e-12)
+
+
+def dynamic_view_arrays(raw_mom, raw_rev, asset_vol, spy_trend, pi, vol_regime, mom_weight_override=None):
+    """Array core of the dynamic views: (mask, view returns, confidences, mom_w, rev_w, cutoff).
+
+    Inputs are aligned 1-D arrays; assets whose momentum or reversal signal is
+    missing never get a view.
+    """
     trend_strength = abs(spy_trend)
     mom_weight = 0.2 + 0.6 * (1 / (1 + np.exp(-10 * (trend_strength - 0.10))))
     rev_weight = 1.0 - mom_weight
@@ -134,31 +283,47 @@ def generate_dynamic_views(prices_train, pi, market_prices_train, vol_regime, mo
         mom_weight = clamp(float(mom_weight_override), 0.0, 0.90)
         rev_weight = 1.0 - mom_weight
 
-    raw_mom = prices_train.pct_change(252).iloc[-1].dropna()
-    raw_rev = -prices_train.pct_change(21).iloc[-1].dropna()
-    common = raw_mom.index.intersection(raw_rev.index).intersection(pi.index)
-    raw_mom, raw_rev = raw_mom[common], raw_rev[common]
-    z_mom = (raw_mom - raw_mom.mean()) / (raw_mom.std() + 1e-12)
-    z_rev = (raw_rev - raw_rev.mean()) / (raw_rev.std() + 1e-12)
+    valid = np.isfinite(raw_mom) & np.isfinite(raw_rev)
+    mask = np.zeros(len(pi), dtype=bool)
+    q = np.zeros(len(pi))
+    conf = np.zeros(len(pi))
+    if not valid.any():
+        return mask, q, conf, mom_weight, rev_weight, view_z_cutoff
+    z_mom, z_rev = _zscore(raw_mom[valid]), _zscore(raw_rev[valid])
     combined_z = (mom_weight * z_mom) + (rev_weight * z_rev)
-    asset_vol = prices_train[common].pct_change().std() * np.sqrt(252)
-
-    view_dict = {}
-    conf = {}
-    for t in combined_z.index:
-        z = float(combined_z[t])
-        if abs(z) < view_z_cutoff:
-            continue
-        implied_ret = float(pi[t])
-        vol = float(asset_vol[t])
-        alpha = 0.35 * vol * z
-        view_ret = implied_ret + alpha
-        c = clamp(float(1 - np.exp(-abs(z))), 0.01, 0.99)
-        view_dict[t] = float(view_ret)
-        conf[t] = c
+
+    keep = ~(np.abs(combined_z) < view_z_cutoff)
+    pos = np.flatnonzero(valid)[keep]
+    z = combined_z[keep]
+    mask[pos] = True
+    q[pos] = pi[pos] + 0.35 * asset_vol[pos] * z
+    conf[pos] = np.clip(1 - np.exp(-np.abs(z)), 0.01, 0.99)
+    return mask, q, conf, mom_weight, rev_weight, view_z_cutoff
+
+
+@timed("views")
+def views_from_signals(signals, pi, vol_regime, mom_weight_override=None):
+    raw_mom, raw_rev = signals["raw_mom"], signals["raw_rev"]
+    common = raw_mom.index.intersection(raw_rev.index).intersection(pi.index)
+    mask, q, conf, mom_weight, rev_weight, view_z_cutoff = dynamic_view_arrays(
+        raw_mom[common].to_numpy(dtype=float),
+        raw_rev[common].to_numpy(dtype=float),
+        signals["asset_vol"].reindex(common).to_numpy(dtype=float),
+        signals["spy_trend"],
+        pi.reindex(common).to_numpy(dtype=float),
+        vol_regime,
+        mom_weight_override,
+    )
+    view_dict = {t: float(q[k]) for k, t in enumerate(common) if mask[k]}
+    conf = {t: float(conf[k]) for k, t in enumerate(common) if mask[k]}
     return view_dict, pd.Series(conf), mom_weight, rev_weight, view_z_cutoff
 
 
+def generate_dynamic_views(prices_train, pi, market_prices_train, vol_regime, mom_weight_override=None):
+    signals = view_signals(prices_train, market_prices_train)
+    return views_from_signals(signals, pi, vol_regime, mom_weight_override)
+
+
 def optimize_bl_portfolio(S, pi, view_dict, conf_series, delta, tickers, w_anchor,
                           max_weight_active, risk_free_rate=DEFAULT_RF):
     """Returns (weights, posterior_returns, posterior_cov).
@@ -170,19 +335,87 @@ def optimize_bl_portfolio(S, pi, view_dict, conf_series, delta, tickers, w_ancho
         w = w_anchor.reindex(tickers).fillna(0.0)
         return w, pi.copy(), S
     conf_series = conf_series.reindex(list(view_dict.keys())).fillna(0.50)
-    bl = black_litterman.BlackLittermanModel(S, pi=pi, absolute_views=view_dict, omega="idzorek",
-                                             view_confidences=conf_series, risk_aversion=delta)
-    ret_bl = bl.bl_returns()
-    S_bl = bl.bl_cov()
-    ef = EfficientFrontier(ret_bl, S_bl)
-    ef.add_constraint(lambda w: w <= max_weight_active)
-    ef.add_constraint(lambda w: w >= MIN_WEIGHT)
-    # Pass an explicit risk-free rate so the optimizer and our reported metrics agree.
-    ef.max_sharpe(risk_free_rate=risk_free_rate)
+    with stage("bl_posterior"):
+        bl = black_litterman.BlackLittermanModel(S, pi=pi, absolute_views=view_dict, omega="idzorek",
+                                                 view_confidences=conf_series, risk_aversion=delta)
+        ret_bl = bl.bl_returns()
+        S_bl = bl.bl_cov()
+    with stage("max_sharpe"):
+        ef = EfficientFrontier(ret_bl, S_bl)
+        ef.add_constraint(lambda w: w <= max_weight_active)
+        ef.add_constraint(lambda w: w >= MIN_WEIGHT)
+        # Pass an explicit risk-free rate so the optimizer and our reported metrics agree.
+        ef.max_sharpe(risk_free_rate=risk_free_rate)
     weights = pd.Series(ef.clean_weights()).reindex(tickers).fillna(0.0)
     return weights, ret_bl, S_bl
 
 
+def optimize_bl_arrays(S, pi, view_idx, q, conf, delta, w_anchor, max_weight_active,
+                       risk_free_rate=DEFAULT_RF, warm=None):
+    """Array twin of optimize_bl_portfolio: returns (clean weights, raw weights).
+
+    Uses the closed-form posterior and the warm-started active-set solver from
+    app.optimizer; if the solver cannot certify a solution the problem is
+    handed to the pypfopt path unchanged. ``raw`` (uncleaned, sums to 1) is the
+    natural warm start for the next call.
+    """
+    if len(view_idx) == 0:
+        return w_anchor, None
+    with stage("bl_posterior"):
+        ret_bl, S_bl = optimizer.bl_posterior(S, pi, view_idx, q, conf)
+    with stage("max_sharpe"):
+        raw = optimizer.max_sharpe(ret_bl, S_bl, risk_free_rate, max_weight_active, MIN_WEIGHT, warm=warm)
+    if raw is not None:
+        return optimizer.clean_weights(raw), raw
+    if not optimizer.sharpe_feasible(ret_bl, risk_free_rate, max_weight_active, MIN_WEIGHT):
+        # pypfopt would raise as well (see below); skip building its problem.
+        logger.debug("Max-Sharpe infeasible; holding the anchor.")
+        return w_anchor, None
+    logger.debug("Active-set solver gave up; falling back to pypfopt.")
+    labels = [str(k) for k in range(len(pi))]
+    S_df = pd.DataFrame(S, index=labels, columns=labels)
+    try:
+        weights, _, _ = optimize_bl_portfolio(
+            S_df, pd.Series(pi, index=labels), {labels[k]: float(v) for k, v in zip(view_idx, q)},
+            pd.Series(conf, index=[labels[k] for k in view_idx]), delta, labels,
+            pd.Series(w_anchor, index=labels), max_weight_active, risk_free_rate=risk_free_rate,
+        )
+    except Exception as e:
+        # No capped long-only portfolio beats the risk-free rate under these
+        # views; hold the equilibrium anchor rather than abort a long replay.
+        logger.debug("Max-Sharpe infeasible (%s); holding the anchor.", e)
+        return w_anchor, None
+    return weights.to_numpy(dtype=float), None
+
+
+def optimize_bl_portfolio_fast(S, pi, view_dict, conf_series, delta, tickers, w_anchor,
+                               max_weight_active, risk_free_rate=DEFAULT_RF):
+    """Drop-in twin of optimize_bl_portfolio built on the array solver.
+
+    Same inputs and return values (missing confidences default to 0.50, no
+    views -> anchor and prior); the weights agree with the pypfopt path after
+    clean_weights rounding at ~1 ms instead of ~30 ms per call.
+    """
+    if not view_dict:
+        w = w_anchor.reindex(tickers).fillna(0.0)
+        return w, pi.copy(), S
+    cols = list(S.columns)
+    pos = {t: k for k, t in enumerate(cols)}
+    names = [t for t in view_dict if t in pos]
+    view_idx = [pos[t] for t in names]
+    q = [view_dict[t] for t in names]
+    conf = conf_series.reindex(names).fillna(0.50).to_numpy(dtype=float)
+    S_arr, pi_arr = S.to_numpy(dtype=float), pi.reindex(cols).to_numpy(dtype=float)
+    weights, _ = optimize_bl_arrays(
+        S_arr, pi_arr, view_idx, q, conf, delta, w_anchor.reindex(cols).to_numpy(dtype=float),
+        max_weight_active, risk_free_rate=risk_free_rate,
+    )
+    ret_bl, S_bl = optimizer.bl_posterior(S_arr, pi_arr, view_idx, q, conf)
+    return (pd.Series(weights, index=cols).reindex(tickers).fillna(0.0),
+            pd.Series(ret_bl, index=cols), pd.DataFrame(S_bl, index=cols, columns=cols))
+
+
+@timed("signals")
 def compute_leadership_features(prices_train: pd.DataFrame, market_train: pd.Series):
     if len(prices_train) < 260 or len(market_train) < 260:
         return None
@@ -216,12 +449,73 @@ def calc_max_drawdown(prices_series):
     return float(drawdown.min())
 
 
+def compute_period_features(train_prices, train_mkt, mkt_hist):
+    """Everything one rebalance date needs that does NOT depend on earlier dates.
+
+    Runs inside a backtest worker process, so it only takes plain data slices:
+    the training window, the matching SPY window and the SPY history up to the
+    decision date (for the regime's long-run median).
+    """
+    current_date = train_prices.index[-1]
+    vol_regime, _, _ = detect_vol_regime(mkt_hist, current_date)
+    S, delta_raw, w_anchor = equilibrium_inputs(train_prices, train_mkt)
+
+    spy_trend_12m = np.nan
+    spy_vol_6m = np.nan
+    if len(train_mkt) >= 260:
+        spy_trend_12m = float(train_mkt.pct_change(252).iloc[-1])
+    if len(train_mkt) >= 140:
+        spy_vol_6m = float(train_mkt.iloc[-126:].pct_change().std() * np.sqrt(252))
+
+    is_conc, _, _, _ = detect_concentration_regime(train_prices)
+    return {
+        "vol_regime": vol_regime,
+        "S": S,
+        "delta_raw": delta_raw,
+        "w_anchor": w_anchor,
+        "leader_info": compute_leadership_features(train_prices, train_mkt),
+        "spy_trend_12m": spy_trend_12m,
+        "spy_vol_6m": spy_vol_6m,
+        "is_conc": is_conc,
+        "view_signals": view_signals(train_prices, train_mkt),
+    }
+
+
+class _InlineExecutor:
+    """Executor stand-in that runs each call immediately in this process."""
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+
+def _backtest_executor(n_periods):
+    workers = min(BACKTEST_WORKERS, n_periods)
+    if (workers <= 1 or n_periods < PARALLEL_MIN_PERIODS
+            or threading.current_thread() is not threading.main_thread()
+            or "fork" not in multiprocessing.get_all_start_methods()):
+        return _InlineExecutor()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+
+
 # ==========================================
 # ENGINE CLASS
 # ==========================================
 class BLEngine:
-    def __init__(self, prices_df=None):
-        self.tickers = ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK", "XLP", "XLRE", "XLU", "XLV", "XLY"]
+    def __init__(self, prices_df=None, checkpoints=None, tickers=None):
+        # ``tickers`` overrides the sector universe (e.g. synthetic benchmark panels).
+        self.tickers = list(tickers) if tickers else ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK", "XLP", "XLRE",
+                                                      "XLU", "XLV", "XLY"]
         self.market_ticker = "SPY"
         self.risk_free_ticker = "^IRX"
 
@@ -230,11 +524,42 @@ class BLEngine:
             prices_df = download_prices(all_syms, "2005-01-01")
 
         self.prices = prices_df
+        self.data_version = "empty"
+        self._signal_panels = {}
+        self._signal_panels_lock = threading.Lock()
+        # "As of the latest close" scenario inputs + no-view recommendation,
+        # see refresh_baseline().
+        self._baseline = None
+        self._baseline_lock = threading.Lock()
+        # Walk-forward checkpoints, see CHECKPOINT_MAX_ENTRIES.
+        self.checkpoints = checkpoints if checkpoints is not None else ResultCache(CHECKPOINT_MAX_ENTRIES)
         if self.prices.empty:
             logger.error("CRITICAL ERROR: No price data downloaded. Engine will fail.")
         else:
             self._prepare_data()
 
+    @classmethod
+    def from_prepared(cls, asset_prices, market_prices, rf_daily, data_version, signal_panels=None,
+                      checkpoints=None):
+        """Engine over an already prepared (aligned) panel, e.g. memory-mapped
+        arrays attached from app/shared.py; skips download and _prepare_data.
+        The frames are used as they are and must not be written to."""
+        engine = cls.__new__(cls)
+        engine.tickers = list(asset_prices.columns)
+        engine.market_ticker = "SPY"
+        engine.risk_free_ticker = "^IRX"
+        engine.prices = engine.asset_prices = asset_prices
+        engine.market_prices = market_prices
+        engine.rf_daily = rf_daily
+        engine.data_version = data_version
+        engine._signal_panels = dict(signal_panels or {})
+        engine._signal_panels_lock = threading.Lock()
+        engine._baseline = None
+        engine._baseline_lock = threading.Lock()
+        engine.checkpoints = checkpoints if checkpoints is not None else ResultCache(CHECKPOINT_MAX_ENTRIES)
+        engine._build_index_engines()
+        return engine
+
     def _prepare_data(self):
         if self.prices.index.tz is not None:
             self.prices.index = self.prices.index.tz_localize(None)
@@ -269,8 +594,36 @@ class BLEngine:
         self.market_prices = self.market_prices.loc[common]
         self.rf_daily = self.rf_daily.loc[common]
 
+        # Identifies this exact price history (used in cache keys): changes
+        # whenever a refresh adds or revises closes.
+        last = self.asset_prices.index[-1].date() if len(self.asset_prices) else "empty"
+        self.data_version = f"{last}-{self._prefix_digest(len(self.asset_prices))[:12]}"
+
+        self._build_index_engines()
         logger.info("Data prepared. Rows: %d", len(self.asset_prices))
 
+    def _build_index_engines(self):
+        """Build the date indexes' lookup tables now. pandas fills them on the
+        first lookup, which is not thread-safe: concurrent first requests on a
+        new engine could see "uniquely valued Index" errors."""
+        for frame in (self.asset_prices, self.market_prices, self.rf_daily):
+            frame.index.get_indexer(frame.index[:1])
+            frame.index.is_monotonic_increasing
+
+    def _prefix_digest(self, rows):
+        """sha1 of the first ``rows`` aligned closes (dates, assets, market, rf)."""
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(self.asset_prices.index.asi8[:rows]).tobytes())
+        digest.update(np.ascontiguousarray(self.asset_prices.iloc[:rows].to_numpy(dtype=float)).tobytes())
+        digest.update(np.ascontiguousarray(self.market_prices.iloc[:rows].to_numpy(dtype=float)).tobytes())
+        digest.update(np.ascontiguousarray(self.rf_daily.iloc[:rows].to_numpy(dtype=float)).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def config_fingerprint():
+        """Hash of this module's configuration constants (for cache keys)."""
+        return config_fingerprint(sys.modules[__name__])
+
     def _annual_rf(self, as_of_date=None):
         """Most recent annualized risk-free rate at/just before as_of_date."""
         try:
@@ -288,7 +641,61 @@ class BLEngine:
         dt = pd.Timestamp(target_date)
         return self.asset_prices.loc[:dt], self.market_prices.loc[:dt]
 
-    def run_scenario(self, user_views: list, target_date: str = None):
+    def refresh_baseline(self):
+        """(Re)build the cached latest-date baseline: the scenario inputs as of
+        the last close (S, delta, pi, anchor, regime, dynamic views) and the
+        no-user-view recommendation. Called at startup and after every data
+        refresh; run_scenario and friends answer latest-date requests from it."""
+        with self._baseline_lock:
+            return self._build_baseline()
+
+    def _build_baseline(self):
+        # Callers hold _baseline_lock. Readers keep the previous baseline
+        # until the new one is assigned (one reference swap).
+        inputs = self._build_scenario_inputs(None)
+        if "error" in inputs:
+            logger.warning("Latest baseline unavailable: %s", inputs["error"])
+            self._baseline = None
+            return None
+        recommendation = self._recommend(self._copy_inputs(inputs), [])
+        baseline = {"inputs": inputs, "recommendation": recommendation}
+        self._baseline = baseline
+        logger.info("Latest baseline built for %s.", inputs["current_date"].date())
+        return baseline
+
+    def _latest_baseline(self, target_date=None):
+        """The cached baseline if ``target_date`` resolves to the latest close, else None."""
+        if target_date:
+            try:
+                if pd.Timestamp(target_date) < self.asset_prices.index[-1]:
+                    return None
+            except Exception:
+                return None
+        baseline = self._baseline  # read once: refresh_baseline may swap it meanwhile
+        if baseline is None:
+            with self._baseline_lock:
+                # Another caller may have built it while this one waited.
+                baseline = self._baseline or self._build_baseline()
+        return baseline
+
+    @staticmethod
+    def _copy_inputs(inputs):
+        """Shallow copy whose dynamic views the caller may extend in place."""
+        out = dict(inputs)
+        out["view_dict"] = dict(inputs["view_dict"])
+        out["conf_series"] = inputs["conf_series"].copy()
+        return out
+
+    def _scenario_inputs(self, target_date=None):
+        """View-independent inputs of a scenario as of ``target_date`` (default:
+        latest close), or an {"error": ...} dict. The dynamic views in
+        ``view_dict`` / ``conf_series`` are fresh copies the caller may extend."""
+        baseline = self._latest_baseline(target_date)
+        if baseline is not None:
+            return self._copy_inputs(baseline["inputs"])
+        return self._build_scenario_inputs(target_date)
+
+    def _build_scenario_inputs(self, target_date=None):
         assets_hist, mkt_hist = self._get_data_window(target_date)
         if len(assets_hist) < 504:
             return {"error": f"Not enough data for {target_date}"}
@@ -303,7 +710,21 @@ class BLEngine:
         vol_regime, _, _ = detect_vol_regime(mkt_hist, current_date)
         S, delta, pi, w_anchor = get_equilibrium_from_anchor(train_prices, train_mkt)
         view_dict, conf_series, _, _, _ = generate_dynamic_views(train_prices, pi, train_mkt, vol_regime)
+        return {
+            "train_prices": train_prices,
+            "current_date": current_date,
+            "rf_now": rf_now,
+            "vol_regime": vol_regime,
+            "S": S,
+            "delta": delta,
+            "pi": pi,
+            "w_anchor": w_anchor,
+            "view_dict": view_dict,
+            "conf_series": conf_series,
+        }
 
+    def _apply_scenario_views(self, view_dict, conf_series, pi, user_views):
+        """Overlay user views in place; returns (applied labels, input warnings)."""
         # Apply user views with the SAME clamping rules used in the backtest,
         # so the dashboard and backtest treat discretionary views identically.
         applied = []
@@ -332,10 +753,36 @@ class BLEngine:
             view_dict[t] = float(pi[t]) + extra
             conf_series[t] = conf
             applied.append(f"{t} +{extra:.1%}")
+        return applied, input_warnings
+
+    def run_scenario(self, user_views: list, target_date: str = None):
+        if not user_views:
+            baseline = self._latest_baseline(target_date)
+            if baseline is not None:
+                return copy.deepcopy(baseline["recommendation"])
+        inputs = self._scenario_inputs(target_date)
+        if "error" in inputs:
+            return inputs
+        return self._recommend(inputs, user_views)
+
+    def _recommend(self, inputs, user_views):
+        """Overlay ``user_views`` on the scenario ``inputs`` and optimize."""
+        S, delta, pi, w_anchor = inputs["S"], inputs["delta"], inputs["pi"], inputs["w_anchor"]
+        view_dict, conf_series = inputs["view_dict"], inputs["conf_series"]
+        applied, input_warnings = self._apply_scenario_views(view_dict, conf_series, pi, user_views)
 
         weights, ret_post, S_post = optimize_bl_portfolio(
-            S, pi, view_dict, conf_series, delta, self.tickers, w_anchor, 0.40, risk_free_rate=rf_now
+            S, pi, view_dict, conf_series, delta, self.tickers, w_anchor, SCENARIO_MAX_WEIGHT,
+            risk_free_rate=inputs["rf_now"]
         )
+        return self._scenario_report(inputs, weights, ret_post, S_post, applied, input_warnings)
+
+    @timed("report")
+    def _scenario_report(self, inputs, weights, ret_post, S_post, applied, input_warnings):
+        """The run_scenario response for optimized ``weights`` and their posterior."""
+        train_prices, current_date = inputs["train_prices"], inputs["current_date"]
+        rf_now, vol_regime = inputs["rf_now"], inputs["vol_regime"]
+        delta, pi = inputs["delta"], inputs["pi"]
 
         # Report expected return/vol against the BL POSTERIOR (the distribution
         # the portfolio was actually optimized on), not the prior pi.
@@ -415,6 +862,241 @@ class BLEngine:
             "applied_scenarios": applied
         }
 
+    def run_scenario_batch(self, view_sets: list, target_date: str = None):
+        """Evaluate many user view sets against one shared prior.
+
+        The equilibrium, regime and dynamic views are computed once; each set
+        only overlays its user views. All posteriors come from one stacked
+        solve (optimizer.bl_posterior_batch) and every max-Sharpe problem is
+        warm-started from the baseline (dynamic views only) solution. Weights
+        match run_scenario; per-set failures are reported as {"error": ...}.
+        """
+        t0 = time.perf_counter()
+        if not view_sets:
+            return {"error": "Provide at least one view set."}
+        if len(view_sets) > SCENARIO_BATCH_MAX_SETS:
+            return {"error": f"At most {SCENARIO_BATCH_MAX_SETS} view sets per batch."}
+        inputs = self._scenario_inputs(target_date)
+        if "error" in inputs:
+            return inputs
+        train_prices, rf_now = inputs["train_prices"], inputs["rf_now"]
+        S, delta, pi, w_anchor = inputs["S"], inputs["delta"], inputs["pi"], inputs["w_anchor"]
+
+        cols = list(S.columns)
+        pos = {t: k for k, t in enumerate(cols)}
+        S_arr, pi_arr = S.to_numpy(dtype=float), pi.reindex(cols).to_numpy(dtype=float)
+        anchor_arr = w_anchor.reindex(cols).fillna(0.0).to_numpy(dtype=float)
+
+        def view_arrays(view_dict, conf_series):
+            mask, q, conf = np.zeros(len(cols), dtype=bool), np.zeros(len(cols)), np.full(len(cols), 0.50)
+            for t, val in view_dict.items():
+                if t in pos:
+                    mask[pos[t]], q[pos[t]] = True, val
+                    c = conf_series.get(t, np.nan)
+                    conf[pos[t]] = 0.50 if pd.isna(c) else float(c)
+            return mask, q, conf
+
+        # Baseline (dynamic views only) solution: the shared warm start.
+        mask0, q0, conf0 = view_arrays(inputs["view_dict"], inputs["conf_series"])
+        warm = None
+        if mask0.any():
+            ret0, cov0 = optimizer.bl_posterior(S_arr, pi_arr, np.flatnonzero(mask0), q0[mask0], conf0[mask0])
+            warm = optimizer.max_sharpe(ret0, cov0, rf_now, SCENARIO_MAX_WEIGHT, MIN_WEIGHT)
+
+        B = len(view_sets)
+        masks, Q, C = np.zeros((B, len(cols)), dtype=bool), np.zeros((B, len(cols))), np.zeros((B, len(cols)))
+        overlays = []
+        for b, user_views in enumerate(view_sets):
+            view_dict, conf_series = dict(inputs["view_dict"]), inputs["conf_series"].copy()
+            overlays.append((view_dict, conf_series) + self._apply_scenario_views(view_dict, conf_series, pi, user_views))
+            masks[b], Q[b], C[b] = view_arrays(view_dict, conf_series)
+        post_ret, post_cov = optimizer.bl_posterior_batch(S_arr, pi_arr, masks, Q, C)
+
+        W = np.zeros((B, len(cols)))
+        failed = {}
+        for b in range(B):
+            if not masks[b].any():
+                # No views at all: the posterior collapses to the prior.
+                W[b], post_ret[b], post_cov[b] = anchor_arr, pi_arr, S_arr
+                continue
+            raw = optimizer.max_sharpe(post_ret[b], post_cov[b], rf_now, SCENARIO_MAX_WEIGHT, MIN_WEIGHT, warm=warm)
+            if raw is not None:
+                W[b] = optimizer.clean_weights(raw)
+                continue
+            view_dict, conf_series = overlays[b][:2]
+            try:
+                weights, _, _ = optimize_bl_portfolio(
+                    S, pi, view_dict, conf_series, delta, cols, w_anchor, SCENARIO_MAX_WEIGHT, risk_free_rate=rf_now
+                )
+                W[b] = weights.reindex(cols).fillna(0.0).to_numpy(dtype=float)
+            except Exception as e:
+                failed[b] = f"Optimization failed: {e}"
+
+        port_ret = np.einsum("bi,bi->b", W, post_ret)
+        port_vol = np.sqrt(np.maximum(np.einsum("bi,bij,bj->b", W, post_cov, W), 0.0))
+
+        # Live volatility-target exposure for every set at once (see run_scenario).
+        exposure = np.ones(B)
+        realized_vol = np.full(B, np.nan)
+        if VOL_TARGET is not None:
+            recent_rets = train_prices.pct_change().iloc[-VOL_TARGET_LOOKBACK:].reindex(columns=cols)
+            realized_vol = np.nanstd(recent_rets.to_numpy() @ W.T, axis=0, ddof=1) * np.sqrt(252)
+            with np.errstate(divide="ignore"):
+                exposure = np.where(realized_vol > 1e-9,
+                                    np.clip(VOL_TARGET / realized_vol, EXPOSURE_FLOOR, EXPOSURE_CAP), 1.0)
+
+        results = []
+        for b in range(B):
+            _, _, applied, input_warnings = overlays[b]
+            if b in failed:
+                results.append({"error": failed[b], "warnings": input_warnings})
+                continue
+            results.append({
+                "weights": {t: float(W[b, pos[t]]) if t in pos else 0.0 for t in self.tickers},
+                "expected_returns": {t: float(post_ret[b, pos[t]]) if t in pos else 0.0 for t in self.tickers},
+                "metrics": {
+                    "expected_return": float(port_ret[b]),
+                    "volatility": float(port_vol[b]),
+                    "sharpe": float((port_ret[b] - rf_now) / port_vol[b]) if port_vol[b] > 1e-9 else 0.0,
+                },
+                "exposure": {
+                    "invested": float(exposure[b]),
+                    "cash": float(1.0 - exposure[b]),
+                    "vol_target": VOL_TARGET,
+                    "realized_vol": float(realized_vol[b]) if VOL_TARGET is not None else None,
+                },
+                "applied_scenarios": applied,
+                "warnings": input_warnings,
+            })
+
+        return {
+            "date": str(inputs["current_date"].date()),
+            "regime": {"volatility": inputs["vol_regime"]},
+            "metrics": {"delta": round(delta, 2), "risk_free": rf_now},
+            "prior": {t: float(pi.get(t, 0.0)) for t in self.tickers},
+            "results": results,
+            "elapsed_seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def recommendation_history(self, dates=None, start_date=None, end_date=None, freq="M", user_views=None):
+        """run_scenario's weights, exposure, regime and risk/return for many dates.
+
+        Dates come from ``dates`` or from [start_date, end_date] sampled at
+        ``freq`` (last trading day of each D/W/M/Q/Y period). Every input is
+        read from the SignalPanel (rolling; this call's own covariance cursor
+        slides forward between dates) and each max-Sharpe solve starts from
+        the previous date's weights. User views are applied on every date, as
+        in run_scenario.
+        The response is columnar: one list per field, aligned with "dates".
+        """
+        t0 = time.perf_counter()
+        user_views = user_views or []
+        idx = self.asset_prices.index
+        try:
+            if dates:
+                requested = pd.DatetimeIndex([pd.Timestamp(d) for d in dates])
+            else:
+                if freq not in HISTORY_FREQS:
+                    return {"error": f"Unknown frequency '{freq}'. Use one of: {', '.join(HISTORY_FREQS)}."}
+                lo = pd.Timestamp(start_date) if start_date else idx[0]
+                hi = pd.Timestamp(end_date) if end_date else idx[-1]
+                days = idx[(idx >= lo) & (idx <= hi)]
+                requested = pd.DatetimeIndex(
+                    days.to_series().groupby(days.to_period(HISTORY_FREQS[freq])).max().to_numpy()
+                )
+        except Exception:
+            return {"error": "Invalid date format. Please use YYYY-MM-DD."}
+
+        panel = self.signal_panel(TRAIN_WINDOW)
+        cursor = panel.cursor()
+        rows = np.unique([panel.row_for(d) for d in requested])
+        input_warnings = []
+        too_early = rows < TRAIN_WINDOW
+        if too_early.any():
+            input_warnings.append(
+                f"Skipped {int(too_early.sum())} date(s) with less than {TRAIN_WINDOW} days of history."
+            )
+            rows = rows[~too_early]
+        if len(rows) == 0:
+            return {"error": "No dates with enough history"}
+        if len(rows) > HISTORY_MAX_DATES:
+            return {"error": f"At most {HISTORY_MAX_DATES} dates per request."}
+
+        cols = panel.tickers
+        n = len(cols)
+        col_pos = {t: k for k, t in enumerate(cols)}
+        manual = []
+        for v in user_views:
+            if v['ticker'] in col_pos:
+                manual.append((col_pos[v['ticker']], float(clamp(v['value'], -MANUAL_EXTRA_CAP, MANUAL_EXTRA_CAP)),
+                               float(clamp(v['confidence'], CONF_CAP_LO, CONF_CAP_HI))))
+            else:
+                input_warnings.append(f"Ignored unknown ticker '{v['ticker']}'.")
+        rf_ann = self._annual_rf_by_row(panel)
+
+        W = np.zeros((len(rows), n))
+        exp_ret, vol, deltas, failed = np.zeros(len(rows)), np.zeros(len(rows)), np.zeros(len(rows)), []
+        warm = None
+        for r, i in enumerate(rows):
+            S = cursor.covariance(i)
+            delta_raw = panel.delta_raw[i]
+            delta = clamp(float(delta_raw if np.isfinite(delta_raw) else 2.5), DELTA_MIN, DELTA_MAX)
+            w_anchor = 1.0 / (np.sqrt(np.diag(S)) + 1e-12)
+            w_anchor = w_anchor / w_anchor.sum()
+            pi = delta * (S @ w_anchor)
+            mask, q, conf, _, _, _ = dynamic_view_arrays(
+                panel.raw_mom[i], panel.raw_rev[i], panel.asset_vol[i], panel.spy_trend[i], pi,
+                "high" if panel.vol_high[i] else "low",
+            )
+            for pos, extra, c in manual:
+                mask[pos], q[pos], conf[pos] = True, pi[pos] + extra, c
+            view_idx = np.flatnonzero(mask)
+            if len(view_idx):
+                ret_post, S_post = optimizer.bl_posterior(S, pi, view_idx, q[view_idx], conf[view_idx])
+            else:
+                ret_post, S_post = pi, S
+            weights, raw = optimize_bl_arrays(S, pi, view_idx, q[view_idx], conf[view_idx], delta, w_anchor,
+                                              SCENARIO_MAX_WEIGHT, risk_free_rate=float(rf_ann[i]), warm=warm)
+            if raw is not None:
+                warm = raw
+            elif len(view_idx) and np.array_equal(weights, w_anchor):
+                failed.append(str(panel.index[i - 1].date()))
+            W[r], deltas[r] = weights, delta
+            exp_ret[r] = weights @ ret_post
+            vol[r] = np.sqrt(max(weights @ S_post @ weights, 0.0))
+        if failed:
+            input_warnings.append(f"No feasible max-Sharpe portfolio on {len(failed)} date(s); held the anchor.")
+
+        # Live volatility-target exposure (see run_scenario), all dates at once.
+        exposure, realized_vol = np.ones(len(rows)), np.full(len(rows), np.nan)
+        if VOL_TARGET is not None:
+            trailing = np.stack([panel.returns[i - VOL_TARGET_LOOKBACK:i] for i in rows])
+            realized_vol = np.std(np.einsum("rtn,rn->rt", trailing, W), axis=1, ddof=1) * np.sqrt(252)
+            with np.errstate(divide="ignore"):
+                exposure = np.where(realized_vol > 1e-9,
+                                    np.clip(VOL_TARGET / realized_vol, EXPOSURE_FLOOR, EXPOSURE_CAP), 1.0)
+        rf = rf_ann[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sharpe = np.where(vol > 1e-9, (exp_ret - rf) / vol, 0.0)
+
+        weights_out = {t: [0.0] * len(rows) for t in self.tickers}
+        weights_out.update({t: W[:, k].tolist() for k, t in enumerate(cols)})
+        return {
+            "dates": iso_dates(panel.index[rows - 1]),
+            "weights": weights_out,
+            "expected_return": exp_ret.tolist(),
+            "volatility": vol.tolist(),
+            "sharpe": sharpe.tolist(),
+            "risk_free": rf.tolist(),
+            "delta": np.round(deltas, 2).tolist(),
+            "regime": ["high" if panel.vol_high[i] else "low" for i in rows],
+            "invested": exposure.tolist(),
+            "realized_vol": realized_vol.tolist(),
+            "warnings": input_warnings,
+            "elapsed_seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    @timed("monte_carlo")
     def run_monte_carlo(self, mu, sigma, days=252, n_sims=5000, n_samples=3, seed=42):
         # Seeded RNG for reproducible projections.
         rng = np.random.default_rng(seed)
@@ -441,28 +1123,517 @@ class BLEngine:
             "simulation_count": n_sims
         }
 
-    def run_backtest(self, start_date: str, end_date: str, user_views: list, initial_capital=10000.0):
+    def signal_panel(self, train_window=None):
+        """Cached SignalPanel for this engine's data (one per training window).
+
+        The panel is shared by concurrent requests and only read; walks that
+        slide its covariance window take their own ``panel.cursor()``. The
+        first request for a window builds it while the others wait.
+        """
+        tw = int(train_window or TRAIN_WINDOW)
+        panel = self._signal_panels.get(tw)
+        if panel is None:
+            with self._signal_panels_lock:
+                panel = self._signal_panels.get(tw)
+                if panel is None:
+                    with stage("signal_panel"):
+                        panel = SignalPanel(self.asset_prices, self.market_prices, tw)
+                    self._signal_panels[tw] = panel
+        return panel
+
+    def _annual_rf_by_row(self, panel):
+        """_annual_rf(index[i - 1]) for every decision row i of the panel."""
+        rf = self.rf_daily.reindex(panel.index).ffill().to_numpy(dtype=float) * 252
+        out = np.full(len(rf) + 1, DEFAULT_RF)
+        out[1:] = np.where(np.isfinite(rf), rf, DEFAULT_RF)
+        return out
+
+    @timed("ml_fit")
+    def _fast_ml_overrides(self, panel, decisions, start_idx):
+        """Momentum-weight override per decision row (NaN = no override).
+
+        Mirrors the standard walk-forward's ML: one training row per
+        ML_LABEL_HORIZON-day period from start_idx, labelled by the market's
+        direction over that period and usable once the period is over.
+        """
+        H = ML_LABEL_HORIZON
+        T = len(panel)
+        out = np.full(len(decisions), np.nan)
+        if panel.train_window < 260:
+            return out
+        grid = np.arange(start_idx, T, H)
+        rows = panel.ml_features(grid)
+        rows[:, 4:] = np.where(np.isfinite(rows[:, 4:]), rows[:, 4:], 0.0)
+        label_end = np.minimum(grid + H, T) - 1
+        labels = (panel.market[label_end] / panel.market[grid] - 1 > 0).astype(int)
+
+        n_rows = np.searchsorted(grid, decisions - H, side="right")
+        for c in np.unique(n_rows):
+            if c < 30 or len(np.unique(labels[:c])) < 2:
+                continue
+            # Plain arrays in ml_features' column order: same fit as the
+            # standard path's DataFrame, without the per-refit frame overhead.
+            ml_model = Pipeline([("s", StandardScaler()), ("c", LogisticRegression(max_iter=2000))])
+            ml_model.fit(rows[:c], labels[:c])
+            sel = n_rows == c
+            p_mom = ml_model.predict_proba(panel.ml_features(decisions[sel]))[:, 1]
+            out[sel] = np.clip(0.25 + 0.60 * p_mom, 0.25, 0.85)
+            logger.debug("AI refit | %s | Training Data: %d rows", panel.index[decisions[sel][0] - 1].date(), c)
+        return out
+
+    def _fast_walk_forward(self, start_idx, end_date, user_views, freq, triggered=False):
+        """Fast-mode walk-forward of one view set; (port_rets, spy_rets,
+        weights_frame, stats) or None (see _fast_walk_forward_sets)."""
+        walks = self._fast_walk_forward_sets(start_idx, end_date, [user_views], freq, triggered)
+        return None if walks is None else walks[0]
+
+    def _fast_user_views(self, user_views, row_dates, col_pos):
+        """(manual, view_code) of one view set over the walk's rows.
+
+        manual: (column, extra, confidence, active-per-row mask) per view;
+        view_code: integer id of which views are live on each row (one code
+        per distinct set, any number of views), so any window edge is a change.
+        """
+        manual = []
+        for v in user_views:
+            t = v['ticker']
+            if t not in self.tickers or t not in col_pos:
+                continue
+            active = np.ones(len(row_dates), dtype=bool)
+            if v.get('start_date'):
+                active &= row_dates >= pd.Timestamp(v['start_date'])
+            if v.get('end_date'):
+                active &= row_dates <= pd.Timestamp(v['end_date'])
+            manual.append((col_pos[t], float(clamp(v['value'], -MANUAL_EXTRA_CAP, MANUAL_EXTRA_CAP)),
+                           float(clamp(v['confidence'], CONF_CAP_LO, CONF_CAP_HI)), active))
+        view_code = np.zeros(len(row_dates), dtype=np.int64)
+        if manual:
+            live = np.column_stack([active for _, _, _, active in manual])
+            view_code = np.unique(live, axis=0, return_inverse=True)[1].reshape(-1)
+        return manual, view_code
+
+    def _fast_walk_forward_sets(self, start_idx, end_date, view_sets, freq, triggered=False):
+        """Fast-mode walk-forward of several user view sets; one (port_rets,
+        spy_rets, weights_frame, stats) per set, or None.
+
+        A decision at row i uses data through the close of day i-1 and trades
+        at that close, so it earns day i's return onward; positions drift with
+        prices until the next decision, whose turnover (and the
+        TURNOVER_SKIP_THRESHOLD test) is measured against the drifted holdings.
+        Decisions fall every ``freq`` rows or, with ``triggered``, wherever
+        _next_trigger fires (``freq`` is then the longest allowed gap).
+
+        The sets advance together over the rows where any of them decides.
+        A row's view-independent inputs (covariance, risk aversion, regimes,
+        ML override, dynamic views) are computed once for all of them; only
+        the user-view overlay, the optimization (shared by sets whose
+        effective views coincide) and the accounting repeat per set.
+        """
+        panel = self.signal_panel()
+        cursor = panel.cursor()
+        idx = panel.index
+        end_idx = int(idx.searchsorted(pd.Timestamp(end_date), side="right"))
+        if start_idx >= end_idx:
+            return None
+        rows = np.arange(start_idx, end_idx)
+        cols = panel.tickers
+        n = len(cols)
+        col_pos = {t: k for k, t in enumerate(cols)}
+        rf_ann = self._annual_rf_by_row(panel)
+        ml_override = self._fast_ml_overrides(panel, rows, start_idx)
+        row_dates = idx[rows]
+
+        with np.errstate(invalid="ignore"):
+            conc_rows = (panel.conc_leader_z[rows] > CONC_LEADER_Z_ON) & (panel.conc_breadth[rows] < CONC_BREADTH_OFF)
+        vol_rows = panel.vol_high[rows]
+
+        runs = []
+        for user_views in view_sets:
+            manual, view_code = self._fast_user_views(user_views, row_dates, col_pos)
+            runs.append({
+                "manual": manual, "view_code": view_code, "next": start_idx, "reason": "start",
+                "port": np.zeros(end_idx - start_idx), "decisions": [], "snapshots": [],
+                "holdings": np.zeros(n), "prev_delta": None, "warm": None, "optimizations": 0, "trades": 0,
+                "reasons": dict.fromkeys(TRIGGER_REASONS, 0) if triggered else None,
+            })
+
+        i = start_idx
+        while i < end_idx:
+            k = i - start_idx
+            S = cursor.covariance(i)
+            delta_raw = panel.delta_raw[i]
+            delta_raw = clamp(float(delta_raw if np.isfinite(delta_raw) else 2.5), DELTA_MIN, DELTA_MAX)
+            w_anchor = 1.0 / (np.sqrt(np.diag(S)) + 1e-12)
+            w_anchor = w_anchor / w_anchor.sum()
+            S_anchor = S @ w_anchor
+
+            override = ml_override[k] if np.isfinite(ml_override[k]) else None
+            is_conc = bool(conc_rows[k])
+            max_w = CONC_MAX_WEIGHT if is_conc else MAX_WEIGHT
+            if is_conc and override:
+                override = clamp(override + CONC_MOM_BONUS, 0.25, 0.90)
+
+            # Keyed by delta: sets with different decision histories (triggered
+            # mode) can smooth it differently, and the dynamic views follow pi.
+            dynamic, solves = {}, {}
+            for run in runs:
+                if run["next"] != i:
+                    continue
+                delta = smooth_delta(delta_raw, run["prev_delta"])
+                run["prev_delta"] = delta
+                pi = delta * S_anchor
+                if delta not in dynamic:
+                    dynamic[delta] = dynamic_view_arrays(
+                        panel.raw_mom[i], panel.raw_rev[i], panel.asset_vol[i], panel.spy_trend[i], pi,
+                        "high" if vol_rows[k] else "low", override,
+                    )[:3]
+                mask, q, conf = (a.copy() for a in dynamic[delta])
+                for pos, extra, c, active in run["manual"]:
+                    if active[k]:
+                        mask[pos] = True
+                        q[pos] = pi[pos] + extra
+                        conf[pos] = c
+
+                view_idx = np.flatnonzero(mask)
+                warm = run["warm"]
+                key = (delta, view_idx.tobytes(), q[view_idx].tobytes(), conf[view_idx].tobytes(),
+                       None if warm is None else warm.tobytes())
+                if key not in solves:
+                    solves[key] = optimize_bl_arrays(S, pi, view_idx, q[view_idx], conf[view_idx], delta, w_anchor,
+                                                     max_w, risk_free_rate=float(rf_ann[i]), warm=warm)
+                target, raw = solves[key]
+                if len(view_idx):
+                    run["optimizations"] += 1
+                    run["warm"] = raw
+                target = target / target.sum()
+                if triggered:
+                    run["reasons"][run["reason"]] += 1
+
+                holdings = run["holdings"]
+                turnover = np.abs(target - holdings).sum() / 2.0
+                cost = 0.0
+                if turnover >= TURNOVER_SKIP_THRESHOLD or holdings.sum() == 0:
+                    holdings = target
+                    cost = turnover * COST_PER_TRADE
+                    run["trades"] += 1
+                run["decisions"].append(i)
+                run["snapshots"].append(holdings)
+
+                j_end = min(i + freq, end_idx)
+                growth = np.cumprod(1.0 + panel.returns[i:j_end], axis=0)
+                if triggered:
+                    j_end, run["reason"] = self._next_trigger(
+                        i, j_end, end_idx, holdings, target, growth,
+                        vol_rows[k:], conc_rows[k:], run["view_code"][k:],
+                    )
+                    growth = growth[:j_end - i]
+                value = growth @ holdings
+                prev_value = np.concatenate(([holdings.sum()], value[:-1]))
+                run["port"][k:j_end - start_idx] = value / prev_value - 1.0
+                run["port"][k] -= cost
+                holdings = holdings * growth[-1]
+                run["holdings"] = holdings / holdings.sum()
+                run["next"] = j_end
+            i = min(run["next"] for run in runs)
+
+        days = idx[start_idx:end_idx]
+        spy_rets = pd.Series(panel.market_returns[start_idx:end_idx], index=days)
+        walks = []
+        for run in runs:
+            weights_frame = pd.DataFrame(np.array(run["snapshots"]), index=idx[run["decisions"]],
+                                         columns=cols).reindex(columns=self.tickers, fill_value=0.0)
+            stats = {"mode": "triggered" if triggered else "fast", "frequency": freq,
+                     "rebalances": len(run["decisions"]), "optimizations": run["optimizations"],
+                     "trades": run["trades"]}
+            if triggered:
+                stats["triggers"] = run["reasons"]
+            walks.append((pd.Series(run["port"], index=days), spy_rets.copy(), weights_frame, stats))
+        return walks
+
+    @staticmethod
+    def _next_trigger(i, j_max, end_idx, holdings, target, growth, vol_high, is_conc, view_code):
+        """(row, reason) of the first decision after row i, checked for all days at once.
+
+        ``growth`` holds cumulative asset growth from row i to j_max-1, so the
+        holdings carried into candidate row r are ``holdings * growth[r-i-1]``;
+        the per-row regime/view arrays start at row i.
+        """
+        if j_max >= end_idx:
+            j_max = end_idx
+        r = np.arange(i + TRIGGER_MIN_GAP, j_max)
+        if len(r) == 0:
+            return j_max, "schedule"
+        off = r - i
+        drifted = holdings * growth[off - 1]
+        drifted = drifted / drifted.sum(axis=1, keepdims=True)
+        checks = (
+            ("vol_regime", vol_high[off] != vol_high[0]),
+            ("concentration", is_conc[off] != is_conc[0]),
+            ("views", view_code[off] != view_code[0]),
+            ("drift", np.abs(drifted - target).sum(axis=1) / 2.0 >= DRIFT_TRIGGER),
+        )
+        first, reason = j_max, "schedule"
+        for name, fired in checks:
+            hit = np.flatnonzero(fired)
+            if len(hit) and r[hit[0]] < first:
+                first, reason = int(r[hit[0]]), name
+        return first, reason
+
+    def _rebalance_schedule(self, start_idx, end_date):
+        """(i, test_end) index pairs of every walk-forward period, in date order."""
+        schedule = []
+        n = len(self.asset_prices)
+        for i in range(start_idx, n, REBALANCE_FREQ):
+            if self.asset_prices.index[i] > pd.Timestamp(end_date):
+                break
+            test_end = min(i + REBALANCE_FREQ, n)
+            if test_end - i < 2:
+                break
+            schedule.append((i, test_end))
+        return schedule
+
+    @timed("ml_fit")
+    def _ml_momentum_override(self, ml_rows, feat, current_date):
+        """Fit the momentum classifier on past periods and map P(momentum works)
+        to a momentum weight, or return None while there is too little history."""
+        leader_info = feat["leader_info"]
+        X_train, y_train, fcols = build_ml_dataset(ml_rows)
+        if X_train is None or len(X_train) < 30 or y_train.nunique() <= 1 or not leader_info:
+            return None
+        ml_model = Pipeline([("s", StandardScaler()), ("c", LogisticRegression(max_iter=2000))])
+        ml_model.fit(X_train, y_train)
+        X_now = pd.DataFrame([{
+            "leader_strength": leader_info["leader_strength"],
+            "breadth": leader_info["breadth"],
+            "dispersion": leader_info["dispersion"],
+            "avg_corr": leader_info["avg_corr"],
+            "spy_trend_12m": feat["spy_trend_12m"],
+            "spy_vol_6m": feat["spy_vol_6m"],
+        }])[fcols]
+        p_mom = float(ml_model.predict_proba(X_now)[0, 1])
+
+        logger.info("AI ACTIVE | Date: %s | Training Data: %d rows | Prediction: Momentum has %.1f%% chance of working", current_date.date(), len(X_train), p_mom * 100)
+        return clamp(0.25 + 0.60 * p_mom, 0.25, 0.85)
+
+    def _apply_period_views(self, view_dict, conf_series, pi, user_views, period_date):
+        """Overlay user views, honoring each view's optional [start_date, end_date]
+        window so the per-view date controls in the UI actually take effect."""
+        for v in user_views:
+            t = v['ticker']
+            if t not in self.tickers:
+                continue
+            sd = v.get('start_date')
+            ed = v.get('end_date')
+            if sd and period_date < pd.Timestamp(sd):
+                continue
+            if ed and period_date > pd.Timestamp(ed):
+                continue
+            extra = float(clamp(v['value'], -MANUAL_EXTRA_CAP, MANUAL_EXTRA_CAP))
+            conf = float(clamp(v['confidence'], CONF_CAP_LO, CONF_CAP_HI))
+            view_dict[t] = float(pi[t]) + extra
+            conf_series[t] = conf
+
+    def _walk_forward(self, schedule, user_views, resume=None):
+        """Yield each rebalance period of the backtest, in date order."""
+        for periods in self._walk_forward_sets(schedule, [user_views], resume=resume):
+            yield periods[0]
+
+    def _walk_forward_sets(self, schedule, view_sets, optimize=optimize_bl_portfolio, resume=None):
+        """Yield, per rebalance period, one settled period per user view set.
+
+        The work is pipelined so independent per-date steps run in parallel:
+          1. compute_period_features for every date (worker pool).
+          2. delta smoothing, ML override and view generation (sequential, cheap).
+          3. BL optimization (worker pool), once per distinct view set.
+          4. turnover skip + period accounting (sequential, cheap).
+        Steps 1-2 do not depend on the user's views, so they are shared by all
+        view sets; sets whose effective views coincide on a date (e.g. outside
+        their date windows) also share that date's optimization.
+        Periods are yielded as soon as they settle, so callers can stream them.
+        Each period records the smoothed ``delta`` and the number of ML
+        training rows known after it. ``resume`` ({"prev_weights": [...],
+        "prev_delta", "ml_rows"}, see _checkpointed_walk) continues a walk from
+        such a point; its "ml_rows" list is extended in place.
+        """
         full_slice = self.asset_prices
+        resume = resume or {}
+        ml_rows = resume.get("ml_rows", [])
+        prev_weights = list(resume.get("prev_weights") or
+                            [pd.Series(0.0, index=self.tickers) for _ in view_sets])
+        prev_delta = resume.get("prev_delta")
+        pending = deque()
+        lookahead = 2 * BACKTEST_WORKERS
+
+        executor = _backtest_executor(len(schedule))
         try:
-            ts_start = pd.Timestamp(start_date)
-            ts_end = pd.Timestamp(end_date)
-        except Exception:
-            return {"error": "Invalid date format. Please use YYYY-MM-DD."}
-        if ts_start >= ts_end:
-            return {"error": "Start date must be before end date."}
-        try:
-            req_start_idx = full_slice.index.get_indexer([ts_start], method='nearest')[0]
-        except Exception:
-            return {"error": "Invalid start date"}
-
-        start_idx = TRAIN_WINDOW
-        while start_idx < req_start_idx:
-            start_idx += REBALANCE_FREQ
-        if start_idx < TRAIN_WINDOW:
-            start_idx = TRAIN_WINDOW
+            # traced: worker-side stage timings come back with each result.
+            features = executor.map(
+                traced, itertools.repeat(compute_period_features),
+                [full_slice.iloc[i - TRAIN_WINDOW:i] for i, _ in schedule],
+                [self.market_prices.iloc[i - TRAIN_WINDOW:i] for i, _ in schedule],
+                [self.market_prices.iloc[:i] for i, _ in schedule],
+            )
+            for (i, test_end), (feat, spent) in zip(schedule, features):
+                merge(spent)
+                current_date = full_slice.index[i - 1]
+                test_prices = full_slice.iloc[i:test_end]
+                test_mkt = self.market_prices.iloc[i:test_end]
+                period_date = test_prices.index[0]
+                rf_now = self._annual_rf(current_date)
+
+                S, w_anchor = feat["S"], feat["w_anchor"]
+                delta = smooth_delta(feat["delta_raw"], prev_delta)
+                prev_delta = delta
+                pi = pd.Series(delta * (S @ w_anchor), index=S.index)
+
+                mom_weight_override = self._ml_momentum_override(ml_rows, feat, current_date)
+                max_w = CONC_MAX_WEIGHT if feat["is_conc"] else MAX_WEIGHT
+                if feat["is_conc"] and mom_weight_override:
+                    mom_weight_override = clamp(mom_weight_override + CONC_MOM_BONUS, 0.25, 0.90)
+
+                base_views, base_conf, _, _, _ = views_from_signals(
+                    feat["view_signals"], pi, feat["vol_regime"], mom_weight_override
+                )
+                solves, jobs = {}, []
+                for user_views in view_sets:
+                    view_dict, conf_series = dict(base_views), base_conf.copy()
+                    self._apply_period_views(view_dict, conf_series, pi, user_views, period_date)
+                    key = (tuple(view_dict.items()), tuple(conf_series.items()))
+                    if key not in solves:
+                        solves[key] = executor.submit(
+                            traced, optimize, S, pi, view_dict, conf_series, delta,
+                            self.tickers, w_anchor, max_w, risk_free_rate=rf_now,
+                        )
+                    jobs.append((bool(view_dict), solves[key]))
+
+                # --- ML LABEL GENERATION ---
+                # Labels depend only on market data, so the next period's
+                # training set is known before this period's weights are.
+                leader_info = feat["leader_info"]
+                if not test_mkt.empty and leader_info:
+                    future_mkt_ret = (test_mkt.iloc[-1] / test_mkt.iloc[0]) - 1
+                    label = 1 if future_mkt_ret > 0 else 0
+                    spy_trend_12m, spy_vol_6m = feat["spy_trend_12m"], feat["spy_vol_6m"]
+                    ml_rows.append({
+                        "leader_strength": leader_info["leader_strength"],
+                        "breadth": leader_info["breadth"],
+                        "dispersion": leader_info["dispersion"],
+                        "avg_corr": leader_info["avg_corr"],
+                        "spy_trend_12m": spy_trend_12m if np.isfinite(spy_trend_12m) else 0.0,
+                        "spy_vol_6m": spy_vol_6m if np.isfinite(spy_vol_6m) else 0.0,
+                        "label_momentum_works": label
+                    })
+                pending.append((period_date, test_prices, test_mkt, jobs, (delta, len(ml_rows))))
+
+                while pending and (len(pending) > lookahead or all(f.done() for _, f in pending[0][3])):
+                    yield self._settle_sets(pending.popleft(), prev_weights)
+            while pending:
+                yield self._settle_sets(pending.popleft(), prev_weights)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _settle_sets(self, item, prev_weights):
+        """Settle one period for every view set, updating ``prev_weights`` in place."""
+        period_date, test_prices, test_mkt, jobs, (delta, n_ml_rows) = item
+        # Price relatives and SPY returns are the same for every view set.
+        period_rel = test_prices.div(test_prices.iloc[0])
+        spy_rel = test_mkt.div(test_mkt.iloc[0])
+        spy_ret = spy_rel.pct_change().dropna()
+        periods = []
+        # View sets with identical views share one solve; count its stages once.
+        for fut in {id(fut): fut for _, fut in jobs}.values():
+            merge(fut.result()[1])
+        for s, (optimized, fut) in enumerate(jobs):
+            period, prev_weights[s] = self._settle_period(
+                period_date, period_rel, spy_ret, optimized, fut, prev_weights[s]
+            )
+            period["delta"], period["ml_rows"] = delta, n_ml_rows
+            periods.append(period)
+        return periods
+
+    def _settle_period(self, period_date, period_rel, spy_ret, optimized, fut, prev_weights):
+        """Turnover skip and daily returns for one period; returns (period, prev_weights)."""
+        (weights, _, _), _ = fut.result()
+        w_aligned = weights.reindex(self.tickers).fillna(0.0)
+
+        prev_aligned = prev_weights.reindex(self.tickers).fillna(0.0)
+        turnover = np.abs(w_aligned - prev_aligned).sum() / 2.0
+
+        skipped = False
+        if turnover < TURNOVER_SKIP_THRESHOLD:
+            w_aligned = prev_aligned
+            turnover = 0.0
+            skipped = True
+        else:
+            prev_weights = w_aligned
+
+        period_val = period_rel.dot(w_aligned)
+        period_ret = period_val.pct_change().dropna()
+
+        if not period_ret.empty and not skipped:
+            period_ret.iloc[0] -= (turnover * COST_PER_TRADE)
+
+        period = {
+            "date": period_date,
+            "weights": w_aligned,
+            "optimized": optimized,
+            "turnover": float(turnover),
+            "skipped": skipped,
+            "portfolio_returns": period_ret,
+            "spy_returns": spy_ret,
+        }
+        return period, prev_weights
+
+    def _checkpointed_walk(self, start_idx, schedule, user_views):
+        """Standard walk-forward periods for one view set, resumed from a
+        checkpoint when possible. Returns (periods, resumed_periods)."""
+        info = {}
+        periods = list(self._checkpointed_periods(start_idx, schedule, user_views, info))
+        return periods, info["resumed"]
+
+    def _checkpointed_periods(self, start_idx, schedule, user_views, info):
+        """Yield the standard walk-forward periods of one view set in date
+        order, replaying checkpointed ones before computing the rest.
+
+        A checkpoint covers the leading complete periods of a schedule and
+        is only reused when the schedule still starts with those periods and
+        the closes they saw are unchanged (a revised history starts over).
+        ``info["resumed"]`` is the number of replayed periods. Once the walk
+        is exhausted, the checkpoint advances to the last complete period.
+        """
+        key = request_key("walk_forward", {"start_idx": int(start_idx), "views": user_views},
+                          config=self.config_fingerprint())
+        done, state = [], {"ml_rows": []}
+        cp = self.checkpoints.get(key)
+        if (cp is not None and cp["schedule"] == schedule[:len(cp["schedule"])]
+                and cp["digest"] == self._prefix_digest(cp["rows"])):
+            done = cp["periods"]
+            state = {"prev_weights": [done[-1]["weights"]], "prev_delta": done[-1]["delta"],
+                     "ml_rows": list(cp["ml_rows"])}
+        info["resumed"] = len(done)
+        periods = list(done)
+        yield from done
+        for period in self._walk_forward(schedule[len(done):], user_views, resume=state):
+            periods.append(period)
+            yield period
+
+        # Only full-length periods are final; the tail still grows with new closes.
+        complete = len(done)
+        while complete < len(periods) and schedule[complete][1] - schedule[complete][0] == REBALANCE_FREQ:
+            complete += 1
+        if complete > len(done):
+            rows = schedule[complete - 1][1]
+            self.checkpoints.put(key, {
+                "schedule": schedule[:complete],
+                "rows": rows,
+                "digest": self._prefix_digest(rows),
+                "periods": periods[:complete],
+                "ml_rows": state["ml_rows"][:periods[complete - 1]["ml_rows"]],
+            })
 
-        # Validate user views once up front and collect human-readable warnings
-        # (instead of silently clamping out-of-range inputs inside the loop).
+    def _validate_backtest_views(self, user_views):
+        """Human-readable warnings for out-of-range or unusable backtest views
+        (instead of silently clamping them inside the walk-forward)."""
         input_warnings = []
         valid_tickers = set(self.tickers)
         for v in user_views:
@@ -495,157 +1666,418 @@ class BLEngine:
                         )
                 except Exception:
                     input_warnings.append(f"{t}: could not parse the view's date range.")
+        return input_warnings
+
+    def _backtest_window(self, start_date, end_date, mode, rebalance_freq):
+        """Validate the backtest arguments: (freq, start_idx) or an {"error": ...} dict."""
+        if mode not in BACKTEST_MODES:
+            return {"error": f"Unknown backtest mode '{mode}'. Use one of: {', '.join(BACKTEST_MODES)}."}
+        if mode == "fast":
+            freq = int(FAST_REBALANCE_FREQ if rebalance_freq is None else rebalance_freq)
+        elif mode == "triggered":
+            freq = int(REBALANCE_FREQ if rebalance_freq is None else rebalance_freq)
+        else:
+            freq = REBALANCE_FREQ
+        if freq < 1:
+            return {"error": "Rebalance frequency must be at least 1 trading day."}
+        try:
+            ts_start = pd.Timestamp(start_date)
+            ts_end = pd.Timestamp(end_date)
+        except Exception:
+            return {"error": "Invalid date format. Please use YYYY-MM-DD."}
+        if ts_start >= ts_end:
+            return {"error": "Start date must be before end date."}
+        try:
+            req_start_idx = self.asset_prices.index.get_indexer([ts_start], method='nearest')[0]
+        except Exception:
+            return {"error": "Invalid start date"}
 
-        ml_rows = []
-        ml_model = None
-        ml_available = True
-
-        portfolio_returns_history = []
-        spy_returns_history = []
-
-        # --- Store tuple of (Date, Weights) ---
-        weights_snapshots = []
-
-        prev_weights = pd.Series(0.0, index=self.tickers)
-        prev_delta = None
-
-        for i in range(start_idx, len(full_slice), REBALANCE_FREQ):
-            train_prices = full_slice.iloc[i - TRAIN_WINDOW:i]
-            train_mkt = self.market_prices.loc[train_prices.index]
-
-            test_end = min(i + REBALANCE_FREQ, len(full_slice))
-            if full_slice.index[i] > pd.Timestamp(end_date):
-                break
-
-            test_prices = full_slice.iloc[i:test_end]
-            test_mkt = self.market_prices.loc[test_prices.index]
-
-            if test_prices.shape[0] < 2:
-                break
-
-            current_date = train_prices.index[-1]
-            period_date = test_prices.index[0]
-            rf_now = self._annual_rf(current_date)
-
-            vol_regime, _, _ = detect_vol_regime(self.market_prices, current_date)
-            S, delta, pi, w_anchor = get_equilibrium_from_anchor(train_prices, train_mkt, prev_delta)
-            prev_delta = delta
-
-            leader_info = compute_leadership_features(train_prices, train_mkt)
-
-            mom_weight_override = None
-            spy_trend_12m = np.nan
-            spy_vol_6m = np.nan
-
-            if len(train_mkt) >= 260:
-                spy_trend_12m = float(train_mkt.pct_change(252).iloc[-1])
-            if len(train_mkt) >= 140:
-                spy_vol_6m = float(train_mkt.iloc[-126:].pct_change().std() * np.sqrt(252))
-
-            if ml_available:
-                X_train, y_train, fcols = build_ml_dataset(ml_rows)
-                if X_train is not None and len(X_train) >= 30 and y_train.nunique() > 1 and leader_info:
-                    ml_model = Pipeline([("s", StandardScaler()), ("c", LogisticRegression(max_iter=2000))])
-                    ml_model.fit(X_train, y_train)
-                    X_now = pd.DataFrame([{
-                        "leader_strength": leader_info["leader_strength"],
-                        "breadth": leader_info["breadth"],
-                        "dispersion": leader_info["dispersion"],
-                        "avg_corr": leader_info["avg_corr"],
-                        "spy_trend_12m": spy_trend_12m,
-                        "spy_vol_6m": spy_vol_6m,
-                    }])[fcols]
-                    p_mom = float(ml_model.predict_proba(X_now)[0, 1])
-                    mom_weight_override = clamp(0.25 + 0.60 * p_mom, 0.25, 0.85)
-
-                    logger.info("AI ACTIVE | Date: %s | Training Data: %d rows | Prediction: Momentum has %.1f%% chance of working", current_date.date(), len(X_train), p_mom * 100)
-
-            is_conc, _, _, _ = detect_concentration_regime(train_prices)
-            max_w = CONC_MAX_WEIGHT if is_conc else MAX_WEIGHT
-            if is_conc and mom_weight_override:
-                mom_weight_override = clamp(mom_weight_override + CONC_MOM_BONUS, 0.25, 0.90)
-
-            view_dict, conf_series, _, _, _ = generate_dynamic_views(train_prices, pi, train_mkt, vol_regime, mom_weight_override)
-
-            # Apply user views, honoring each view's optional [start_date, end_date]
-            # window so the per-view date controls in the UI actually take effect.
-            for v in user_views:
-                t = v['ticker']
-                if t not in self.tickers:
-                    continue
-                sd = v.get('start_date')
-                ed = v.get('end_date')
-                if sd and period_date < pd.Timestamp(sd):
-                    continue
-                if ed and period_date > pd.Timestamp(ed):
-                    continue
-                extra = float(clamp(v['value'], -MANUAL_EXTRA_CAP, MANUAL_EXTRA_CAP))
-                conf = float(clamp(v['confidence'], CONF_CAP_LO, CONF_CAP_HI))
-                view_dict[t] = float(pi[t]) + extra
-                conf_series[t] = conf
-
-            weights, _, _ = optimize_bl_portfolio(
-                S, pi, view_dict, conf_series, delta, self.tickers, w_anchor, max_w, risk_free_rate=rf_now
+        start_idx = TRAIN_WINDOW
+        while start_idx < req_start_idx:
+            start_idx += freq
+        if start_idx < TRAIN_WINDOW:
+            start_idx = TRAIN_WINDOW
+        return freq, start_idx
+
+    def _collect_periods(self, periods_by_date, n_sets):
+        """Gather streamed walk-forward periods into per-set
+        (port_rets, spy_rets, weights_frame, counts), or None if nothing ran."""
+        collected = [{"port": [], "spy": [], "dates": [], "weights": [], "opt": 0, "trades": 0}
+                     for _ in range(n_sets)]
+        for periods in periods_by_date:
+            for acc, period in zip(collected, periods):
+                # The weights ACTUALLY held this period (after the skip decision),
+                # so the "Top Holdings" report matches reality.
+                acc["dates"].append(period["date"])
+                acc["weights"].append(period["weights"])
+                acc["port"].append(period["portfolio_returns"])
+                acc["spy"].append(period["spy_returns"])
+                acc["opt"] += int(period["optimized"])
+                acc["trades"] += int(not period["skipped"])
+        if not collected[0]["port"]:
+            return None
+        return [(pd.concat(acc["port"]), pd.concat(acc["spy"]),
+                 pd.DataFrame(acc["weights"], index=acc["dates"]),
+                 {"rebalances": len(acc["dates"]), "optimizations": acc["opt"], "trades": acc["trades"]})
+                for acc in collected]
+
+    def run_backtest(self, start_date: str, end_date: str, user_views: list, initial_capital=10000.0,
+                     mode="standard", rebalance_freq=None):
+        """Walk-forward backtest.
+
+        mode="standard" is the original quarterly walk-forward (REBALANCE_FREQ).
+        mode="fast" runs on precomputed rolling signals and the array-level
+        solver and accepts any ``rebalance_freq`` down to 1 (daily; default
+        FAST_REBALANCE_FREQ). Fast mode holds drifting positions between
+        rebalances and measures turnover against them, so it is not a
+        bit-for-bit replay of the standard path. mode="triggered" uses the
+        fast path but only re-optimizes when a daily trigger fires (see
+        DRIFT_TRIGGER); ``rebalance_freq`` is then the longest gap between
+        optimizations (default REBALANCE_FREQ).
+        """
+        return self.run_backtest_frames(start_date, end_date, user_views, initial_capital, mode, rebalance_freq)[0]
+
+    def run_backtest_frames(self, start_date: str, end_date: str, user_views: list, initial_capital=10000.0,
+                            mode="standard", rebalance_freq=None):
+        """run_backtest plus its daily data as DataFrames: (result, frames).
+
+        frames = {"daily": strategy returns before the overlay and SPY returns
+        per day, "weights": the weights held from each rebalance date}, or
+        None when ``result`` is an error (see app/artifacts.py).
+        """
+        t0 = time.perf_counter()
+        window = self._backtest_window(start_date, end_date, mode, rebalance_freq)
+        if isinstance(window, dict):
+            return window, None
+        freq, start_idx = window
+
+        input_warnings = self._validate_backtest_views(user_views)
+
+        walk = self._strategy_walk(start_idx, end_date, user_views, mode, freq)
+        return self._finish_backtest(walk, input_warnings, initial_capital, t0)
+
+    def _finish_backtest(self, walk, input_warnings, initial_capital, t0):
+        """(result, frames) of run_backtest_frames from a finished _strategy_walk."""
+        if walk is None:
+            return {"error": "No simulation data generated"}, None
+        full_port_rets, full_spy_rets, weights_frame, rebalance = walk
+
+        result = self._backtest_report(full_port_rets, full_spy_rets, weights_frame, initial_capital)
+        result["warnings"] = input_warnings
+        rebalance["elapsed_seconds"] = round(time.perf_counter() - t0, 3)
+        if rebalance["mode"] == "fast":
+            rebalance["latency_target_seconds"] = FAST_LATENCY_TARGET_S
+            if rebalance["frequency"] == 1 and rebalance["elapsed_seconds"] > FAST_LATENCY_TARGET_S:
+                logger.warning("Fast daily backtest took %.2fs (target %.1fs).",
+                               rebalance["elapsed_seconds"], FAST_LATENCY_TARGET_S)
+        result["rebalance"] = rebalance
+        frames = {
+            "daily": pd.DataFrame({"strategy": full_port_rets, "spy": full_spy_rets}),
+            "weights": weights_frame,
+        }
+        return result, frames
+
+    def stream_backtest(self, start_date: str, end_date: str, user_views: list, initial_capital=10000.0,
+                        mode="standard", rebalance_freq=None):
+        """run_backtest as a generator of progress events (plain dicts).
+
+        Yields {"type": "start", ...} first, then one {"type": "period", ...}
+        per rebalance period with its dates, the new points of both equity
+        curves (overlay applied), the weights held and running metrics so
+        far, and finally {"type": "done", "result": <run_backtest result>}.
+        The points of all period events concatenate to the final curves. A
+        validation failure yields a single {"type": "error", "error": ...}.
+        In the fast modes the walk finishes first and its curves are emitted
+        in STREAM_CHUNK_DAYS-day chunks.
+        """
+        t0 = time.perf_counter()
+        window = self._backtest_window(start_date, end_date, mode, rebalance_freq)
+        if isinstance(window, dict):
+            yield {"type": "error", **window}
+            return
+        freq, start_idx = window
+        input_warnings = self._validate_backtest_views(user_views)
+
+        if mode in ("fast", "triggered"):
+            walk = self._strategy_walk(start_idx, end_date, user_views, mode, freq)
+            if walk is None:
+                yield {"type": "error", "error": "No simulation data generated"}
+                return
+            port_rets, spy_rets, weights_frame, _ = walk
+            yield {"type": "start", "mode": mode, "frequency": freq, "periods": None, "warnings": input_warnings}
+            held = weights_frame.reindex(port_rets.index, method="ffill")
+            segments = (
+                (port_rets.iloc[k:k + STREAM_CHUNK_DAYS], spy_rets.iloc[k:k + STREAM_CHUNK_DAYS],
+                 held.iloc[k])
+                for k in range(0, len(port_rets), STREAM_CHUNK_DAYS)
             )
-
-            w_aligned = weights.reindex(self.tickers).fillna(0.0)
-
-            prev_aligned = prev_weights.reindex(self.tickers).fillna(0.0)
-            turnover = np.abs(w_aligned - prev_aligned).sum() / 2.0
-
-            skipped = False
-            if turnover < TURNOVER_SKIP_THRESHOLD:
-                w_aligned = prev_aligned
-                turnover = 0.0
-                skipped = True
+        else:
+            schedule = self._rebalance_schedule(start_idx, end_date)
+            yield {"type": "start", "mode": mode, "frequency": freq, "periods": len(schedule),
+                   "warnings": input_warnings}
+            periods, info = [], {}
+
+            def _settled():
+                for period in self._checkpointed_periods(start_idx, schedule, user_views, info):
+                    periods.append(period)
+                    yield period["portfolio_returns"], period["spy_returns"], period["weights"]
+
+            segments = _settled()
+
+        raw_port, raw_spy, shown = [], [], 0
+        for n, (port_seg, spy_seg, weights) in enumerate(segments, 1):
+            raw_port.append(port_seg)
+            raw_spy.append(spy_seg)
+            port_so_far = self._vol_overlay(pd.concat(raw_port))
+            spy_so_far = pd.concat(raw_spy)
+            port_curve = (1 + port_so_far).cumprod() * initial_capital
+            spy_curve = (1 + spy_so_far).cumprod() * initial_capital
+            rf_window = self.rf_daily.reindex(port_so_far.index).ffill().dropna()
+            rf_ann = float(rf_window.mean() * 252) if not rf_window.empty else DEFAULT_RF
+            running = performance_matrix(np.vstack([port_so_far.to_numpy(), spy_so_far.to_numpy()]), rf_ann)
+            yield {
+                "type": "period",
+                "index": n,
+                "date": str(port_seg.index[0].date()) if len(port_seg) else None,
+                "dates": iso_dates(port_curve.index[shown:]),
+                "portfolio": port_curve.iloc[shown:].tolist(),
+                "spy": spy_curve.iloc[shown:].tolist(),
+                "weights": {t: float(w) for t, w in weights.items() if w > 0},
+                "metrics": {
+                    f"{prefix}{k}": float(v[row]) if np.isfinite(v[row]) else None
+                    for row, prefix in ((0, ""), (1, "spy_"))
+                    for k, v in running.items() if k in ("total_return", "vol", "sharpe", "max_dd")
+                },
+            }
+            shown = len(port_curve)
+
+        if mode in ("fast", "triggered"):
+            result, _ = self._finish_backtest(walk, input_warnings, initial_capital, t0)
+        else:
+            runs = self._collect_periods(([period] for period in periods), 1)
+            if runs is None:
+                walk = None
             else:
-                prev_weights = w_aligned
-
-            # --- Store the weights ACTUALLY held this period (after the skip
-            # decision), so the "Top Holdings" report matches reality. ---
-            weights_snapshots.append((period_date, w_aligned))
-
-            period_rel = test_prices.div(test_prices.iloc[0])
-            period_val = period_rel.dot(w_aligned)
-            period_ret = period_val.pct_change().dropna()
-
-            if not period_ret.empty and not skipped:
-                period_ret.iloc[0] -= (turnover * COST_PER_TRADE)
-
-            portfolio_returns_history.append(period_ret)
-            spy_rel = test_mkt.div(test_mkt.iloc[0])
-            spy_ret = spy_rel.pct_change().dropna()
-            spy_returns_history.append(spy_ret)
-
-            # --- ML LABEL GENERATION ---
-            if ml_available and not test_mkt.empty and leader_info:
-                future_mkt_ret = (test_mkt.iloc[-1] / test_mkt.iloc[0]) - 1
-                label = 1 if future_mkt_ret > 0 else 0
-                ml_rows.append({
-                    "leader_strength": leader_info["leader_strength"],
-                    "breadth": leader_info["breadth"],
-                    "dispersion": leader_info["dispersion"],
-                    "avg_corr": leader_info["avg_corr"],
-                    "spy_trend_12m": spy_trend_12m if np.isfinite(spy_trend_12m) else 0.0,
-                    "spy_vol_6m": spy_vol_6m if np.isfinite(spy_vol_6m) else 0.0,
-                    "label_momentum_works": label
-                })
-
-        if not portfolio_returns_history:
+                port_rets, spy_rets, weights_frame, counts = runs[0]
+                walk = (port_rets, spy_rets, weights_frame,
+                        {"mode": mode, "frequency": freq, **counts, "resumed_periods": info["resumed"]})
+            result, _ = self._finish_backtest(walk, input_warnings, initial_capital, t0)
+        if "error" in result:
+            yield {"type": "error", **result}
+        else:
+            yield {"type": "done", "result": result}
+
+    def _strategy_walk(self, start_idx, end_date, user_views, mode, freq):
+        """(daily strategy returns before the overlay, SPY returns, weights_frame,
+        rebalance block) for one view set, or None if nothing ran."""
+        if mode in ("fast", "triggered"):
+            return self._fast_walk_forward(start_idx, end_date, user_views, freq, triggered=mode == "triggered")
+        schedule = self._rebalance_schedule(start_idx, end_date)
+        periods, resumed = self._checkpointed_walk(start_idx, schedule, user_views)
+        runs = self._collect_periods(([period] for period in periods), 1)
+        if runs is None:
+            return None
+        port_rets, spy_rets, weights_frame, counts = runs[0]
+        return port_rets, spy_rets, weights_frame, {"mode": mode, "frequency": freq, **counts, "resumed_periods": resumed}
+
+    def run_overlay_grid(self, start_date: str, end_date: str, user_views: list, grid: dict, windows=None,
+                         mode="standard", rebalance_freq=None, sort_by="sharpe", top=None):
+        """Score a grid of risk overlays (app/overlay.py) on one backtest.
+
+        The overlays apply to the strategy's raw daily returns, i.e. before
+        the built-in VOL_TARGET overlay (which is the variant vol_target=0.10,
+        vol_lookback=21, no SMA, floor 0, cap 1). ``grid`` holds the lists
+        vol_targets / vol_lookbacks / sma_windows / floors / caps (None in
+        vol_targets or sma_windows = rule off); ``windows`` maps names to
+        (start, end) for stress-window returns (default STRESS_WINDOWS).
+        Variants are sorted by
+        ``sort_by`` (descending) and cut to ``top``.
+        """
+        t0 = time.perf_counter()
+        # Sized before anything is expanded: a large grid is rejected at no cost.
+        size = grid_size(**grid)
+        if not size:
+            return {"error": "The overlay grid is empty."}
+        if size > OVERLAY_MAX_VARIANTS:
+            return {"error": f"At most {OVERLAY_MAX_VARIANTS} overlay variants per request ({size} requested)."}
+        params = grid_params(**grid)
+        for p in params:
+            if not 0.0 <= p["floor"] <= p["cap"]:
+                return {"error": "Overlay floors must be >= 0 and no larger than the caps."}
+            if p["vol_target"] is not None and (p["vol_target"] <= 0 or p["vol_lookback"] < 2):
+                return {"error": "Vol targets must be positive and lookbacks at least 2 days."}
+            if p["sma_window"] is not None and p["sma_window"] < 2:
+                return {"error": "SMA windows must be at least 2 days."}
+        window = self._backtest_window(start_date, end_date, mode, rebalance_freq)
+        if isinstance(window, dict):
+            return window
+        freq, start_idx = window
+        walk = self._strategy_walk(start_idx, end_date, user_views, mode, freq)
+        if walk is None:
             return {"error": "No simulation data generated"}
+        port_rets = walk[0]
+
+        t_grid = time.perf_counter()
+        overlays = OverlayGrid(port_rets, self.rf_daily, self.market_prices.astype(float), params)
+        scores = overlays.score(STRESS_WINDOWS if windows is None else windows)
+        metric_names = list(scores["metrics"])
+        if sort_by not in metric_names:
+            return {"error": f"Unknown sort key '{sort_by}'. Use one of: {', '.join(metric_names)}."}
+        # NaN sorts last.
+        order = np.argsort(-np.nan_to_num(scores["metrics"][sort_by], nan=-np.inf), kind="stable")
+        if top:
+            order = order[:int(top)]
+
+        def _num(x):
+            return float(x) if np.isfinite(x) else None
+
+        variants = [{
+            **params[i],
+            **{k: _num(v[i]) for k, v in scores["metrics"].items()},
+            "windows": {name: _num(v[i]) for name, v in scores["windows"].items()},
+            "avg_exposure": float(scores["avg_exposure"][i]),
+        } for i in order]
+        return {
+            "start": str(port_rets.index[0].date()),
+            "end": str(port_rets.index[-1].date()),
+            "variants": variants,
+            "count": len(params),
+            "rebalance": walk[3],
+            "grid_seconds": round(time.perf_counter() - t_grid, 3),
+            "elapsed_seconds": round(time.perf_counter() - t0, 3),
+        }
 
-        full_port_rets = pd.concat(portfolio_returns_history)
-        full_spy_rets = pd.concat(spy_returns_history)
+    def run_backtest_batch(self, start_date: str, end_date: str, view_sets: list, initial_capital=10000.0,
+                           mode="standard", rebalance_freq=None):
+        """Backtest several user view sets over one date range.
+
+        In standard mode the view-independent pipeline (equilibrium, regimes,
+        ML override, dynamic views) runs once and only the user-view overlay,
+        optimization and accounting repeat per set; optimizations go through
+        optimize_bl_portfolio_fast. The fast modes likewise compute each
+        decision row's inputs once for all sets (_fast_walk_forward_sets).
+        Returns {"results": [one run_backtest result per set], "rebalance": {...}}.
+        """
+        t0 = time.perf_counter()
+        if not view_sets:
+            return {"error": "Provide at least one view set."}
+        if len(view_sets) > BATCH_MAX_VIEW_SETS:
+            return {"error": f"At most {BATCH_MAX_VIEW_SETS} view sets per batch."}
+        window = self._backtest_window(start_date, end_date, mode, rebalance_freq)
+        if isinstance(window, dict):
+            return window
+        freq, start_idx = window
+
+        if mode in ("fast", "triggered"):
+            runs = self._fast_walk_forward_sets(start_idx, end_date, view_sets, freq, triggered=mode == "triggered")
+            if runs is None:
+                return {"error": "No simulation data generated"}
+        else:
+            schedule = self._rebalance_schedule(start_idx, end_date)
+            runs = self._collect_periods(
+                self._walk_forward_sets(schedule, view_sets, optimize=optimize_bl_portfolio_fast), len(view_sets)
+            )
+            if runs is None:
+                return {"error": "No simulation data generated"}
+            runs = [(p, m, w, {"mode": mode, "frequency": freq, **counts}) for p, m, w, counts in runs]
+
+        results = []
+        for user_views, (port_rets, spy_rets, weights_frame, rebalance) in zip(view_sets, runs):
+            result = self._backtest_report(port_rets, spy_rets, weights_frame, initial_capital)
+            result["warnings"] = self._validate_backtest_views(user_views)
+            result["rebalance"] = rebalance
+            results.append(result)
+        return {
+            "results": results,
+            "rebalance": {
+                "mode": mode,
+                "frequency": freq,
+                "view_sets": len(view_sets),
+                "elapsed_seconds": round(time.perf_counter() - t0, 3),
+            },
+        }
+
+    def curve_arrays(self, result):
+        """CurveIndex arrays per equity curve ("portfolio", "spy") of a
+        run_backtest result: plain numpy arrays, so they can be cached (and
+        pickled into a shared cache) in place of the index objects."""
+        dates = pd.to_datetime(pd.Index(result["dates"]))
+        return {
+            name: CurveIndex(pd.Series(result[name], index=dates, dtype=float), self.rf_daily).arrays()
+            for name in ("portfolio", "spy")
+        }
 
+    def backtest_windows(self, curves, windows, calendar_years=False):
+        """Stats of every requested window for both curves, from ``curve_arrays``.
+
+        Each window is {"name", "start_date", "end_date"} (open ends run to
+        the first/last date) or {"preset": "1Y"/"3Y"/.../"YTD"/"MAX"};
+        ``calendar_years`` appends one window per year. Windows with fewer
+        than two points come back with null stats.
+        """
+        indexes = {name: CurveIndex.from_arrays(arrays) for name, arrays in curves.items()}
+        port = indexes["portfolio"]
+        first, last = port.index[0], port.index[-1]
+        specs = []
+        for w in windows:
+            preset = (w.get("preset") or "").upper()
+            if preset:
+                if preset in WINDOW_PRESETS:
+                    start = last - pd.DateOffset(years=WINDOW_PRESETS[preset])
+                elif preset == "YTD":
+                    start = pd.Timestamp(year=last.year, month=1, day=1)
+                elif preset == "MAX":
+                    start = first
+                else:
+                    valid = ", ".join(list(WINDOW_PRESETS) + ["YTD", "MAX"])
+                    return {"error": f"Unknown window preset '{preset}'. Use one of: {valid}."}
+                specs.append((w.get("name") or preset, start, last))
+                continue
+            try:
+                start = pd.Timestamp(w["start_date"]) if w.get("start_date") else first
+                end = pd.Timestamp(w["end_date"]) if w.get("end_date") else last
+            except Exception:
+                return {"error": "Invalid date format. Please use YYYY-MM-DD."}
+            if start > end:
+                return {"error": f"Window '{w.get('name') or ''}' starts after it ends."}
+            specs.append((w.get("name") or f"{start.date()}..{end.date()}", start, end))
+        if calendar_years:
+            for year in range(first.year, last.year + 1):
+                # Measured from the previous year's last close, like yearly_table.
+                k = port.index.searchsorted(pd.Timestamp(year=year, month=1, day=1)) - 1
+                start = port.index[k] if k >= 0 else first
+                specs.append((str(year), start, pd.Timestamp(year=year, month=12, day=31)))
+        if len(specs) > WINDOWS_MAX:
+            return {"error": f"At most {WINDOWS_MAX} windows per request."}
+        return {
+            "windows": [
+                {"name": name, **{curve: idx.stats(start, end) for curve, idx in indexes.items()}}
+                for name, start, end in specs
+            ]
+        }
+
+    def _vol_overlay(self, port_rets):
+        """Daily returns after the VOL_TARGET overlay (unchanged when it is off).
+
+        Causal: the overlay of a prefix is the prefix of the overlay, which
+        is what lets stream_backtest redraw growing curves."""
+        if VOL_TARGET is None:
+            return port_rets
+        realized_vol = port_rets.rolling(VOL_TARGET_LOOKBACK).std() * np.sqrt(252)
+        exposure = (VOL_TARGET / realized_vol).shift(1).clip(EXPOSURE_FLOOR, EXPOSURE_CAP).fillna(EXPOSURE_CAP)
+        rf_overlay = self.rf_daily.reindex(port_rets.index).fillna(0.0)
+        return exposure * port_rets + (1 - exposure) * rf_overlay
+
+    @timed("report")
+    def _backtest_report(self, full_port_rets, full_spy_rets, weights_frame, initial_capital):
+        """Overlay, equity curves, yearly table, metrics and summary for a
+        finished walk-forward. ``weights_frame`` holds the weights actually held
+        at each rebalance date (rows) per ticker (columns)."""
         # --- Defensive volatility-targeting overlay (optional) ---
         # Scale daily exposure so trailing realized vol ~ VOL_TARGET, parking the
         # rest at the risk-free rate. Lagged one day (no look-ahead). This is the
         # validated crash-defense overlay; set VOL_TARGET = None above to disable.
-        if VOL_TARGET is not None:
-            realized_vol = full_port_rets.rolling(VOL_TARGET_LOOKBACK).std() * np.sqrt(252)
-            exposure = (VOL_TARGET / realized_vol).shift(1).clip(EXPOSURE_FLOOR, EXPOSURE_CAP).fillna(EXPOSURE_CAP)
-            rf_overlay = self.rf_daily.reindex(full_port_rets.index).fillna(0.0)
-            full_port_rets = exposure * full_port_rets + (1 - exposure) * rf_overlay
+        full_port_rets = self._vol_overlay(full_port_rets)
 
         port_curve = (1 + full_port_rets).cumprod() * initial_capital
         spy_curve = (1 + full_spy_rets).cumprod() * initial_capital
@@ -663,23 +2095,18 @@ class BLEngine:
         yearly_res = pd.concat([start_row, year_end_vals]).pct_change().dropna()
 
         yearly_table = []
+        avg_weights_by_year = weights_frame.groupby(weights_frame.index.year).mean()
 
         # --- FAILSAFE WEIGHT MATCHING LOGIC ---
         for dt, row in yearly_res.iterrows():
             year_int = dt.year
 
-            # 1. Collect all weight snapshots that happened during this year
-            weights_in_year = []
-            for (w_date, w_series) in weights_snapshots:
-                if w_date.year == year_int:
-                    weights_in_year.append(w_series)
-
             # Default text
             holdings_str = "Balanced"
 
-            # 2. If we found any weights for this year, average them and format
-            if weights_in_year:
-                avg_weights = pd.DataFrame(weights_in_year).mean()
+            # If any weight snapshots happened during this year, average them and format
+            if year_int in avg_weights_by_year.index:
+                avg_weights = avg_weights_by_year.loc[year_int]
                 top_3 = avg_weights.sort_values(ascending=False).head(3)
                 parts = [f"{t}({w:.0%})" for t, w in top_3.items() if w > 0.01]
                 if parts:
@@ -694,25 +2121,15 @@ class BLEngine:
             })
         # --------------------------------------
 
-        rets = df_res.pct_change().dropna()
         # Excess (risk-free-adjusted) Sharpe, using the average ^IRX yield over the window.
         rf_window = self.rf_daily.reindex(df_res.index).ffill().dropna()
         rf_ann = float(rf_window.mean() * 252) if not rf_window.empty else DEFAULT_RF
 
-        def _sharpe(col):
-            ann_ret = rets[col].mean() * 252
-            ann_vol = rets[col].std() * np.sqrt(252)
-            if not np.isfinite(ann_vol) or ann_vol == 0:
-                return 0.0
-            val = (ann_ret - rf_ann) / ann_vol
-            return float(val) if np.isfinite(val) else 0.0
-
-        sharpe_port = _sharpe('Portfolio')
-        sharpe_spy = _sharpe('SPY')
-        dd_port = calc_max_drawdown(df_res['Portfolio'])
-        dd_spy = calc_max_drawdown(df_res['SPY'])
-        vol_port = rets['Portfolio'].std() * np.sqrt(252)
-        vol_spy = rets['SPY'].std() * np.sqrt(252)
+        # Portfolio and SPY scored together (rows of app.metrics).
+        stats = performance_matrix(returns_from_curves(df_res[['Portfolio', 'SPY']].to_numpy().T), rf_ann)
+        sharpe_port, sharpe_spy = (float(x) if np.isfinite(x) else 0.0 for x in stats["sharpe"])
+        dd_port, dd_spy = (float(x) for x in stats["max_dd"])
+        vol_port, vol_spy = (float(x) for x in stats["vol"])
 
         total_return = (port_curve.iloc[-1] / initial_capital) - 1
         spy_total_return = (spy_curve.iloc[-1] / initial_capital) - 1
@@ -726,7 +2143,7 @@ class BLEngine:
         )
 
         return {
-            "dates": [str(d.date()) for d in df_res.index],
+            "dates": iso_dates(df_res.index),
             "portfolio": df_res['Portfolio'].tolist(),
             "spy": df_res['SPY'].tolist(),
             "metrics": {
@@ -742,5 +2159,4 @@ class BLEngine:
             },
             "yearly_table": yearly_table,
             "summary": summary,
-            "warnings": input_warnings
         }
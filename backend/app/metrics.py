@@ -0,0 +1,96 @@
+"""Vectorized performance metrics for many return series at once.
+
+run_backtest, evaluate_performance.py, defense_overlay.py and
+parameter_sweep.py all score strategies with the same handful of numbers.
+``performance_matrix`` computes them for a (variants, days) matrix of daily
+returns in one NumPy pass, so scoring hundreds of sweep or overlay variants
+costs about as much as scoring one.
+
+Conventions (identical to the pandas code these replace):
+  * vol is the sample std (ddof=1) of daily returns times sqrt(252);
+  * Sharpe / Sortino are annualized excess ratios, (mean * 252 - rf) / vol
+    and the same over the sample std of the negative days only;
+  * max drawdown is measured on the compounded curve, starting from the
+    value before the first return;
+  * CAGR uses ``years`` when given (e.g. calendar time between the curve's
+    first and last date), else trading days / 252.
+Undefined ratios come back as NaN (vol 0 gives Sharpe 0, as before).
+"""
+
+import numpy as np
+
+TRADING_DAYS = 252
+
+
+def returns_from_curves(curves):
+    """Daily simple returns of value curves, (variants, days) -> (variants, days - 1)."""
+    curves = np.atleast_2d(np.asarray(curves, dtype=float))
+    return curves[:, 1:] / curves[:, :-1] - 1.0
+
+
+def years_between(start, end):
+    """Calendar years between two timestamps (365.25-day years)."""
+    return (end - start).days / 365.25
+
+
+def _drawdowns(equity):
+    """Worst drop of each row of ``equity`` (compounded from 1.0) below its running peak."""
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    return np.minimum((equity / peak).min(axis=1) - 1.0, 0.0)
+
+
+def max_drawdowns(returns):
+    """Worst peak-to-trough drop of each row's compounded curve (<= 0)."""
+    returns = np.atleast_2d(np.asarray(returns, dtype=float))
+    return _drawdowns(np.cumprod(1.0 + returns, axis=1))
+
+
+def _downside_std(returns):
+    """Row-wise ddof=1 std of the negative returns only (NaN if fewer than 2)."""
+    mask = returns < 0
+    n = mask.sum(axis=1)
+    neg = np.where(mask, returns, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = neg.sum(axis=1) / n
+        var = (np.einsum("ij,ij->i", neg, neg) - n * mean * mean) / (n - 1)
+    return np.where(n >= 2, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+
+def performance_matrix(returns, rf_ann=0.0, years=None):
+    """Metrics for every row of ``returns`` (1-D input is treated as one row).
+
+    ``rf_ann`` and ``years`` may be scalars or one value per row. Returns a
+    dict of arrays: total_return, cagr, vol, sharpe, sortino, max_dd, calmar.
+    """
+    returns = np.atleast_2d(np.asarray(returns, dtype=float))
+    n_days = returns.shape[1]
+    rf_ann = np.broadcast_to(np.asarray(rf_ann, dtype=float), (len(returns),))
+    years = np.full(len(returns), n_days / TRADING_DAYS) if years is None else (
+        np.broadcast_to(np.asarray(years, dtype=float), (len(returns),)))
+
+    equity = np.cumprod(1.0 + returns, axis=1)
+    growth = equity[:, -1] if n_days else np.ones(len(returns))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cagr = np.where(years > 0, growth ** (1.0 / years) - 1.0, np.nan)
+    excess = returns.mean(axis=1) * TRADING_DAYS - rf_ann
+    vol = (returns.std(axis=1, ddof=1) if n_days >= 2 else np.full(len(returns), np.nan)) * np.sqrt(TRADING_DAYS)
+    down = _downside_std(returns) * np.sqrt(TRADING_DAYS)
+    max_dd = _drawdowns(equity)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sharpe = np.where(vol > 0, excess / vol, 0.0)
+        sortino = np.where(down > 0, excess / down, 0.0)
+        calmar = np.where(max_dd < 0, cagr / np.abs(max_dd), np.nan)
+    return {
+        "total_return": growth - 1.0,
+        "cagr": cagr,
+        "vol": vol,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "max_dd": max_dd,
+        "calmar": calmar,
+    }
+
+
+def metrics_row(metrics, i=0):
+    """Plain-float dict of row ``i`` of a performance_matrix result."""
+    return {k: float(v[i]) for k, v in metrics.items()}
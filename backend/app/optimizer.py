@@ -0,0 +1,288 @@
+"""Array-level Black-Litterman posterior and max-Sharpe solver.
+
+optimize_bl_portfolio goes through pypfopt (BlackLittermanModel +
+EfficientFrontier/cvxpy), which costs ~30 ms per call, almost all of it in
+problem construction. For the small, dense problems this engine solves
+(absolute views, long-only, one weight cap) both steps have cheap exact forms:
+
+  * the BL posterior for absolute views with Idzorek confidences is two small
+    linear solves (same formulas as pypfopt's bl_returns / bl_cov);
+  * max-Sharpe under box constraints is a convex QP after the usual
+    y = w / k transformation, solved here with a primal active-set method
+    that can be warm-started from the previous weights.
+
+Every function returns None when it cannot certify an answer, so callers can
+fall back to the pypfopt path; sharpe_feasible tells them when that fallback
+would fail as well.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+BL_TAU = 0.05          # pypfopt BlackLittermanModel default
+CLEAN_CUTOFF = 1e-4    # pypfopt clean_weights defaults
+CLEAN_ROUNDING = 5
+
+
+def idzorek_omega(S, view_idx, conf, tau=BL_TAU):
+    """Diagonal of Idzorek's omega for absolute views (pypfopt closed form)."""
+    conf = np.asarray(conf, dtype=float)
+    var = np.diag(S)[view_idx]
+    with np.errstate(divide="ignore"):
+        alpha = (1.0 - conf) / conf
+    return np.where(conf == 0, 1e6, tau * alpha * var)
+
+
+def bl_posterior(S, pi, view_idx, q, conf, tau=BL_TAU):
+    """Posterior (returns, covariance) for absolute views on ``view_idx``.
+
+    Matches pypfopt's bl_returns() / bl_cov() with omega="idzorek".
+    """
+    view_idx = np.asarray(view_idx, dtype=int)
+    tau_sigma_P = tau * S[:, view_idx]
+    A = tau * S[np.ix_(view_idx, view_idx)] + np.diag(idzorek_omega(S, view_idx, conf, tau))
+    b = np.asarray(q, dtype=float) - pi[view_idx]
+    post_ret = pi + tau_sigma_P @ np.linalg.solve(A, b)
+    post_cov = S + tau * S - tau_sigma_P @ np.linalg.solve(A, tau_sigma_P.T)
+    return post_ret, post_cov
+
+
+def bl_posterior_batch(S, pi, view_mask, Q, conf, tau=BL_TAU):
+    """Stacked posteriors for B absolute-view sets sharing one prior (S, pi).
+
+    ``view_mask``, ``Q`` and ``conf`` are (B, n): which assets carry a view in
+    each set, the view returns and the confidences (ignored where unmasked).
+    Absolute views make P'Omega^-1 P diagonal, so in precision form every
+    posterior is one small solve with A_b = (tau S)^-1 + diag(d_b),
+    d_b = 1/omega_b on viewed assets:
+
+        M_b = A_b^-1,  mu_b = pi + M_b (d_b * (q_b - pi)),  cov_b = S + M_b
+
+    which is algebraically identical to bl_posterior. Returns (B, n) returns
+    and (B, n, n) covariances.
+    """
+    S = np.asarray(S, dtype=float)
+    pi = np.asarray(pi, dtype=float)
+    view_mask = np.asarray(view_mask, dtype=bool)
+    n = len(pi)
+    conf = np.where(view_mask, np.asarray(conf, dtype=float), 0.5)
+    omega = idzorek_omega(S, np.arange(n), conf, tau)
+    with np.errstate(divide="ignore"):
+        d = np.where(view_mask, 1.0 / omega, 0.0)
+    A = np.linalg.inv(tau * S)[None, :, :] + d[:, :, None] * np.eye(n)[None, :, :]
+    M = np.linalg.inv(A)
+    b = d * (np.where(view_mask, np.asarray(Q, dtype=float), 0.0) - pi)
+    post_ret = pi + np.einsum("bij,bj->bi", M, b)
+    return post_ret, S[None, :, :] + M
+
+
+class PosteriorState:
+    """BL posterior for absolute views kept in precision form, one view at a time.
+
+    With A = (tau S)^-1 + diag(d) (d_k = 1/omega_k on viewed assets, else 0)
+    the posterior is M = A^-1, mu = pi + M (d * (q - pi)), cov = S + M, as in
+    bl_posterior_batch. Adding, changing or removing the view on one asset
+    changes a single diagonal entry of A, so M is patched with a
+    Sherman-Morrison rank-1 update (O(n^2)) instead of being re-factorized;
+    every ``refresh_every`` updates it is recomputed exactly to bound drift.
+    """
+
+    def __init__(self, S, pi, tau=BL_TAU, refresh_every=64):
+        self.S = np.asarray(S, dtype=float)
+        self.pi = np.asarray(pi, dtype=float)
+        self.tau = tau
+        self.refresh_every = refresh_every
+        n = len(self.pi)
+        self.prior_precision = np.linalg.inv(tau * self.S)
+        self.d = np.zeros(n)
+        self.q = np.zeros(n)
+        self.M = tau * self.S
+        self._updates = 0
+
+    @property
+    def has_views(self):
+        return bool((self.d > 0).any())
+
+    def _precision(self, k, conf):
+        omega = idzorek_omega(self.S, [k], [conf], self.tau)[0]
+        return 1.0 / omega
+
+    def refresh(self):
+        """Exact recomputation of M from the current views."""
+        self.M = np.linalg.inv(self.prior_precision + np.diag(self.d))
+        self._updates = 0
+
+    def set_views(self, view_idx, q, conf):
+        """Replace every view at once (exact)."""
+        self.d[:] = 0.0
+        self.q[:] = 0.0
+        for k, qk, ck in zip(view_idx, q, conf):
+            self.d[k] = self._precision(k, ck)
+            self.q[k] = qk
+        self.refresh()
+
+    def set_view(self, k, q=None, conf=None):
+        """Set (or with q=None remove) the view on asset k via a rank-1 update."""
+        d_new = 0.0 if q is None else self._precision(k, conf)
+        self.q[k] = 0.0 if q is None else float(q)
+        step = d_new - self.d[k]
+        self.d[k] = d_new
+        if step == 0.0:
+            return
+        if self._updates >= self.refresh_every:
+            self.refresh()
+            return
+        col = self.M[:, k].copy()
+        self.M -= (step / (1.0 + step * col[k])) * np.outer(col, col)
+        self._updates += 1
+
+    def posterior(self):
+        """(posterior returns, posterior covariance)."""
+        b = self.d * (self.q - self.pi)
+        return self.pi + self.M @ b, self.S + self.M
+
+
+def clean_weights(w):
+    """pypfopt's clean_weights(): zero tiny weights, round to 5 decimals."""
+    w = np.where(np.abs(w) < CLEAN_CUTOFF, 0.0, w)
+    return np.round(w, CLEAN_ROUNDING)
+
+
+def _feasible_start(excess, lo, hi, warm):
+    """A point satisfying the box + budget constraints with positive excess return."""
+    n = len(excess)
+    if warm is not None:
+        w = np.asarray(warm, dtype=float)
+        if (abs(w.sum() - 1.0) < 1e-6 and (w >= lo - 1e-9).all() and (w <= hi + 1e-9).all()
+                and excess @ w > 1e-12):
+            return np.clip(w, lo, hi)
+    # Equal weights start in the interior (empty working set), which usually
+    # needs the fewest active-set iterations.
+    w = np.full(n, 1.0 / n)
+    if lo <= w[0] <= hi and excess @ w > 1e-12:
+        return w
+    # Greedy fill maximizes excess return over the feasible set; if even that
+    # is not positive the max-Sharpe problem has no solution.
+    w = np.full(n, lo)
+    room = 1.0 - w.sum()
+    for j in np.argsort(-excess):
+        add = min(hi - lo, room)
+        w[j] += add
+        room -= add
+        if room <= 1e-15:
+            break
+    if room > 1e-9 or excess @ w <= 1e-12:
+        return None
+    return w
+
+
+@lru_cache(maxsize=16)
+def _box_constraints(n, lo, hi):
+    """G with G @ y >= 0 for lo*sum(y) <= y <= hi*sum(y): rows 0..n-1 are
+    y_i >= lo*sum(y), rows n..2n-1 are y_i <= hi*sum(y). Read-only (cached)."""
+    eye, ones = np.eye(n), np.ones((n, n))
+    G = np.vstack([eye - lo * ones, hi * ones - eye])
+    G.flags.writeable = False
+    return G
+
+
+def sharpe_feasible(mu, risk_free_rate, max_weight, min_weight=0.0):
+    """Whether some portfolio under ``min_weight <= w <= max_weight`` beats the
+    risk-free rate; when not, max-Sharpe has no solution (pypfopt raises too)."""
+    excess = np.asarray(mu, dtype=float) - risk_free_rate
+    n = len(excess)
+    lo, hi = max(0.0, float(min_weight)), min(1.0, float(max_weight))
+    if excess.max() <= 0 or hi * n < 1.0 - 1e-12 or lo * n > 1.0 + 1e-12:
+        return False
+    return _feasible_start(excess, lo, hi, None) is not None
+
+
+def max_sharpe(mu, S, risk_free_rate, max_weight, min_weight=0.0, warm=None, max_iter=None):
+    """Long-only max-Sharpe weights under ``min_weight <= w <= max_weight``.
+
+    Solves min y'Sy s.t. (mu - rf)'y = 1, lo*sum(y) <= y <= hi*sum(y) (the same
+    transformation pypfopt's max_sharpe uses) with a primal active-set method
+    started from ``warm`` (e.g. yesterday's weights) when it is feasible.
+    Returns raw (uncleaned) weights summing to 1, or None.
+    """
+    mu = np.asarray(mu, dtype=float)
+    S = np.asarray(S, dtype=float)
+    n = len(mu)
+    lo, hi = max(0.0, float(min_weight)), min(1.0, float(max_weight))
+    excess = mu - risk_free_rate
+    if excess.max() <= 0 or hi * n < 1.0 - 1e-12 or lo * n > 1.0 + 1e-12:
+        return None
+    w0 = _feasible_start(excess, lo, hi, warm)
+    if w0 is None:
+        return None
+
+    G = _box_constraints(n, lo, hi)
+    H = 2.0 * S
+    y = w0 / (excess @ w0)
+    scale = max(np.abs(y).max(), 1.0)
+    tol = 1e-11 * scale
+
+    working = [int(j) for j in np.flatnonzero(np.abs(G @ y) <= tol)]
+    # Bound rows on distinct assets, with at least one asset left free, are
+    # linearly independent, and excess (excess @ y = 1 while G[working] @ y = 0)
+    # is never in their span; only other working sets need the rank test.
+    distinct = len({j % n for j in working}) == len(working) < n
+    if working and not distinct and np.linalg.matrix_rank(np.vstack([excess, G[working]])) < len(working) + 1:
+        independent = []
+        for j in working:
+            if np.linalg.matrix_rank(np.vstack([excess, G[independent + [j]]])) == len(independent) + 2:
+                independent.append(j)
+        working = independent
+
+    max_iter = max_iter or (6 * n + 20)
+    for _ in range(max_iter):
+        m = len(working) + 1
+        K = np.zeros((n + m, n + m))
+        K[:n, :n] = H
+        K[n, :n] = K[:n, n] = excess
+        if working:
+            Gw = G[working]
+            K[n + 1:, :n] = Gw
+            K[:n, n + 1:] = Gw.T
+        rhs = np.zeros(n + m)
+        rhs[:n] = -(H @ y)
+        try:
+            sol = np.linalg.solve(K, rhs)
+        except np.linalg.LinAlgError:
+            return None
+        p, nu = sol[:n], sol[n:]
+        lam = -nu[1:]  # multipliers of the working inequalities at y + p
+
+        if np.abs(p).max() <= 1e-12 * scale:
+            if len(lam) == 0 or lam.min() >= -1e-10:
+                return _normalized(y)
+            working.pop(int(np.argmin(lam)))
+            continue
+
+        alpha, blocking = 1.0, None
+        slopes = G @ p
+        candidates = slopes < -1e-15
+        candidates[working] = False
+        if candidates.any():
+            idx = np.flatnonzero(candidates)
+            steps = -(G[idx] @ y) / slopes[idx]
+            j = int(np.argmin(steps))
+            if steps[j] < alpha:
+                alpha, blocking = max(float(steps[j]), 0.0), int(idx[j])
+        y = y + alpha * p
+        if blocking is not None:
+            working.append(blocking)
+            continue
+        # A full step lands on the optimum of the current working set, and the
+        # solve that produced it already holds its multipliers: stop here or
+        # drop a constraint without re-solving for p = 0.
+        if len(lam) == 0 or lam.min() >= -1e-10:
+            return _normalized(y)
+        working.pop(int(np.argmin(lam)))
+    return None
+
+
+def _normalized(y):
+    k = y.sum()
+    return None if k <= 0 else y / k
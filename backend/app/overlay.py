@@ -0,0 +1,136 @@
+"""Grid-vectorized risk overlays on a daily strategy return series.
+
+An overlay scales the strategy's daily exposure and parks the rest at the
+risk-free rate: r_overlay = e * r + (1 - e) * rf. Two exposure rules are
+supported, each lagged one day (no look-ahead):
+
+  * volatility targeting: target / (rolling std over ``lookback`` days
+    * sqrt(252)), fully invested while the window is still filling;
+  * trend filter: 1 while SPY closes above its ``sma``-day average, else 0
+    (the SMA runs on SPY's full history, so it is warm at the start).
+
+A variant combines one vol rule (or None) with one trend rule (or None):
+e = clip(min(vol exposure, cap) * trend signal, floor, cap). With the default
+floor 0 and cap 1 this is exactly defense_overlay.py's product of the two
+clipped exposures. OverlayGrid
+builds every exposure series of a parameter grid as one (variants, days)
+matrix: rolling stds are computed once per lookback and SMAs once per window,
+so a thousand variants cost one matrix expression plus one
+metrics.performance_matrix call.
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import performance_matrix
+
+OVERLAY_MAX_VARIANTS = 5000
+# Values per grid axis (vol_targets, vol_lookbacks, ...) a request may list.
+OVERLAY_MAX_AXIS_VALUES = 64
+# Stress windows scored when a request names none (inclusive date ranges).
+STRESS_WINDOWS = {
+    "GFC 07-09": ("2007-10-09", "2009-03-09"),
+    "COVID 20": ("2020-02-19", "2020-03-23"),
+    "2022 bear": ("2022-01-03", "2022-10-12"),
+}
+
+
+def rolling_std(x, window):
+    """pandas ``Series.rolling(window).std()`` (ddof=1) for a 1-D array, via cumsums."""
+    x = np.asarray(x, dtype=float)
+    out = np.full(len(x), np.nan)
+    if window < 2 or len(x) < window:
+        return out
+    c1 = np.concatenate([[0.0], np.cumsum(x)])
+    c2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    s1 = c1[window:] - c1[:-window]
+    s2 = c2[window:] - c2[:-window]
+    out[window - 1:] = np.sqrt(np.maximum((s2 - s1 * s1 / window) / (window - 1), 0.0))
+    return out
+
+
+def grid_size(vol_targets=(None,), vol_lookbacks=(21,), sma_windows=(None,), floors=(0.0,), caps=(1.0,)):
+    """Number of distinct variants grid_params would return, without building them."""
+    targets = set(vol_targets)
+    vol_rules = len(targets - {None}) * len(set(vol_lookbacks)) + (None in targets)
+    return vol_rules * len(set(sma_windows)) * len(set(map(float, floors))) * len(set(map(float, caps)))
+
+
+def grid_params(vol_targets=(None,), vol_lookbacks=(21,), sma_windows=(None,), floors=(0.0,), caps=(1.0,)):
+    """Every distinct variant of a parameter grid, as dicts (vol rules first).
+
+    A variant without a vol target ignores the lookback, so it appears once.
+    """
+    params, seen = [], set()
+    for target, lookback, sma, floor, cap in itertools.product(vol_targets, vol_lookbacks, sma_windows, floors, caps):
+        key = (target, lookback if target is not None else None, sma, floor, cap)
+        if key in seen:
+            continue
+        seen.add(key)
+        params.append({"vol_target": key[0], "vol_lookback": key[1], "sma_window": sma,
+                       "floor": float(floor), "cap": float(cap)})
+    return params
+
+
+class OverlayGrid:
+    """Exposures and overlaid returns of every variant of a parameter grid."""
+
+    def __init__(self, strat_rets, rf_daily, spy, params):
+        self.index = strat_rets.index
+        self.params = params
+        r = strat_rets.to_numpy(dtype=float)
+        rf = rf_daily.reindex(self.index).fillna(0.0).to_numpy(dtype=float)
+
+        floor = np.array([p["floor"] for p in params])[:, None]
+        cap = np.array([p["cap"] for p in params])[:, None]
+        # No vol rule = unbounded vol exposure (the cap then binds).
+        target = np.array([1.0 if p["vol_target"] is None else p["vol_target"] for p in params])[:, None]
+
+        # Lagged realized vol, one row per distinct lookback; 0 while a window
+        # fills and in the extra last row (no vol rule), so target / vol = inf.
+        lookbacks = sorted({p["vol_lookback"] for p in params if p["vol_target"] is not None})
+        lb_row = {lb: k for k, lb in enumerate(lookbacks)}
+        realized = np.zeros((len(lookbacks) + 1, len(r)))
+        for lb, k in lb_row.items():
+            realized[k, 1:] = np.nan_to_num(rolling_std(r, lb)[:-1] * np.sqrt(252))
+        vol_rows = np.array([lb_row[p["vol_lookback"]] if p["vol_target"] is not None else len(lookbacks)
+                             for p in params])
+
+        # Lagged trend signal, one row per distinct SMA window (all ones = no rule).
+        windows = sorted({p["sma_window"] for p in params if p["sma_window"] is not None})
+        sma_row = {w: k for k, w in enumerate(windows)}
+        trend = np.ones((len(windows) + 1, len(r)))
+        for w, k in sma_row.items():
+            raw = (spy > spy.rolling(w).mean()).astype(float)
+            trend[k] = raw.shift(1).reindex(self.index).ffill().fillna(1.0).to_numpy(dtype=float)
+        trend_rows = np.array([sma_row.get(p["sma_window"], len(windows)) for p in params])
+
+        with np.errstate(divide="ignore"):
+            exposure = target / realized[vol_rows]
+        np.minimum(exposure, cap, out=exposure)
+        exposure *= trend[trend_rows]
+        np.maximum(exposure, floor, out=exposure)
+        self.exposure = exposure
+        self.returns = exposure * (r - rf)[None, :]
+        self.returns += rf[None, :]
+        self.rf_ann = float(rf.mean() * 252) if len(rf) else 0.0
+
+    def window_returns(self, windows):
+        """{name: array of each variant's return over [start, end]} (NaN if < 2 days)."""
+        equity = np.cumprod(1.0 + self.returns, axis=1)
+        out = {}
+        for name, (start, end) in windows.items():
+            s = int(self.index.searchsorted(pd.Timestamp(start), side="left"))
+            e = int(self.index.searchsorted(pd.Timestamp(end), side="right")) - 1
+            out[name] = equity[:, e] / equity[:, s] - 1.0 if e - s >= 1 else np.full(len(self.params), np.nan)
+        return out
+
+    def score(self, windows=None):
+        """Metrics (metrics.performance_matrix), window returns and average exposure per variant."""
+        return {
+            "metrics": performance_matrix(self.returns, self.rf_ann),
+            "windows": self.window_returns(windows or {}),
+            "avg_exposure": self.exposure.mean(axis=1),
+        }
@@ -0,0 +1,135 @@
+"""On-demand profiling of single API requests (cProfile + tracemalloc).
+
+A request is profiled when
+
+  * BL_PROFILE_TOKEN is set and the request carries ``X-Profile: <token>``, or
+  * BL_PROFILE=1, which profiles every eligible request (debug deployments).
+
+Unprofiled requests only pay for the header check. A profiled request runs
+its computation with a deterministic profiler on the request thread and
+tracemalloc tracing allocations; the report (hottest functions, peak traced
+memory, top allocation sites, raw pstats data) is kept under a random id in
+a small in-memory LRU and served by /profiles/{id}.
+
+Only one request is profiled at a time (tracemalloc is process-wide); a
+request asking while another is being profiled runs unprofiled. Backtests
+started by a request run inline on its thread, so their work is profiled too.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+PROFILE_TOKEN = os.environ.get("BL_PROFILE_TOKEN", "")
+PROFILE_ALL = os.environ.get("BL_PROFILE", "0").lower() in ("1", "true", "yes")
+# Reports kept in memory (oldest evicted first).
+PROFILE_MAX_ENTRIES = int(os.environ.get("BL_PROFILE_MAX_ENTRIES", "20"))
+# Rows in the function and allocation tables of a report.
+PROFILE_TOP = 30
+# Stack frames tracemalloc records per allocation.
+PROFILE_TRACE_FRAMES = 1
+
+_busy = threading.Lock()
+
+
+def requested(headers):
+    """True when a request with these headers should be profiled."""
+    if PROFILE_ALL:
+        return True
+    return bool(PROFILE_TOKEN) and headers.get("x-profile") == PROFILE_TOKEN
+
+
+def authorized(headers):
+    """Whether these headers may read stored profiles (the admin token, if one is set)."""
+    return not PROFILE_TOKEN or headers.get("x-profile") == PROFILE_TOKEN
+
+
+class ProfileStore:
+    """Thread-safe LRU of profile reports by id."""
+
+    def __init__(self, max_entries=PROFILE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, report):
+        with self._lock:
+            self._reports[report["id"]] = report
+            while len(self._reports) > self.max_entries:
+                self._reports.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._reports.get(profile_id)
+
+    def summaries(self):
+        """Newest first, without the bulky fields."""
+        with self._lock:
+            reports = list(self._reports.values())
+        return [{k: r[k] for k in ("id", "endpoint", "created", "wall_seconds", "peak_memory_bytes")}
+                for r in reversed(reports)]
+
+    def __len__(self):
+        return len(self._reports)
+
+
+def _functions(stats):
+    rows = sorted(stats.stats.items(), key=lambda kv: -kv[1][3])[:PROFILE_TOP]
+    return [{"function": pstats.func_std_string((file, line, name)),
+             "calls": nc, "tottime": round(tt, 6), "cumtime": round(ct, 6)}
+            for (file, line, name), (_, nc, tt, ct, _) in rows]
+
+
+def _allocations(snapshot):
+    return [{"where": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+
+
+@contextmanager
+def profiled(endpoint, store):
+    """Profile the enclosed block into a report added to ``store``.
+
+    Yields a dict whose "id" is set when the block is being profiled, or is
+    None when another request holds the profiler; the caller adds extra
+    fields to it (e.g. "timings") before the block ends.
+    """
+    if not _busy.acquire(blocking=False):
+        yield {"id": None}
+        return
+    report = {"id": uuid.uuid4().hex, "endpoint": endpoint,
+              "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            yield report
+        finally:
+            profiler.disable()
+            report["wall_seconds"] = round(time.perf_counter() - t0, 6)
+            report["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            report["top_allocations"] = _allocations(tracemalloc.take_snapshot())
+            text = io.StringIO()
+            stats = pstats.Stats(profiler, stream=text)
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            report["top_functions"] = _functions(stats)
+            report["text"] = text.getvalue()
+            # Same bytes as Stats.dump_stats: loadable by pstats / snakeviz.
+            report["pstats"] = marshal.dumps(stats.stats)
+            store.add(report)
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _busy.release()
@@ -0,0 +1,288 @@
+"""Interactive scenario sessions.
+
+A dashboard slider re-posts the whole scenario on every tick, and
+run_scenario rebuilds the covariance, prior, dynamic views and optimizer each
+time. A ScenarioSession builds those once for a date and keeps the posterior
+in precision form (optimizer.PosteriorState): changing one view patches the
+posterior with a rank-1 update and the max-Sharpe solve restarts from the
+previous weights, so each interaction costs a few milliseconds.
+
+Sessions are snapshots: they keep the prior (and therefore the data) they
+were opened on, even if the app reloads prices afterwards.
+
+SessionStore keeps sessions in the process. SharedSessionStore keeps them in
+a SQLite file, so any worker of a multi-worker server (BL_SHARED_DIR, see
+app/shared.py) can serve any call of a session.
+"""
+
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from app import optimizer
+from app.cache import shared_connection
+from app.engine import MIN_WEIGHT, SCENARIO_MAX_WEIGHT, optimize_bl_portfolio
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX = 256         # live sessions kept (least recently used evicted first)
+SESSION_IDLE_TTL_S = 1800  # sessions idle this long are dropped
+SESSION_UPDATE_RETRIES = 5  # SharedSessionStore: attempts when workers race on one session
+SESSION_UPDATE_STRIPES = 64  # SharedSessionStore: locks that serialize one worker's updates per session
+
+
+class ScenarioSession:
+    """The prior for one date plus the user's current views."""
+
+    def __init__(self, engine, inputs):
+        self.id = uuid.uuid4().hex
+        self.engine = engine
+        self.inputs = inputs
+        S, pi = inputs["S"], inputs["pi"]
+        self.cols = list(S.columns)
+        self.pos = {t: k for k, t in enumerate(self.cols)}
+        self.user_views = []
+        self.state = optimizer.PosteriorState(S.to_numpy(dtype=float), pi.reindex(self.cols).to_numpy(dtype=float))
+        # Effective (q, confidence) per asset currently loaded into self.state.
+        self.loaded = {}
+        self.warm = None
+        self.touched = time.monotonic()
+        self._lock = threading.Lock()
+        self._sync()
+
+    def __getstate__(self):
+        # Stored without the engine (reattached on load) and the lock.
+        state = dict(vars(self))
+        del state["engine"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.engine = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, engine, target_date=None):
+        inputs = engine._scenario_inputs(target_date)
+        if "error" in inputs:
+            return inputs
+        return cls(engine, inputs)
+
+    def _sync(self):
+        """Bring the posterior in line with the dynamic + user views, one asset at a time."""
+        view_dict, conf_series = dict(self.inputs["view_dict"]), self.inputs["conf_series"].copy()
+        applied, input_warnings = self.engine._apply_scenario_views(
+            view_dict, conf_series, self.inputs["pi"], self.user_views
+        )
+        wanted = {}
+        for t, q in view_dict.items():
+            if t in self.pos:
+                c = conf_series.get(t, np.nan)
+                wanted[t] = (float(q), 0.50 if pd.isna(c) else float(c))
+        for t in sorted(set(self.loaded) | set(wanted), key=self.pos.get):
+            if self.loaded.get(t) != wanted.get(t):
+                q, c = wanted.get(t, (None, None))
+                self.state.set_view(self.pos[t], q, c)
+        self.loaded = wanted
+        self.view_dict, self.conf_series = view_dict, conf_series
+        self.applied, self.input_warnings = applied, input_warnings
+
+    def set_views(self, user_views):
+        with self._lock:
+            self.user_views = [dict(v) for v in user_views]
+            self._sync()
+            return self.recommendation()
+
+    def update_view(self, view):
+        """Add or replace the user's view on ``view["ticker"]``."""
+        with self._lock:
+            self.user_views = [v for v in self.user_views if v["ticker"] != view["ticker"]] + [dict(view)]
+            self._sync()
+            return self.recommendation()
+
+    def remove_view(self, ticker):
+        with self._lock:
+            self.user_views = [v for v in self.user_views if v["ticker"] != ticker]
+            self._sync()
+            return self.recommendation()
+
+    def recommendation(self):
+        """run_scenario-shaped response for the current views."""
+        t0 = time.perf_counter()
+        self.touched = time.monotonic()
+        inputs = self.inputs
+        S, pi, w_anchor = inputs["S"], inputs["pi"], inputs["w_anchor"]
+        tickers = self.engine.tickers
+        if not self.state.has_views:
+            # No views at all: the posterior collapses to the prior.
+            weights, ret_post, S_post = w_anchor.reindex(tickers).fillna(0.0), pi.copy(), S
+        else:
+            post_ret, post_cov = self.state.posterior()
+            raw = optimizer.max_sharpe(post_ret, post_cov, inputs["rf_now"], SCENARIO_MAX_WEIGHT, MIN_WEIGHT,
+                                       warm=self.warm)
+            if raw is not None:
+                self.warm = raw
+                weights = pd.Series(optimizer.clean_weights(raw), index=self.cols).reindex(tickers).fillna(0.0)
+                ret_post = pd.Series(post_ret, index=self.cols)
+                S_post = pd.DataFrame(post_cov, index=self.cols, columns=self.cols)
+            else:
+                logger.debug("Session %s: active-set solver gave up; using pypfopt.", self.id)
+                try:
+                    weights, ret_post, S_post = optimize_bl_portfolio(
+                        S, pi, self.view_dict, self.conf_series, inputs["delta"], tickers, w_anchor,
+                        SCENARIO_MAX_WEIGHT, risk_free_rate=inputs["rf_now"],
+                    )
+                except Exception as e:
+                    return {"error": f"Optimization failed: {e}"}
+        result = self.engine._scenario_report(inputs, weights, ret_post, S_post, self.applied, self.input_warnings)
+        result["session_id"] = self.id
+        result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        return result
+
+
+class SessionStore:
+    """Thread-safe LRU of ScenarioSessions with an idle timeout."""
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL_S):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.monotonic()
+        for sid in [sid for sid, s in self._sessions.items() if now - s.touched > self.idle_ttl]:
+            del self._sessions[sid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def add(self, session):
+        with self._lock:
+            self._sessions[session.id] = session
+            self._expire()
+        return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def update(self, session_id, change):
+        """``change(session)``'s result, or None for an unknown session."""
+        session = self.get(session_id)
+        return None if session is None else change(session)
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SharedSessionStore(SessionStore):
+    """SessionStore in a SQLite file shared by the workers of one host.
+
+    Sessions are pickled without their engine; a loaded session is attached to
+    ``engine()`` (the worker's current engine), while its prior stays the one
+    it was opened on. Each row carries a version: update() applies a change
+    and saves it only if no other worker saved that session meanwhile,
+    otherwise it reloads and applies the change again. The last loaded copy
+    of each session is kept in memory, so calls that keep landing on the
+    same worker skip unpickling. Within a worker, updates of one session take
+    turns (a lock striped by id), so retries only cover races between workers
+    and two threads never change the same in-memory copy at once.
+    """
+
+    def __init__(self, path, engine, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL_S):
+        super().__init__(max_sessions, idle_ttl)
+        self.path = path
+        self.engine = engine
+        self._local = threading.local()
+        self._update_locks = [threading.Lock() for _ in range(SESSION_UPDATE_STRIPES)]
+        with self._db() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions "
+                       "(id TEXT PRIMARY KEY, state BLOB, version INTEGER, touched REAL)")
+
+    def _db(self):
+        return shared_connection(self._local, self.path)
+
+    def _load(self, session_id):
+        """(version, session) of a live session, or None."""
+        for _ in range(SESSION_UPDATE_RETRIES):
+            row = self._db().execute("SELECT version, touched FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None or time.time() - row[1] > self.idle_ttl:
+                return None
+            with self._lock:
+                local = self._sessions.get(session_id)
+            if local is not None and local[0] == row[0]:
+                return local
+            blob = self._db().execute("SELECT state FROM sessions WHERE id = ? AND version = ?",
+                                      (session_id, row[0])).fetchone()
+            if blob is not None:  # else saved again in between: read the new version
+                session = pickle.loads(blob[0])
+                session.engine = self.engine()
+                return row[0], session
+        raise RuntimeError(f"Session {session_id} is being changed concurrently; try again.")
+
+    def _remember(self, version, session):
+        with self._lock:
+            self._sessions[session.id] = (version, session)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def add(self, session):
+        now = time.time()
+        blob = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._db() as db:
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, 1, ?)", (session.id, blob, now))
+            db.execute("DELETE FROM sessions WHERE touched < ?", (now - self.idle_ttl,))
+            db.execute("DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY touched DESC "
+                       "LIMIT -1 OFFSET ?)", (self.max_sessions,))
+        self._remember(1, session)
+        return session
+
+    def get(self, session_id):
+        """A copy of the session as last saved (changes need update())."""
+        loaded = self._load(session_id)
+        return None if loaded is None else loaded[1]
+
+    def update(self, session_id, change):
+        with self._update_locks[hash(session_id) % SESSION_UPDATE_STRIPES]:
+            for _ in range(SESSION_UPDATE_RETRIES):
+                loaded = self._load(session_id)
+                if loaded is None:
+                    return None
+                version, session = loaded
+                result = change(session)
+                blob = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+                with self._db() as db:
+                    saved = db.execute("UPDATE sessions SET state = ?, version = ?, touched = ? "
+                                       "WHERE id = ? AND version = ?",
+                                       (blob, version + 1, time.time(), session_id, version)).rowcount
+                if saved:
+                    self._remember(version + 1, session)
+                    return result
+                with self._lock:
+                    self._sessions.pop(session_id, None)  # our copy is stale (and now modified)
+        raise RuntimeError(f"Session {session_id} is being changed concurrently; try again.")
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        with self._db() as db:
+            return db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def __len__(self):
+        return self._db().execute("SELECT COUNT(*) FROM sessions WHERE touched >= ?",
+                                  (time.time() - self.idle_ttl,)).fetchone()[0]
@@ -0,0 +1,205 @@
+"""Prepared price panel shared by the uvicorn workers of one host.
+
+With BL_SHARED_DIR set, the first worker to start loads the prices, builds the
+engine's aligned panel and its default SignalPanel, and publishes them as .npy
+files; every worker (the first included) then memory-maps them read-only. The
+operating system keeps one copy of those pages for all of them, however many
+workers run:
+
+    <root>/panel-<data_version>/meta.json   data_version, tickers, train windows
+    <root>/panel-<data_version>/*.npy       dates, assets, market, rf, signals-<tw>-*
+    <root>/current.json                     segment in use, its generation and check time
+    <root>/results.sqlite                   SharedResultCache (app/cache.py)
+    <root>/sessions.sqlite                  SharedSessionStore (app/sessions.py)
+
+Publishing happens under an exclusive lock file and a segment is written to a
+temporary directory before it is renamed into place, as in app/artifacts.py.
+A segment is reused only by workers of the same server generation (see
+generation()), so a restart reloads and re-checks the data. The periodic
+refresh does the same: one worker downloads and republishes, the others
+attach to what it published.
+
+The default (BL_SHARED_DIR unset) keeps the one-engine-per-process setup.
+"""
+
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from app.engine import TRAIN_WINDOW, BLEngine
+from app.signals import SignalPanel
+from app.telemetry import timed
+
+logger = logging.getLogger(__name__)
+
+# "" disables sharing. /dev/shm keeps the segments in RAM on Linux; any local
+# directory works (the page cache then holds the one shared copy).
+SHARED_DIR = os.environ.get("BL_SHARED_DIR", "")
+# Published segments kept (the current one and its predecessors, which workers
+# that have not refreshed yet may still map).
+SHARED_KEEP_SEGMENTS = 2
+# Overrides generation() (see there); "" = derive it from the process tree.
+SHARED_GENERATION = os.environ.get("BL_SHARED_GENERATION", "")
+CURRENT = "current.json"
+LOCK = ".lock"
+RESULTS_DB = "results.sqlite"
+SESSIONS_DB = "sessions.sqlite"
+
+
+def _start_time(pid):
+    """Start time of ``pid`` in clock ticks since boot ("" where /proc is missing)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+
+def generation():
+    """Identifies one server run: the workers of a uvicorn supervisor share it.
+
+    That is the supervisor's pid and start time (uvicorn --workers starts its
+    workers through multiprocessing), or this process's own when it serves
+    alone, so a restart from the same shell is a new generation. Launchers
+    that fork workers themselves (e.g. gunicorn) can set BL_SHARED_GENERATION
+    to a value unique to each launch.
+    """
+    if SHARED_GENERATION:
+        return SHARED_GENERATION
+    parent = multiprocessing.parent_process()
+    pid = parent.pid if parent is not None else os.getpid()
+    return f"{pid}-{_start_time(pid)}"
+
+
+@contextmanager
+def _locked(root):
+    os.makedirs(root, mode=0o700, exist_ok=True)
+    with open(os.path.join(root, LOCK), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_current(root):
+    """The current.json pointer, or None when nothing was published yet."""
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_current(root, current):
+    tmp = os.path.join(root, f".{CURRENT}-{uuid.uuid4().hex[:8]}")
+    with open(tmp, "w") as f:
+        json.dump(current, f)
+    os.replace(tmp, os.path.join(root, CURRENT))
+
+
+def _segment(root, data_version):
+    return os.path.join(root, f"panel-{data_version}")
+
+
+@timed("shared_publish")
+def publish(engine, root, train_windows=(TRAIN_WINDOW,)):
+    """Write ``engine``'s prepared panel (and its SignalPanels for
+    ``train_windows``) as a segment under ``root``; returns its folder."""
+    folder = _segment(root, engine.data_version)
+    if os.path.exists(folder):
+        return folder
+    tmp = os.path.join(root, f".tmp-{uuid.uuid4().hex[:8]}")
+    os.makedirs(tmp)
+    try:
+        arrays = {
+            "dates": engine.asset_prices.index.asi8,
+            "assets": engine.asset_prices.to_numpy(dtype=float),
+            "market": engine.market_prices.to_numpy(dtype=float),
+            "rf": engine.rf_daily.to_numpy(dtype=float),
+        }
+        for tw in train_windows:
+            for name, values in engine.signal_panel(tw).arrays().items():
+                arrays[f"signals-{tw}-{name}"] = values
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(values))
+        meta = {"data_version": engine.data_version, "tickers": list(engine.asset_prices.columns),
+                "train_windows": [int(tw) for tw in train_windows], "arrays": sorted(arrays),
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, folder)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return folder
+
+
+@timed("shared_attach")
+def attach(folder, checkpoints=None):
+    """BLEngine over a published segment, its arrays memory-mapped read-only."""
+    with open(os.path.join(folder, "meta.json")) as f:
+        meta = json.load(f)
+
+    def mapped(name):
+        return np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r")
+
+    index = pd.DatetimeIndex(np.asarray(mapped("dates")).view("datetime64[ns]"))
+    # DataFrame/Series over the mapping itself (no copy): writing would raise.
+    asset_prices = pd.DataFrame(mapped("assets"), index=index, columns=meta["tickers"], copy=False)
+    market_prices = pd.Series(mapped("market"), index=index, name="SPY", copy=False)
+    rf_daily = pd.Series(mapped("rf"), index=index, name="^IRX", copy=False)
+    panels = {}
+    for tw in meta["train_windows"]:
+        prefix = f"signals-{tw}-"
+        arrays = {name[len(prefix):]: mapped(name) for name in meta["arrays"] if name.startswith(prefix)}
+        panels[tw] = SignalPanel.from_arrays(index, meta["tickers"], tw, arrays)
+    return BLEngine.from_prepared(asset_prices, market_prices, rf_daily, meta["data_version"],
+                                  signal_panels=panels, checkpoints=checkpoints)
+
+
+def _prune(root, keep):
+    folders = sorted((f for f in os.listdir(root) if f.startswith("panel-")),
+                     key=lambda f: os.path.getmtime(os.path.join(root, f)), reverse=True)
+    for folder in folders:
+        if folder not in keep and folders.index(folder) >= SHARED_KEEP_SEGMENTS:
+            # Workers still mapping it keep their pages until they let go.
+            shutil.rmtree(os.path.join(root, folder), ignore_errors=True)
+
+
+def shared_engine(root, load_prices, build_engine, checkpoints=None, current_engine=None, max_age=None):
+    """Engine attached to the panel published under ``root``, loading and
+    publishing it first when needed.
+
+    ``load_prices()`` and ``build_engine(prices)`` run in at most one worker at
+    a time, and only when the published segment belongs to another server
+    generation or (with ``max_age`` seconds, for the periodic refresh) was
+    checked longer ago than that. Returns ``current_engine`` when the
+    segment it serves is still current and the data did not change.
+    """
+    with _locked(root):
+        current = read_current(root)
+        fresh = (current is not None and current["generation"] == generation()
+                 and (max_age is None or time.time() - current["checked"] < max_age)
+                 and os.path.isdir(_segment(root, current["data_version"])))
+        if not fresh:
+            prices = load_prices()
+            if prices.empty:
+                raise ValueError("No price data to publish.")
+            engine = build_engine(prices)
+            folder = publish(engine, root)
+            current = {"data_version": engine.data_version, "generation": generation(), "checked": time.time()}
+            _write_current(root, current)
+            _prune(root, keep={os.path.basename(folder)})
+            logger.info("Published shared panel %s.", engine.data_version)
+    if current_engine is not None and current_engine.data_version == current["data_version"]:
+        return current_engine
+    return attach(_segment(root, current["data_version"]), checkpoints=checkpoints)
@@ -0,0 +1,277 @@
+"""Precomputed, vectorized per-date inputs for the fast backtest path.
+
+The standard walk-forward rebuilds every input (Ledoit-Wolf covariance, risk
+aversion, regimes, leadership, view signals) from a fresh training slice at
+each rebalance, which is fine every 63 days but not every day. SignalPanel
+computes each input ONCE over the whole history as a rolling statistic, so a
+decision costs an O(1) lookup (or an O(n^2) sliding-window update for the
+covariance) instead of a rebuild. A panel is read-only once built and shared by
+concurrent requests; the sliding covariance window is per walk (cursor()).
+
+Row convention: decision row ``i`` uses the training window
+``[i - train_window, i)``, exactly like run_backtest, so arrays have
+``len(index) + 1`` rows (row ``len(index)`` is "as of the latest close").
+Every quantity reproduces the corresponding engine helper up to floating-point
+noise; tests/test_engine.py checks them against each other.
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.telemetry import timed
+
+ANNUALIZE = 252
+LEADERSHIP_WINDOW = 125  # returns in compute_leadership_features' 126-day slice
+REGIME_VOL_WINDOW = 63   # detect_vol_regime's rolling-vol window
+DEFAULT_MARKET_RF = 0.02  # pypfopt's market_implied_risk_aversion default
+
+
+class RollingMoments:
+    """Sliding-window sums of a (T, n) return matrix, updated row by row.
+
+    Tracks sum(x), sum(x x'), sum(|x|^2 x) and sum(|x|^4) over the window
+    ``[end - window, end)``, which is everything the sample covariance and the
+    Ledoit-Wolf shrinkage intensity need. Moving the window forward by one row
+    costs O(n^2); jumps longer than the window, moves backwards and every
+    ``resync`` rows trigger an exact recomputation so rounding never drifts.
+    """
+
+    def __init__(self, rows, window, resync=252):
+        self.x = rows
+        self.window = window
+        self.resync = resync
+        self.end = None
+        self._steps = 0
+
+    def _reset(self, end):
+        X = self.x[end - self.window:end]
+        a = np.einsum("ij,ij->i", X, X)
+        self.s1 = X.sum(axis=0)
+        self.s2 = X.T @ X
+        self.s3 = a @ X
+        self.s4 = float(a @ a)
+        self.end = end
+        self._steps = 0
+
+    def _push(self, row, sign):
+        a = float(row @ row)
+        self.s1 += sign * row
+        self.s2 += sign * np.outer(row, row)
+        self.s3 += (sign * a) * row
+        self.s4 += sign * a * a
+
+    def advance_to(self, end):
+        if end == self.end:
+            return self
+        if (self.end is None or end < self.end or end - self.end > self.window
+                or self._steps + (end - self.end) > self.resync):
+            self._reset(end)
+            return self
+        for t in range(self.end, end):
+            self._push(self.x[t], 1.0)
+            self._push(self.x[t - self.window], -1.0)
+        self._steps += end - self.end
+        self.end = end
+        return self
+
+    def covariance(self, ddof=1):
+        N = self.window
+        m = self.s1 / N
+        return (self.s2 - N * np.outer(m, m)) / (N - ddof)
+
+    def ledoit_wolf(self):
+        """Ledoit-Wolf shrunk covariance (constant-variance target, biased
+        empirical covariance), identical to sklearn.covariance.ledoit_wolf."""
+        N = self.window
+        p = len(self.s1)
+        m = self.s1 / N
+        C = self.s2 / N - np.outer(m, m)
+        if p == 1:
+            return C
+        mu = np.trace(C) / p
+        delta_ = float((C ** 2).sum())
+        c = float(m @ m)
+        beta_ = (self.s4 - 4.0 * (m @ self.s3) + 4.0 * (m @ self.s2 @ m)
+                 + 2.0 * c * np.trace(self.s2) - 3.0 * N * c * c)
+        beta = (beta_ / N - delta_) / (p * N)
+        delta = (delta_ - 2.0 * mu * np.trace(C) + p * mu ** 2) / p
+        beta = min(beta, delta)
+        shrinkage = 0.0 if beta == 0 else beta / delta
+        shrunk = (1.0 - shrinkage) * C
+        shrunk.flat[::p + 1] += shrinkage * mu
+        return shrunk
+
+
+class CovarianceCursor:
+    """One walk's sliding Ledoit-Wolf window over a SignalPanel's returns.
+
+    The panel's arrays are read-only and shared by every request on the
+    engine; the window is not, so each walk slides its own cursor.
+    """
+
+    def __init__(self, returns, window):
+        self._moments = RollingMoments(returns, window)
+
+    @timed("covariance")
+    def covariance(self, i):
+        """Annualized Ledoit-Wolf covariance for decision row i (cf. equilibrium_inputs).
+
+        Rows should be requested in increasing order; the window then slides
+        forward instead of being rebuilt.
+        """
+        return self._moments.advance_to(i).ledoit_wolf() * ANNUALIZE
+
+
+def _lagged(x, k):
+    """out[i] = x[i - k] for decision rows i = 0..len(x); NaN where undefined."""
+    T = len(x)
+    out = np.full((T + 1,) + x.shape[1:], np.nan)
+    if k <= T:
+        out[k:] = x[:T + 1 - k]
+    return out
+
+
+def _window_sums(x, window):
+    """out[i] = sum(x[i - window:i]) for decision rows i; NaN before the window fills."""
+    c = np.concatenate([np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)])
+    out = np.full(c.shape, np.nan)
+    out[window:] = c[window:] - c[:-window]
+    return out
+
+
+def _window_std(x, window, ddof=1):
+    n = float(window)
+    s1 = _window_sums(x, window)
+    s2 = _window_sums(x * x, window)
+    var = (s2 - s1 * s1 / n) / (n - ddof)
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+class SignalPanel:
+    """All view-independent backtest inputs for every decision row at once."""
+
+    def __init__(self, asset_prices: pd.DataFrame, market_prices: pd.Series, train_window: int):
+        self.index = asset_prices.index
+        self.tickers = list(asset_prices.columns)
+        self.train_window = tw = int(train_window)
+
+        p = asset_prices.to_numpy(dtype=float)
+        m = market_prices.reindex(self.index).to_numpy(dtype=float)
+        T, n = p.shape
+        rets = np.zeros_like(p)
+        rets[1:] = p[1:] / p[:-1] - 1.0
+        mrets = np.zeros(T)
+        mrets[1:] = m[1:] / m[:-1] - 1.0
+        self.prices = p
+        self.market = m
+        self.returns = rets
+        self.market_returns = mrets
+
+        rows = np.arange(T + 1)
+        N = tw - 1  # returns inside a train_window-long price slice
+        p_last, m_last = _lagged(p, 1), _lagged(m, 1)
+
+        # --- generate_dynamic_views / detect_concentration_regime inputs ---
+        if tw >= 253:
+            self.raw_mom = p_last / _lagged(p, 253) - 1.0
+            self.spy_trend = m_last / _lagged(m, 253) - 1.0
+        else:
+            self.raw_mom = np.full((T + 1, n), np.nan)
+            self.spy_trend = np.full(T + 1, np.nan)
+        self.raw_rev = -(p_last / _lagged(p, 22) - 1.0) if tw >= 22 else np.full((T + 1, n), np.nan)
+        self.asset_vol = _window_std(rets, N) * np.sqrt(ANNUALIZE)
+
+        # --- equilibrium: market-implied risk aversion (unclamped) ---
+        mkt_mean = _window_sums(mrets, N) / N
+        mkt_var = _window_std(mrets, N) ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.delta_raw = (mkt_mean * ANNUALIZE - DEFAULT_MARKET_RF) / (mkt_var * ANNUALIZE)
+
+        # --- ML features ---
+        self.spy_trend_12m = self.spy_trend.copy() if tw >= 260 else np.full(T + 1, np.nan)
+        self.spy_vol_6m = (_window_std(mrets, LEADERSHIP_WINDOW) * np.sqrt(ANNUALIZE)
+                           if tw >= 140 else np.full(T + 1, np.nan))
+
+        # --- detect_vol_regime: trailing vol vs. expanding median of 63d vol ---
+        rolling_vol = pd.Series(m, dtype=float).pct_change().rolling(REGIME_VOL_WINDOW).std() * np.sqrt(ANNUALIZE)
+        hist_median = _lagged(rolling_vol.expanding().median().to_numpy(), 1)
+        tail_std = _window_std(mrets, N)
+        c1 = np.concatenate([[0.0], np.cumsum(mrets)])
+        c2 = np.concatenate([[0.0], np.cumsum(mrets * mrets)])
+        short = (rows < tw) & (rows >= 3)  # whole history is shorter than the tail
+        k = rows[short] - 1.0
+        var_short = (c2[rows[short]] - c2[1] - (c1[rows[short]] - c1[1]) ** 2 / k) / (k - 1)
+        tail_std[short] = np.sqrt(np.maximum(var_short, 0.0))
+        self.realized_vol = tail_std * np.sqrt(ANNUALIZE)
+        self.hist_median = hist_median
+        with np.errstate(invalid="ignore"):
+            self.vol_high = ((rows >= 100) & np.isfinite(self.realized_vol) & np.isfinite(hist_median)
+                             & (self.realized_vol > hist_median))
+
+        # --- compute_leadership_features + detect_concentration_regime ---
+        self.leader_strength = np.full(T + 1, np.nan)
+        self.leader_breadth = np.full(T + 1, np.nan)
+        self.dispersion = np.full(T + 1, np.nan)
+        self.avg_corr = np.full(T + 1, np.nan)
+        self.conc_leader_z = np.full(T + 1, np.nan)
+        self.conc_breadth = np.full(T + 1, np.nan)
+        if tw >= 260 and T >= tw:
+            live = rows >= tw
+            rs12 = (p_last / _lagged(p, 252)) / (m_last / _lagged(m, 252))[:, None] - 1.0
+            rs6 = (p_last / _lagged(p, 126)) / (m_last / _lagged(m, 126))[:, None] - 1.0
+            score = 0.7 * rs12 + 0.3 * rs6
+            self.leader_strength[live] = score[live].max(axis=1)
+            self.leader_breadth[live] = (score[live] > 0).mean(axis=1)
+
+            moments = RollingMoments(rets, LEADERSHIP_WINDOW)
+            iu = np.triu_indices(n, k=1)
+            for i in rows[live]:
+                cov = moments.advance_to(i).covariance()
+                sd = np.sqrt(np.maximum(np.diag(cov), 0.0))
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    corr = cov / np.outer(sd, sd)
+                self.dispersion[i] = sd.mean() * np.sqrt(ANNUALIZE)
+                self.avg_corr[i] = corr[iu].mean()
+
+            mom = self.raw_mom[live]
+            z = (mom - mom.mean(axis=1, keepdims=True)) / (mom.std(axis=1, ddof=1, keepdims=True) + 1e-12)
+            self.conc_leader_z[live] = z.max(axis=1)
+            self.conc_breadth[live] = (mom > 0).mean(axis=1)
+
+    def arrays(self):
+        """The panel's precomputed arrays by attribute name (see from_arrays)."""
+        return {k: v for k, v in vars(self).items() if isinstance(v, np.ndarray)}
+
+    @classmethod
+    def from_arrays(cls, index, tickers, train_window, arrays):
+        """Panel over precomputed ``arrays`` (e.g. memory-mapped, read-only).
+        Like any panel it holds no mutable state: each walk slides its own
+        covariance window via ``cursor()``."""
+        panel = cls.__new__(cls)
+        panel.index = index
+        panel.tickers = list(tickers)
+        panel.train_window = int(train_window)
+        vars(panel).update(arrays)
+        return panel
+
+    def __len__(self):
+        return len(self.index)
+
+    def cursor(self):
+        """A new CovarianceCursor over this panel (one per walk, not shared)."""
+        return CovarianceCursor(self.returns, self.train_window - 1)
+
+    def row_for(self, date):
+        """Decision row whose training window ends on the last close <= date."""
+        return int(self.index.searchsorted(pd.Timestamp(date), side="right"))
+
+    def ml_features(self, i):
+        """The six ML features (build_ml_dataset order) for decision row(s) i."""
+        return np.column_stack([
+            np.atleast_1d(self.leader_strength[i]),
+            np.atleast_1d(self.leader_breadth[i]),
+            np.atleast_1d(self.dispersion[i]),
+            np.atleast_1d(self.avg_corr[i]),
+            np.atleast_1d(self.spy_trend_12m[i]),
+            np.atleast_1d(self.spy_vol_6m[i]),
+        ])
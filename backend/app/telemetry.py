@@ -0,0 +1,228 @@
+"""Per-request stage timers and Prometheus-format metrics.
+
+Hot paths mark their stages with ``with stage("covariance"): ...`` (or
+``@timed("covariance")`` for a whole function). Outside
+a request this is a no-op (one ContextVar lookup), so scripts and the
+benchmark-sensitive inner loops pay nothing. Inside ``collect(endpoint)``
+every stage's time and call count are summed for that request; when the
+request ends they are observed into histograms:
+
+    bl_request_seconds{endpoint}         wall time per request
+    bl_stage_seconds{endpoint, stage}    time per request spent in a stage
+
+Work fanned out to backtest worker processes runs through ``traced``,
+which times it in the worker and returns the stage totals with the result,
+so ``merge`` can add them to the parent's request. Stage times of parallel
+work are therefore CPU-side sums and may exceed the request's wall time.
+
+``REGISTRY.render()`` produces the Prometheus text exposition format;
+gauges (cache hit counters, queue depths) are registered as callables and
+read at scrape time. No client library is needed.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the histogram buckets; +Inf is implied.
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current = ContextVar("bl_stage_timings", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current request, if any."""
+    acc = _current.get()
+    if acc is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(acc, name, time.perf_counter() - t0, 1)
+
+
+def timed(name):
+    """Decorator: every call of the function is stage ``name``."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _add(acc, name, seconds, calls):
+    total = acc.get(name)
+    if total is None:
+        acc[name] = [seconds, calls]
+    else:
+        total[0] += seconds
+        total[1] += calls
+
+
+def traced(fn, *args, **kwargs):
+    """(fn(*args, **kwargs), its stage totals); picklable, for executor.submit/map."""
+    acc = {}
+    token = _current.set(acc)
+    try:
+        return fn(*args, **kwargs), acc
+    finally:
+        _current.reset(token)
+
+
+def merge(spent):
+    """Add stage totals returned by ``traced`` to the current request."""
+    acc = _current.get()
+    if acc is not None:
+        for name, (seconds, calls) in spent.items():
+            _add(acc, name, seconds, calls)
+
+
+class Timings(dict):
+    """{stage: [seconds, calls]} of one request, plus its wall time."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+        self.total = None
+
+    def elapsed(self):
+        return self.total if self.total is not None else time.perf_counter() - self.started
+
+    def block(self):
+        """JSON form, slowest stage first; while the request runs, total is so far."""
+        return {
+            "total_ms": round(self.elapsed() * 1000, 3),
+            "stages": {
+                name: {"ms": round(seconds * 1000, 3), "calls": calls}
+                for name, (seconds, calls) in sorted(self.items(), key=lambda kv: -kv[1][0])
+            },
+        }
+
+    def server_timing(self):
+        """Server-Timing header value with one metric per stage."""
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, (seconds, _) in self.items())
+
+
+@contextmanager
+def collect(endpoint):
+    """Collect the stages of one request; observed into the histograms on exit."""
+    acc = Timings()
+    token = _current.set(acc)
+    INFLIGHT.add(endpoint, 1)
+    try:
+        yield acc
+    finally:
+        acc.total = time.perf_counter() - acc.started
+        _current.reset(token)
+        INFLIGHT.add(endpoint, -1)
+        REQUEST_SECONDS.observe(acc.total, endpoint=endpoint)
+        for name, (seconds, _) in acc.items():
+            STAGE_SECONDS.observe(seconds, endpoint=endpoint, stage=name)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, values)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help_text, tuple(labelnames), buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Value(s) read at scrape time: ``fn()`` returns a number or {label value: number}."""
+
+    def __init__(self, name, help_text, fn, label=None, kind="gauge"):
+        self.name, self.help, self.fn, self.label, self.kind = name, help_text, fn, label, kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.fn()
+        except Exception:  # a broken gauge must not break the scrape
+            return []
+        if isinstance(value, dict):
+            for k, v in sorted(value.items()):
+                lines.append(f"{self.name}{_labels((self.label,), (k,))} {v}")
+        elif value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class _Counts:
+    """Thread-safe {label: int}, e.g. requests in flight per endpoint."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, n):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, help_text, labelnames=()):
+        metric = Histogram(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, fn, label=None, kind="gauge"):
+        metric = Gauge(name, help_text, fn, label, kind)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram("bl_request_seconds", "Wall time per request.", ("endpoint",))
+STAGE_SECONDS = REGISTRY.histogram("bl_stage_seconds", "Time per request spent in each engine stage.",
+                                   ("endpoint", "stage"))
+INFLIGHT = _Counts()
+REGISTRY.gauge("bl_requests_in_flight", "Requests currently being served.", INFLIGHT.snapshot, label="endpoint")
@@ -0,0 +1,386 @@
+"""benchmarks/loadtest.py
+
+Load generator for the API: a mix of scenario, Monte Carlo and backtest
+requests at a fixed concurrency, reporting throughput and p50/p95/p99
+latency per endpoint plus the server's CPU and memory.
+
+Targets:
+
+  in-process (default)  main.app driven through httpx's ASGI transport in
+                        this process (one event loop + the sync endpoints'
+                        thread pool, as under a single uvicorn worker)
+  --spawn N             starts `uvicorn main:app --workers N` on a free
+                        local port, offline on the chosen data, and drives it
+                        over HTTP (the way to compare worker counts)
+  --url URL             an already running server
+
+Data (in-process and --spawn) is "cached" (app/data/prices.parquet as it
+is, no refresh) or "synthetic" (a seeded 11-sector panel from
+benchmarks/panels.py), so runs are offline and repeatable.
+
+Each of the --concurrency clients sends its next request as soon as the
+previous one is answered (closed loop), picking the endpoint by the --mix
+weights. --distinct sets how many different request bodies each endpoint
+cycles through: 1 means every repeat is a cache hit, a large number means
+mostly cold computations. Server settings (cache size, executors, workers
+per backtest, ...) are the usual BL_* environment variables; with --spawn,
+pass them as --env KEY=VALUE.
+
+Run it from the backend/ folder:
+
+    cd backend
+    python -m benchmarks.loadtest --duration 30 --concurrency 8
+    python -m benchmarks.loadtest --spawn 4 --mix scenario=8,monte_carlo=4 --out load.json
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --requests 500
+
+CPU is the server's CPU seconds per wall second (1.0 = one core busy);
+memory is the peak resident set size of the server's processes, sampled
+every SAMPLE_SECONDS (psutil if installed, else /proc on Linux).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # optional: /proc is read instead (Linux only)
+    psutil = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {
+    "scenario": "/recommendation/scenario",
+    "monte_carlo": "/simulation/monte_carlo",
+    "backtest": "/simulation/backtest",
+}
+DEFAULT_MIX = "scenario=10,monte_carlo=5,backtest=1"
+# Synthetic panel: ~21 years ending on SYNTHETIC_END, so the server's default
+# warm-up backtest range falls inside it.
+SYNTHETIC_DAYS = 5500
+SYNTHETIC_END = "2026-01-06"
+SEED = 0
+SAMPLE_SECONDS = 0.5
+READY_TIMEOUT = 600
+REQUEST_TIMEOUT = 600
+SECTORS = ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK", "XLP", "XLRE", "XLU", "XLV", "XLY"]
+
+
+def parse_mix(text):
+    """{"scenario": 10, ...} from "scenario=10,monte_carlo=5"."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}'. Use: {', '.join(ENDPOINTS)}.")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The mix needs at least one endpoint with a positive weight.")
+    return mix
+
+
+def request_bodies(distinct, dates):
+    """{endpoint: [body, ...]} with ``distinct`` different bodies per endpoint.
+
+    ``dates`` (the panel's trading days) spreads the backtests' start dates
+    over the history; every backtest ends on the last date.
+    """
+    first, last = dates[0], dates[-1]
+    # Backtests need two years of training data before their start.
+    earliest = dates[min(len(dates) - 1, 600)]
+    span = max((last - earliest).days - 365, 1)
+    bodies = {"scenario": [], "monte_carlo": [], "backtest": []}
+    for k in range(distinct):
+        bodies["scenario"].append({"views": [] if k == 0 else [
+            {"ticker": SECTORS[k % len(SECTORS)], "value": round(0.01 * (k % 7 + 1), 4),
+             "confidence": round(0.3 + 0.1 * (k % 5), 2)}]})
+        bodies["monte_carlo"].append({"mu": round(0.06 + 0.0005 * k, 6), "sigma": 0.15, "days": 252})
+        start = earliest + pd.Timedelta(days=(k * 97) % span)
+        bodies["backtest"].append({"start_date": str(start.date()), "end_date": str(last.date()), "views": []})
+    return bodies
+
+
+def load_prices(data):
+    if data == "synthetic":
+        from benchmarks.panels import synthetic_panel
+        prices = synthetic_panel(SYNTHETIC_DAYS, len(SECTORS), SEED)[0]
+        prices.index = pd.bdate_range(end=SYNTHETIC_END, periods=len(prices))
+        return prices
+    from app import data_loader
+    return pd.read_parquet(data_loader.PRICES_FILE)
+
+
+class ProcessMonitor:
+    """Samples CPU seconds and RSS of a process and its descendants."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_rss = 0
+        self._task = None
+
+    def _tree(self):
+        if psutil is not None:
+            root = psutil.Process(self.pid)
+            return [root] + root.children(recursive=True)
+        children = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                    children.setdefault(ppid, []).append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        tree, todo = [], [self.pid]
+        while todo:
+            pid = todo.pop()
+            tree.append(pid)
+            todo.extend(children.get(pid, []))
+        return tree
+
+    def usage(self):
+        """(cpu seconds, rss bytes) summed over the live tree, or (None, None)."""
+        try:
+            procs = self._tree()
+        except Exception:
+            return None, None
+        cpu = rss = 0
+        for p in procs:
+            try:
+                if psutil is not None:
+                    times = p.cpu_times()
+                    cpu += times.user + times.system
+                    rss += p.memory_info().rss
+                else:
+                    with open(f"/proc/{p}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+                    rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            except Exception:
+                continue  # exited between listing and reading
+        return cpu, rss
+
+    async def _sample(self):
+        while True:
+            _, rss = self.usage()
+            self.peak_rss = max(self.peak_rss, rss or 0)
+            await asyncio.sleep(SAMPLE_SECONDS)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+def _own_cpu():
+    # Includes reaped children (e.g. a finished backtest's process pool).
+    return sum(getattr(resource.getrusage(who), f) for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+               for f in ("ru_utime", "ru_stime"))
+
+
+async def drive(client, bodies, mix, concurrency, duration, max_requests, seed=SEED):
+    """Run the load; returns the list of (endpoint, status, seconds, bytes)."""
+    names, weights = list(mix), list(mix.values())
+    rng = random.Random(seed)
+    plan = iter(lambda: rng.choices(names, weights)[0], None)
+    counters = {name: 0 for name in names}
+    records = []
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def client_loop():
+        while (deadline is None or time.perf_counter() < deadline) and (
+                max_requests is None or len(records) < max_requests):
+            name = next(plan)
+            body = bodies[name][counters[name] % len(bodies[name])]
+            counters[name] += 1
+            t0 = time.perf_counter()
+            try:
+                res = await client.post(ENDPOINTS[name], json=body)
+                status, size = res.status_code, len(res.content)
+            except Exception:
+                status, size = None, 0
+            records.append((name, status, time.perf_counter() - t0, size))
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return records
+
+
+def summarize(records, wall):
+    """Per-endpoint and overall throughput and latency percentiles (ms)."""
+    def stats(rows):
+        lat = np.array([r[2] for r in rows]) * 1000
+        ok = [r for r in rows if r[1] is not None and 200 <= r[1] < 400]
+        return {
+            "requests": len(rows), "errors": len(rows) - len(ok),
+            "throughput_rps": round(len(rows) / wall, 3) if wall else None,
+            "p50_ms": round(float(np.percentile(lat, 50)), 3), "p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3), "mean_ms": round(float(lat.mean()), 3),
+            "max_ms": round(float(lat.max()), 3), "mb_received": round(sum(r[3] for r in rows) / 1e6, 3),
+        }
+    out = {name: stats([r for r in records if r[0] == name]) for name in sorted({r[0] for r in records})}
+    if records:
+        out["all"] = stats(records)
+    return out
+
+
+async def _in_process(args, bodies, mix):
+    import main
+    logging.disable(logging.INFO)  # per-request log lines would dominate the run
+    prices = load_prices(args.data)
+    if args.no_artifacts:
+        main.artifact_store = None
+    main.bl_engine = main._build_engine(prices)
+    if not args.no_warmup:
+        main._warm_up(mark_ready=False)
+    monitor = ProcessMonitor(os.getpid())
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=REQUEST_TIMEOUT) as c:
+        return await _measured(c, monitor, args, bodies, mix, _own_cpu)
+
+
+async def _measured(client, monitor, args, bodies, mix, cpu_now=None):
+    cpu0 = cpu_now() if cpu_now else monitor.usage()[0]
+    monitor.start()
+    t0 = time.perf_counter()
+    records = await drive(client, bodies, mix, args.concurrency, args.duration, args.requests)
+    wall = time.perf_counter() - t0
+    await monitor.stop()
+    cpu1 = cpu_now() if cpu_now else monitor.usage()[0]
+    cpu = (cpu1 - cpu0) if cpu0 is not None and cpu1 is not None else None
+    return records, wall, {"cpu_seconds": round(cpu, 3) if cpu is not None else None,
+                           "cpu_cores_busy": round(cpu / wall, 3) if cpu is not None and wall else None,
+                           "peak_rss_mb": round(monitor.peak_rss / 1e6, 1) if monitor.peak_rss else None}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(client, proc):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("The server exited during startup.")
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("The server did not become ready in time.")
+
+
+async def _spawned(args, bodies, mix):
+    env = {**os.environ, "BL_DATA_OFFLINE": "1", **dict(kv.split("=", 1) for kv in args.env)}
+    if args.no_warmup:
+        env["BL_WARMUP"] = "off"
+    if args.no_artifacts:
+        env["BL_ARTIFACT_DIR"] = ""
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.data == "synthetic":
+            env["BL_PRICES_FILE"] = os.path.join(tmp, "prices.parquet")
+            load_prices("synthetic").to_parquet(env["BL_PRICES_FILE"])
+        port = _free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.spawn), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=REQUEST_TIMEOUT,
+                                         limits=httpx.Limits(max_connections=args.concurrency)) as client:
+                await _wait_ready(client, proc)
+                return await _measured(client, ProcessMonitor(proc.pid), args, bodies, mix)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+async def _remote(args, bodies, mix):
+    async with httpx.AsyncClient(base_url=args.url, timeout=REQUEST_TIMEOUT,
+                                 limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        records, wall, _ = await _measured(client, ProcessMonitor(-1), args, bodies, mix, cpu_now=lambda: None)
+        return records, wall, {"cpu_seconds": None, "cpu_cores_busy": None, "peak_rss_mb": None}
+
+
+def _print_report(report):
+    print(f"\n{'endpoint':<14}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'max ms':>10}")
+    for name, s in report["endpoints"].items():
+        print(f"{name:<14}{s['requests']:>9}{s['errors']:>8}{s['throughput_rps']:>9.2f}{s['p50_ms']:>10.1f}"
+              f"{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    server = report["server"]
+    print(f"\nWall {report['wall_seconds']:.1f}s; server CPU {server['cpu_cores_busy']} cores busy, "
+          f"peak RSS {server['peak_rss_mb']} MB.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--spawn", type=int, metavar="WORKERS", help="start a local uvicorn with this many workers")
+    target.add_argument("--url", help="drive an already running server")
+    parser.add_argument("--data", choices=("cached", "synthetic"), default="cached")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--distinct", type=int, default=20, help="different request bodies per endpoint")
+    parser.add_argument("--no-warmup", action="store_true", help="skip the server's warm-up")
+    parser.add_argument("--no-artifacts", action="store_true", help="disable the on-disk backtest store")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment of the spawned server (repeatable)")
+    parser.add_argument("--out", help="write the report JSON here")
+    args = parser.parse_args(argv)
+    if not args.duration and not args.requests:
+        parser.error("give --duration or --requests")
+    args.duration = args.duration or None
+
+    mix = parse_mix(args.mix)
+    dates = load_prices(args.data).index if args.url is None else pd.bdate_range("2005-01-03", "2026-01-06")
+    bodies = request_bodies(max(args.distinct, 1), dates)
+    target = f"uvicorn x{args.spawn}" if args.spawn else (args.url or "in-process")
+    print(f"Load test: {target}, {args.data} data, concurrency {args.concurrency}, mix {args.mix}...")
+    if args.spawn:
+        records, wall, server = asyncio.run(_spawned(args, bodies, mix))
+    elif args.url:
+        records, wall, server = asyncio.run(_remote(args, bodies, mix))
+    else:
+        records, wall, server = asyncio.run(_in_process(args, bodies, mix))
+
+    report = {
+        "target": target, "data": args.data, "concurrency": args.concurrency, "mix": mix,
+        "distinct": args.distinct, "wall_seconds": round(wall, 3), "endpoints": summarize(records, wall),
+        "server": server, "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    _print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Seeded synthetic price panels of any length and universe size.
+
+Same construction as the ``synthetic_prices`` test fixture, scaled up: a
+shared market factor gives the assets positive correlation and each asset
+adds its own beta, drift and noise. ^IRX is a flat 0%: on a random panel some
+training window has every asset below a 2% rate, which makes max-Sharpe
+infeasible; at 0% that needs every asset to lose money.
+
+The market series is SPY. With 11 assets the columns are the engine's own
+sector tickers, so a default BLEngine accepts the panel unchanged; larger
+universes are named A000, A001, ... and need ``BLEngine(tickers=...)``.
+"""
+
+import numpy as np
+import pandas as pd
+
+SECTORS = ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK", "XLP", "XLRE", "XLU", "XLV", "XLY"]
+START = "1950-01-02"
+
+
+def panel_tickers(n_assets):
+    return list(SECTORS) if n_assets == len(SECTORS) else [f"A{k:03d}" for k in range(n_assets)]
+
+
+def synthetic_panel(n_days, n_assets, seed=0):
+    """(prices, tickers): ``n_days`` business days of ``n_assets`` assets plus SPY and ^IRX."""
+    rng = np.random.default_rng(seed)
+    tickers = panel_tickers(n_assets)
+    dates = pd.bdate_range(START, periods=n_days)
+    market = rng.normal(0.0004, 0.010, n_days)
+    beta = rng.uniform(0.6, 1.4, n_assets)
+    drift = rng.normal(0.0002, 0.0001, n_assets)
+    idio = rng.normal(0.0, 1.0, (n_days, n_assets)) * rng.uniform(0.006, 0.012, n_assets)
+    rets = market[:, None] * beta + drift + idio
+    prices = pd.DataFrame(100.0 * np.exp(np.cumsum(rets, axis=0)), index=dates, columns=tickers)
+    prices["SPY"] = 100.0 * np.exp(np.cumsum(market))
+    # ^IRX is quoted as an annual percentage yield (e.g. 2.0 == 2%).
+    prices["^IRX"] = 0.0
+    return prices, tickers
@@ -0,0 +1,329 @@
+"""benchmarks/run.py
+
+Timing and peak-memory benchmarks of the engine's hot paths on seeded
+synthetic panels (benchmarks/panels.py), compared against a stored baseline.
+
+Benchmarks, each run on one or more panels (history length x universe size):
+
+  covariance        equilibrium_inputs: Ledoit-Wolf on one training window
+  optimize_pypfopt  optimize_bl_portfolio: BL posterior + pypfopt max-Sharpe
+  optimize_arrays   optimize_bl_portfolio_fast: closed form + active-set solver
+  run_scenario      one user view, as /recommendation/scenario computes it
+  run_monte_carlo   the dashboard's 252-day, 5,000-path projection
+  run_backtest      a cold backtest over the whole panel, per mode and
+                    REBALANCE_FREQ (fresh engine per run, so no checkpoints)
+
+Every benchmark is run REPEAT times (after one untimed warm-up call for the
+cheap ones); the median is what gets compared. Peak memory is the
+tracemalloc peak of one extra, separately traced run. Backtests run inline
+(BACKTEST_WORKERS = 1), so the numbers measure work, not process scheduling.
+
+Every suite also checks the published fast-mode target: one cold, daily,
+fast backtest over the app's own price file (LATENCY_RANGE, with the
+SignalPanel build) must finish within eng.FAST_LATENCY_TARGET_S. That check
+compares against the constant, not the baseline; it is skipped when the
+price file is missing.
+
+Suites: "quick" (default, about two minutes; meant for every change) and
+"full" (adds 5k / 20k-day histories and 100 / 500-asset universes; about
+half an hour). Each suite has its own baseline file.
+
+Run it from the backend/ folder:
+
+    cd backend
+    python -m benchmarks.run                      # quick suite vs benchmarks/baseline_quick.json
+    python -m benchmarks.run --suite full --out bench.json
+    python -m benchmarks.run --save-baseline      # accept the current numbers
+
+It prints a comparison table and exits with status 1 when a benchmark's
+median time (or peak memory) is worse than the baseline by more than the
+tolerance, a benchmark fails that did not fail in the baseline, or the
+fast-mode run misses its target. Timings depend on the machine: regenerate the baseline on the
+machine that runs the comparison.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import app.engine as eng
+from app import data_loader
+from app.engine import BLEngine
+from benchmarks.panels import synthetic_panel
+
+BASELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED = 0
+# A benchmark regresses when its median is more than TIME_TOLERANCE slower
+# than the baseline AND at least MIN_TIME_DELTA seconds slower (so noise on
+# millisecond benchmarks does not fail the run); likewise for memory.
+TIME_TOLERANCE = 0.25
+MIN_TIME_DELTA = 0.005
+MEMORY_TOLERANCE = 0.10
+MIN_MEMORY_DELTA = 1 << 20
+# Timed runs per benchmark (cheap ones also get one untimed warm-up call).
+REPEAT = {"covariance": 7, "optimize_pypfopt": 7, "optimize_arrays": 7, "run_scenario": 5,
+          "run_monte_carlo": 5, "run_backtest": 3}
+CHEAP = {"covariance", "optimize_pypfopt", "optimize_arrays", "run_scenario", "run_monte_carlo"}
+
+# Date range of the FAST_LATENCY_TARGET_S check (the Backtest page's defaults).
+LATENCY_RANGE = ("2006-01-01", "2026-01-06")
+
+MICRO = ["covariance", "optimize_pypfopt", "optimize_arrays", "run_scenario"]
+# (days, assets): benchmarks, where a backtest is (mode, rebalance frequency).
+SUITES = {
+    "quick": [
+        ((1000, 11), MICRO + [("standard", 63), ("standard", 21), ("fast", 1)]),
+        ((2500, 50), MICRO + [("standard", 63), ("fast", 5)]),
+    ],
+}
+SUITES["full"] = SUITES["quick"] + [
+    ((5000, 11), [("standard", 21), ("standard", 63), ("standard", 126), ("fast", 1), ("triggered", 63)]),
+    ((20000, 11), MICRO + [("standard", 63), ("fast", 1)]),
+    ((2500, 100), MICRO + [("standard", 63), ("fast", 5)]),
+    ((2500, 500), MICRO + [("standard", 126), ("fast", 126)]),
+]
+
+
+def _bench_id(name, days, assets, detail=""):
+    size = f"{days}d x {assets}a" if days else ""
+    return f"{name}[{', '.join(p for p in (detail, size) if p)}]"
+
+
+def _optimizer_inputs(engine):
+    """Latest-window equilibrium and views, with fallback views so BL always solves."""
+    train = engine.asset_prices.iloc[-eng.TRAIN_WINDOW:]
+    mkt = engine.market_prices.iloc[-eng.TRAIN_WINDOW:]
+    S, delta, pi, w_anchor = eng.get_equilibrium_from_anchor(train, mkt)
+    views, conf, _, _, _ = eng.generate_dynamic_views(train, pi, mkt, "low")
+    if not views:
+        views = {t: float(pi[t]) + 0.02 for t in engine.tickers[:3]}
+        conf = pi[list(views)] * 0 + 0.5
+    return S, pi, views, conf, delta, w_anchor
+
+
+def _benchmarks(prices, tickers, plan):
+    """Yields (name, detail, setup, run): run(setup()) is the timed call."""
+    engine = BLEngine(prices.copy(), tickers=tickers)
+    for item in plan:
+        if item == "covariance":
+            train = engine.asset_prices.iloc[-eng.TRAIN_WINDOW:]
+            mkt = engine.market_prices.iloc[-eng.TRAIN_WINDOW:]
+            yield item, "", lambda: None, lambda _: eng.equilibrium_inputs(train, mkt)
+        elif item in ("optimize_pypfopt", "optimize_arrays"):
+            fn = eng.optimize_bl_portfolio if item == "optimize_pypfopt" else eng.optimize_bl_portfolio_fast
+            S, pi, views, conf, delta, w_anchor = _optimizer_inputs(engine)
+            yield item, f"{len(views)} views", lambda: None, lambda _, fn=fn: fn(
+                S, pi, views, conf, delta, engine.tickers, w_anchor, eng.MAX_WEIGHT, risk_free_rate=0.0)
+        elif item == "run_scenario":
+            view = [{"ticker": engine.tickers[0], "value": 0.03, "confidence": 0.5}]
+            yield item, "", lambda: None, lambda _: engine.run_scenario(view)
+        else:
+            mode, freq = item
+            start, end = str(prices.index[0].date()), str(prices.index[-1].date())
+
+            def run(fresh, mode=mode, freq=freq):
+                if mode == "standard":
+                    # Standard mode always uses the module constant (cf. parameter_sweep.py).
+                    saved, eng.REBALANCE_FREQ = eng.REBALANCE_FREQ, freq
+                    try:
+                        result = fresh.run_backtest(start, end, [], mode=mode)
+                    finally:
+                        eng.REBALANCE_FREQ = saved
+                else:
+                    result = fresh.run_backtest(start, end, [], mode=mode, rebalance_freq=freq)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+
+            yield "run_backtest", f"{mode} f={freq}", lambda: BLEngine(prices.copy(), tickers=tickers), run
+
+
+def measure(name, setup, run, repeat, memory=True):
+    """{"seconds": {...}, "peak_memory_bytes": ...} of run(setup()), setup untimed."""
+    if name in CHEAP:
+        run(setup())
+    runs = []
+    for _ in range(repeat):
+        state = setup()
+        t0 = time.perf_counter()
+        run(state)
+        runs.append(time.perf_counter() - t0)
+    out = {"seconds": {"median": statistics.median(runs), "min": min(runs), "mean": statistics.fmean(runs),
+                       "runs": [round(r, 6) for r in runs]}}
+    if memory:
+        state = setup()
+        tracemalloc.start()
+        try:
+            run(state)
+            out["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return out
+
+
+def run_suite(suite, repeat=None, memory=True, only=None, log=print):
+    """Results document of one suite (see module docstring)."""
+    saved_workers, eng.BACKTEST_WORKERS = eng.BACKTEST_WORKERS, 1
+    results = []
+    try:
+        for (days, assets), plan in SUITES[suite]:
+            prices, tickers = synthetic_panel(days, assets, SEED)
+            for name, detail, setup, run in _benchmarks(prices, tickers, plan):
+                bench_id = _bench_id(name, days, assets, detail)
+                if only and only not in bench_id:
+                    continue
+                log(f"  {bench_id} ...", end=" ", flush=True)
+                try:
+                    res = measure(name, setup, run, repeat or REPEAT[name], memory)
+                    log(f"{res['seconds']['median'] * 1000:.1f} ms")
+                except Exception as e:
+                    # Recorded, not fatal: a size the engine cannot handle is a result too.
+                    res = {"error": f"{type(e).__name__}: {e}"}
+                    log(f"FAILED ({res['error'][:80]})")
+                results.append({"id": bench_id, "benchmark": name, "days": days, "assets": assets, **res})
+        # Monte Carlo does not depend on the panel: once per suite.
+        bench_id = _bench_id("run_monte_carlo", 0, 0, "252 days x 5000 paths")
+        if not only or only in bench_id:
+            prices, tickers = synthetic_panel(600, 11, SEED)
+            engine = BLEngine(prices, tickers=tickers)
+            log(f"  {bench_id} ...", end=" ", flush=True)
+            res = measure("run_monte_carlo", lambda: None, lambda _: engine.run_monte_carlo(0.08, 0.15),
+                          repeat or REPEAT["run_monte_carlo"], memory)
+            log(f"{res['seconds']['median'] * 1000:.1f} ms")
+            results.append({"id": bench_id, "benchmark": "run_monte_carlo", **res})
+    finally:
+        eng.BACKTEST_WORKERS = saved_workers
+    return {
+        "suite": suite,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.processor() or platform.machine(), "cpu_count": os.cpu_count(),
+                    "numpy": np.__version__},
+        "config": eng.BLEngine.config_fingerprint(),
+        "results": results,
+    }
+
+
+def check_fast_latency(log=print):
+    """{"id", "seconds", "target", "ok"} of one cold daily fast backtest over
+    the app's price file, or None when there is no price file."""
+    prices = data_loader._read_cache()  # the file as it is: never downloads
+    if prices is None:
+        log(f"  fast latency target: skipped, no price file at {data_loader.PRICES_FILE}")
+        return None
+    saved_workers, eng.BACKTEST_WORKERS = eng.BACKTEST_WORKERS, 1
+    try:
+        engine = BLEngine(prices)
+        t0 = time.perf_counter()
+        result = engine.run_backtest(*LATENCY_RANGE, [], mode="fast", rebalance_freq=eng.FAST_REBALANCE_FREQ)
+        seconds = time.perf_counter() - t0
+    finally:
+        eng.BACKTEST_WORKERS = saved_workers
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    out = {"id": f"fast_latency_target[daily, {' to '.join(LATENCY_RANGE)}]", "seconds": seconds,
+           "target": eng.FAST_LATENCY_TARGET_S, "ok": seconds <= eng.FAST_LATENCY_TARGET_S}
+    log(f"  {out['id']}: {seconds:.2f} s (target {out['target']:.1f} s) {'ok' if out['ok'] else 'MISSED'}")
+    return out
+
+
+def compare(current, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """One row per current result: {"id", "status", "time_ratio", "memory_ratio", ...}.
+
+    status is "regression", "faster" (better than the baseline by more than
+    the tolerance), "ok", "new" (not in the baseline), "failed" (the run
+    raised where the baseline's did not) or "still failing".
+    """
+    base = {r["id"]: r for r in baseline.get("results", [])}
+    rows = []
+    for r in current["results"]:
+        b = base.get(r["id"])
+        row = {"id": r["id"], "median": r.get("seconds", {}).get("median"), "status": "new",
+               "time_ratio": None, "memory_ratio": None}
+        if "error" in r:
+            row["status"] = "still failing" if b is not None and "error" in b else "failed"
+        elif b is not None and "error" in b:
+            row["status"] = "new"
+        elif b is not None:
+            now, then = r["seconds"]["median"], b["seconds"]["median"]
+            row.update(baseline_median=then, time_ratio=now / then if then else None, status="ok")
+            slower = now > then * (1 + time_tolerance) and now - then >= MIN_TIME_DELTA
+            faster = now < then / (1 + time_tolerance) and then - now >= MIN_TIME_DELTA
+            mem, mem_then = r.get("peak_memory_bytes"), b.get("peak_memory_bytes")
+            bigger = False
+            if mem is not None and mem_then:
+                row["memory_ratio"] = mem / mem_then
+                bigger = mem > mem_then * (1 + memory_tolerance) and mem - mem_then >= MIN_MEMORY_DELTA
+            if slower or bigger:
+                row["status"] = "regression"
+            elif faster:
+                row["status"] = "faster"
+        rows.append(row)
+    return rows
+
+
+def _print_comparison(rows):
+    print(f"\n{'benchmark':<52}{'base ms':>10}{'now ms':>10}{'time':>8}{'memory':>8}  status")
+    for row in rows:
+        base = f"{row['baseline_median'] * 1000:.1f}" if "baseline_median" in row else "-"
+        now = f"{row['median'] * 1000:.1f}" if row["median"] is not None else "-"
+        t = f"{row['time_ratio']:.2f}x" if row["time_ratio"] else "-"
+        m = f"{row['memory_ratio']:.2f}x" if row["memory_ratio"] else "-"
+        print(f"{row['id']:<52}{base:>10}{now:>10}{t:>8}{m:>8}  {row['status']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--baseline", help="baseline JSON to compare against (default: benchmarks/baseline_<suite>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--repeat", type=int, help="timed runs per benchmark (default: per benchmark)")
+    parser.add_argument("--only", help="run only benchmarks whose id contains this text")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory runs")
+    parser.add_argument("--tolerance", type=float, default=TIME_TOLERANCE, help="allowed slowdown (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+    args.baseline = args.baseline or os.path.join(BASELINE_DIR, f"baseline_{args.suite}.json")
+
+    print(f"Running the {args.suite} benchmark suite...")
+    current = run_suite(args.suite, args.repeat, not args.no_memory, args.only)
+    latency = check_fast_latency() if not args.only or args.only in "fast_latency_target" else None
+    current["latency"] = latency
+    missed = latency is not None and not latency["ok"]
+    if missed:
+        # Not a baseline: --save-baseline does not accept it either.
+        print(f"The fast-mode backtest missed FAST_LATENCY_TARGET_S ({latency['target']:.1f} s).")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=1)
+        print(f"Saved {args.out}")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=1)
+        print(f"Saved the baseline to {args.baseline}")
+        return 1 if missed else 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 1 if missed else 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != current["config"]:
+        print("Note: the engine constants changed since the baseline was recorded.")
+    rows = compare(current, baseline, args.tolerance)
+    _print_comparison(rows)
+    regressions = [r["id"] for r in rows if r["status"] in ("regression", "failed")]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond tolerance.")
+        return 1
+    print("\nNo regressions.")
+    return 1 if missed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
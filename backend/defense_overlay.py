@@ -24,17 +24,20 @@ It prints two tables (core risk-adjusted metrics + per-crash returns) comparing
 the baseline against each overlay, and writes defense_results.csv.
 
 NOTE: a single full-history backtest runs first and takes a minute or two; the
-overlays themselves are instant (they just reshape the daily returns). For quick
-iteration set FAST_START to a later date, e.g. "2007-01-01".
+overlays themselves are instant: every variant is one row of an
+app.overlay.OverlayGrid, scored in one vectorized pass. For quick iteration set
+FAST_START to a later date, e.g. "2007-01-01".
 """
 
 import sys
-import numpy as np
 import pandas as pd
 
 from app import data_loader
+from app.artifacts import default_store, load_or_run_backtest
 import app.engine as eng
 from app.engine import BLEngine
+from app.metrics import metrics_row
+from app.overlay import OverlayGrid
 
 FAST_START = None  # e.g. "2007-01-01"; None = full available history
 
@@ -54,49 +57,20 @@ CRASH_WINDOWS = {
 }
 
 
-def ann_metrics(rets, rf_daily):
-    rets = rets.dropna()
-    if rets.empty:
-        return {}
-    eq = (1 + rets).cumprod()
-    years = len(rets) / 252.0
-    cagr = eq.iloc[-1] ** (1 / years) - 1 if years > 0 else np.nan
-    vol = rets.std() * np.sqrt(252)
-    rf_ann = rf_daily.reindex(rets.index).fillna(0.0).mean() * 252
-    sharpe = (rets.mean() * 252 - rf_ann) / vol if vol > 0 else 0.0
-    dn = rets[rets < 0].std() * np.sqrt(252)
-    sortino = (rets.mean() * 252 - rf_ann) / dn if dn and dn > 0 else 0.0
-    max_dd = float((eq / eq.cummax() - 1).min())
-    calmar = cagr / abs(max_dd) if max_dd < 0 else np.nan
-    return {"cagr": cagr, "vol": vol, "sharpe": sharpe,
-            "sortino": sortino, "max_dd": max_dd, "calmar": calmar}
+def variant_params():
+    """{label: OverlayGrid params} for every variant in the report."""
+    def params(vol_target=None, sma_window=None):
+        return {"vol_target": vol_target, "vol_lookback": VOL_LOOKBACK if vol_target else None,
+                "sma_window": sma_window, "floor": EXPOSURE_FLOOR, "cap": EXPOSURE_CAP}
 
-
-def crash_returns(eq):
-    out = {}
-    for name, (s, e) in CRASH_WINDOWS.items():
-        seg = eq.loc[(eq.index >= s) & (eq.index <= e)]
-        out[name] = (seg.iloc[-1] / seg.iloc[0] - 1) if len(seg) > 1 else np.nan
-    return out
-
-
-def vol_target_exposure(strat_rets, target_vol):
-    realized = strat_rets.rolling(VOL_LOOKBACK).std() * np.sqrt(252)
-    exp = (target_vol / realized).shift(1)        # lag one day, no look-ahead
-    return exp.clip(EXPOSURE_FLOOR, EXPOSURE_CAP).fillna(EXPOSURE_CAP)
-
-
-def trend_exposure(spy, index, lookback):
-    sma = spy.rolling(lookback).mean()
-    raw = (spy > sma).astype(float)               # 1 = invested, 0 = to cash
-    exp = raw.shift(1).reindex(index).ffill().fillna(EXPOSURE_CAP)
-    return exp.clip(EXPOSURE_FLOOR, EXPOSURE_CAP)
-
-
-def apply_overlay(strat_rets, exposure, rf_daily):
-    exposure = exposure.reindex(strat_rets.index).fillna(EXPOSURE_CAP)
-    rf = rf_daily.reindex(strat_rets.index).fillna(0.0)
-    return exposure * strat_rets + (1 - exposure) * rf
+    variants = {"Baseline (100% invested)": params()}
+    for tv in VOL_TARGETS:
+        variants[f"VolTarget {int(tv * 100)}%"] = params(vol_target=tv)
+    for lb in TREND_LOOKBACKS:
+        variants[f"Trend SMA{lb}"] = params(sma_window=lb)
+    for lb in TREND_LOOKBACKS:
+        variants[f"Combo {int(COMBO_VOL_TARGET * 100)}%+SMA{lb}"] = params(COMBO_VOL_TARGET, lb)
+    return variants
 
 
 def main():
@@ -112,7 +86,8 @@ def main():
     print(f"Backtest window: {start} to {end}")
     print("Running baseline backtest (the slow part, one run)...", flush=True)
 
-    res = engine.run_backtest(start, end, [])
+    # Reused from the artifact store when this backtest already ran on this data.
+    res = load_or_run_backtest(engine, start, end, [], store=default_store())
     if isinstance(res, dict) and "error" in res:
         print("ERROR: baseline backtest failed:", res.get("error"))
         sys.exit(1)
@@ -123,19 +98,12 @@ def main():
     rf_daily = engine.rf_daily.reindex(strat_rets.index).fillna(0.0)
     spy = engine.market_prices.astype(float)
 
-    # Build the exposure series for every variant.
-    variants = {"Baseline (100% invested)": pd.Series(EXPOSURE_CAP, index=strat_rets.index)}
-    for tv in VOL_TARGETS:
-        variants[f"VolTarget {int(tv * 100)}%"] = vol_target_exposure(strat_rets, tv)
-    for lb in TREND_LOOKBACKS:
-        variants[f"Trend SMA{lb}"] = trend_exposure(spy, strat_rets.index, lb)
-    for lb in TREND_LOOKBACKS:
-        ve = vol_target_exposure(strat_rets, COMBO_VOL_TARGET)
-        te = trend_exposure(spy, strat_rets.index, lb)
-        variants[f"Combo {int(COMBO_VOL_TARGET * 100)}%+SMA{lb}"] = ve * te
-
-    base_rets = apply_overlay(strat_rets, variants["Baseline (100% invested)"], rf_daily)
-    base_m = ann_metrics(base_rets, rf_daily)
+    # Every variant's exposure and returns as rows of one matrix.
+    variants = variant_params()
+    grid = OverlayGrid(strat_rets, rf_daily, spy, list(variants.values()))
+    scored = grid.score(CRASH_WINDOWS)
+    scored["metrics"].pop("total_return")
+    base_m = metrics_row(scored["metrics"], 0)
 
     # ---- Table 1: core risk-adjusted metrics --------------------------------
     print("\nLegend: higher CAGR/Sharpe/Sortino/Calmar better; Vol lower better;")
@@ -147,12 +115,10 @@ def main():
     print("-" * len(h))
 
     rows = []
-    for name, exp in variants.items():
-        r = apply_overlay(strat_rets, exp, rf_daily)
-        m = ann_metrics(r, rf_daily)
-        eq = (1 + r).cumprod()
-        cr = crash_returns(eq)
-        avg_exp = exp.reindex(strat_rets.index).fillna(EXPOSURE_CAP).mean()
+    for i, name in enumerate(variants):
+        m = metrics_row(scored["metrics"], i)
+        cr = {k: float(v[i]) for k, v in scored["windows"].items()}
+        avg_exp = float(scored["avg_exposure"][i])
         flag = ""
         if name != "Baseline (100% invested)":
             if m["sharpe"] >= base_m["sharpe"] and m["max_dd"] >= base_m["max_dd"]:
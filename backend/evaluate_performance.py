@@ -26,6 +26,9 @@ import numpy as np
 import pandas as pd
 
 from app import data_loader
+from app.artifacts import default_store, load_or_run_backtest
+from app.curves import CurveIndex
+from app.metrics import metrics_row, performance_matrix, returns_from_curves, years_between
 from app.engine import BLEngine
 
 
@@ -39,27 +42,8 @@ def _period_metrics(curve, rf_ann=0.0):
     curve = curve.dropna()
     if len(curve) < 2:
         return None
-    rets = curve.pct_change().dropna()
-    years = (curve.index[-1] - curve.index[0]).days / 365.25
-    total_return = curve.iloc[-1] / curve.iloc[0] - 1.0
-    cagr = (curve.iloc[-1] / curve.iloc[0]) ** (1 / years) - 1 if years > 0 else np.nan
-    ann_vol = rets.std() * np.sqrt(252)
-    sharpe = (rets.mean() * 252 - rf_ann) / ann_vol if ann_vol > 0 else 0.0
-    downside = rets[rets < 0]
-    dd_dev = downside.std() * np.sqrt(252)
-    sortino = (rets.mean() * 252 - rf_ann) / dd_dev if dd_dev > 0 else 0.0
-    running_max = curve.cummax()
-    max_dd = float((curve / running_max - 1).min())
-    calmar = cagr / abs(max_dd) if max_dd < 0 else np.nan
-    return {
-        "total_return": total_return,
-        "cagr": cagr,
-        "vol": ann_vol,
-        "sharpe": sharpe,
-        "sortino": sortino,
-        "max_dd": max_dd,
-        "calmar": calmar,
-    }
+    years = years_between(curve.index[0], curve.index[-1])
+    return metrics_row(performance_matrix(returns_from_curves(curve.to_numpy()), rf_ann, years))
 
 
 def _pct(x):
@@ -83,7 +67,8 @@ def main():
     print(f"Data covers {start} to {end} ({len(engine.asset_prices)} trading days).")
     print("Running full-history backtest (baseline model, no manual views)...\n")
 
-    res = engine.run_backtest(start, end, [])
+    # Reused from the artifact store when this backtest already ran on this data.
+    res = load_or_run_backtest(engine, start, end, [], store=default_store())
     if "error" in res:
         print("ERROR:", res["error"])
         sys.exit(1)
@@ -159,11 +144,11 @@ def main():
     ]
     print(f"{'Period':<26}{'Strat ret':>11}{'SPY ret':>10}{'Strat DD':>11}{'SPY DD':>9}")
     print("-" * 67)
+    # Built once; every window below is an O(log n) lookup (see app/curves.py).
+    port_idx, spy_idx = CurveIndex(port), CurveIndex(spy)
     for name, s, e in periods:
-        ps = port.loc[(port.index >= s) & (port.index <= e)]
-        ss = spy.loc[(spy.index >= s) & (spy.index <= e)]
-        pmm = _period_metrics(ps)
-        smm = _period_metrics(ss)
+        pmm = port_idx.stats(s, e)
+        smm = spy_idx.stats(s, e)
         if not pmm or not smm:
             print(f"{name:<26}{'(no data)':>11}")
             continue
@@ -1,14 +1,26 @@
 import os
+import hashlib
+import itertools
+import time
+import asyncio
+import anyio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
 import uvicorn
 # --- FIXED IMPORTS ---
 from app import data_loader       # Changed from . import data_loader
-from app.engine import BLEngine   # Changed from .engine import BLEngine
+from app.engine import BLEngine, CHECKPOINT_MAX_ENTRIES   # Changed from .engine import BLEngine
+from app.sessions import ScenarioSession, SessionStore, SharedSessionStore
+from app.cache import ResultCache, SharedResultCache, request_key
+from app.artifacts import default_store, load_or_run_backtest
+from app import encoding, profiling, shared, telemetry
+from app.downsample import DOWNSAMPLE_MIN_POINTS_PER_SERIES, downsample_result
+from app.overlay import OVERLAY_MAX_AXIS_VALUES
 # ---------------------
 
 logging.basicConfig(
@@ -18,6 +30,154 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 bl_engine = None
+# With BL_SHARED_DIR (app/shared.py) the workers of a multi-worker server
+# attach to one memory-mapped panel and share the result cache and the
+# scenario sessions through SQLite.
+if shared.SHARED_DIR:
+    os.makedirs(shared.SHARED_DIR, mode=0o700, exist_ok=True)
+    result_cache = SharedResultCache(os.path.join(shared.SHARED_DIR, shared.RESULTS_DB))
+    scenario_sessions = SharedSessionStore(os.path.join(shared.SHARED_DIR, shared.SESSIONS_DB), lambda: bl_engine)
+else:
+    result_cache = ResultCache()
+    scenario_sessions = SessionStore()
+# Walk-forward checkpoints outlive engine rebuilds so a refreshed engine
+# extends yesterday's backtests instead of replaying them.
+backtest_checkpoints = ResultCache(CHECKPOINT_MAX_ENTRIES)
+# Finished backtests on disk (app/artifacts.py), shared with the analysis
+# scripts and surviving restarts; None when BL_ARTIFACT_DIR is "".
+artifact_store = default_store()
+# Encoded (and compressed) response bodies of result_cache entries, per
+# media type and content coding, so a cache hit is just a memory copy.
+response_bodies = ResultCache()
+# Reports of profiled requests (app/profiling.py), served by /profiles.
+profile_store = profiling.ProfileStore()
+
+
+# Cache-Control of cacheable responses. They carry an ETag that changes with
+# the data, so by default clients and CDNs may store them but must revalidate
+# (cheap: a 304 costs no computation); BL_HTTP_MAX_AGE > 0 skips revalidation
+# for that many seconds.
+HTTP_MAX_AGE = int(os.environ.get("BL_HTTP_MAX_AGE", "0"))
+HTTP_CACHE_CONTROL = f"public, max-age={HTTP_MAX_AGE}" if HTTP_MAX_AGE > 0 else "public, no-cache"
+
+# Hours between background data refreshes (0 = only at startup). A refresh
+# that brings new closes swaps in a new engine with a freshly built baseline.
+DATA_REFRESH_HOURS = float(os.environ.get("BL_DATA_REFRESH_HOURS", "0"))
+
+
+# --- Warm-up ---
+# Steps precomputed in the background after startup (comma-separated, in
+# order; "off" disables). /health/ready answers 503 until they finish, so a
+# load balancer only routes to replicas whose caches are warm. The backtest
+# step uses the Backtest page's default range.
+WARMUP_STEPS = [
+    s.strip() for s in os.environ.get("BL_WARMUP", "scenario,monte_carlo,backtest").split(",")
+    if s.strip() and s.strip().lower() not in ("0", "off", "none")
+]
+WARMUP_BACKTEST_START = os.environ.get("BL_WARMUP_BACKTEST_START", "2006-01-01")
+WARMUP_BACKTEST_END = os.environ.get("BL_WARMUP_BACKTEST_END", "2026-01-06")
+
+warmup_status = {"state": "pending", "steps": {}}
+
+
+def _load_prices():
+    with telemetry.collect("data_load"):
+        return data_loader.load_data()
+
+
+def _build_engine(prices):
+    with telemetry.collect("engine_build"):
+        engine = BLEngine(prices, checkpoints=backtest_checkpoints)
+        if not prices.empty:
+            engine.refresh_baseline()
+    return engine
+
+
+def _shared_engine(current=None, max_age=None):
+    """Engine attached to the shared panel, loading and publishing it when
+    this worker is the first of its generation (see app/shared.py)."""
+    with telemetry.collect("engine_build"):
+        engine = shared.shared_engine(
+            shared.SHARED_DIR, _load_prices, lambda prices: BLEngine(prices, checkpoints=backtest_checkpoints),
+            checkpoints=backtest_checkpoints, current_engine=current, max_age=max_age,
+        )
+        if engine is not current:
+            engine.refresh_baseline()
+    return engine
+
+
+def _warm_scenario():
+    run_scenario(ScenarioRequest(views=[]))
+    # One view goes through pypfopt/cvxpy, paying its first-call setup now.
+    bl_engine.run_scenario([{"ticker": bl_engine.tickers[0], "value": 0.05, "confidence": 0.5}])
+
+
+def _warm_monte_carlo():
+    # The dashboard projects the no-view recommendation's return/volatility.
+    base = bl_engine.run_scenario([])
+    run_monte_carlo(MonteCarloRequest(mu=base["metrics"]["expected_return"], sigma=base["metrics"]["volatility"]))
+
+
+def _warm_backtest():
+    run_backtest(BacktestRequest(start_date=WARMUP_BACKTEST_START, end_date=WARMUP_BACKTEST_END, views=[]))
+
+
+WARMUP_TASKS = {"scenario": _warm_scenario, "monte_carlo": _warm_monte_carlo, "backtest": _warm_backtest}
+
+
+def _warm_up(mark_ready=True):
+    """Run WARMUP_STEPS through the real endpoints (filling result_cache).
+
+    A failing step is logged and skipped rather than keeping the replica
+    out of rotation forever.
+    """
+    if mark_ready:
+        warmup_status["state"] = "running"
+    for step in WARMUP_STEPS:
+        task = WARMUP_TASKS.get(step)
+        if task is None:
+            logger.warning("Unknown warm-up step '%s' (known: %s).", step, ", ".join(WARMUP_TASKS))
+            continue
+        t0 = time.perf_counter()
+        try:
+            task()
+            warmup_status["steps"][step] = {"ok": True, "seconds": round(time.perf_counter() - t0, 3)}
+        except Exception as e:
+            logger.warning("Warm-up step '%s' failed: %s", step, e)
+            warmup_status["steps"][step] = {"ok": False, "error": str(e)}
+    if mark_ready:
+        warmup_status["state"] = "done"
+    logger.info("Warm-up finished: %s", warmup_status["steps"])
+
+
+async def _refresh_data_periodically():
+    global bl_engine
+    while True:
+        await asyncio.sleep(DATA_REFRESH_HOURS * 3600)
+        try:
+            if shared.SHARED_DIR:
+                # One worker per interval downloads; the others attach to what it published.
+                engine = await asyncio.to_thread(_shared_engine, bl_engine, DATA_REFRESH_HOURS * 3600 / 2)
+                if engine is bl_engine:
+                    continue
+                bl_engine = engine
+                # The shared result cache keys on data_version: nothing stale to drop.
+                response_bodies.clear()
+                logger.info("Attached to refreshed data %s.", engine.data_version)
+                if WARMUP_STEPS:
+                    await asyncio.to_thread(_warm_up, False)
+                continue
+            prices = await asyncio.to_thread(_load_prices)
+            if prices.empty or (bl_engine is not None and prices.index.max() <= bl_engine.prices.index.max()):
+                continue
+            bl_engine = await asyncio.to_thread(_build_engine, prices)
+            result_cache.clear()
+            response_bodies.clear()
+            logger.info("Data refreshed through %s.", prices.index.max().date())
+            if WARMUP_STEPS:
+                await asyncio.to_thread(_warm_up, False)
+        except Exception:
+            logger.exception("Background data refresh failed; keeping the current engine.")
 
 
 @asynccontextmanager
@@ -25,11 +185,23 @@ async def lifespan(app: FastAPI):
     # Modern FastAPI startup/shutdown handling (replaces deprecated on_event).
     global bl_engine
     logger.info("Loading data...")
-    prices = data_loader.load_data()
-    bl_engine = BLEngine(prices)
+    bl_engine = None
+    if shared.SHARED_DIR:
+        try:
+            bl_engine = _shared_engine()
+        except Exception:
+            logger.exception("Shared panel unavailable; loading a private copy.")
+    if bl_engine is None:
+        bl_engine = _build_engine(_load_prices())
     logger.info("Engine initialized.")
+    if WARMUP_STEPS and not bl_engine.prices.empty:
+        asyncio.create_task(asyncio.to_thread(_warm_up))
+    else:
+        warmup_status["state"] = "disabled"
+    refresher = asyncio.create_task(_refresh_data_periodically()) if DATA_REFRESH_HOURS > 0 else None
     yield
-    # (no shutdown work required)
+    if refresher is not None:
+        refresher.cancel()
 
 
 app = FastAPI(title="Black-Litterman API", lifespan=lifespan)
@@ -47,6 +219,8 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable by the frontend (conditional requests, timing).
+    expose_headers=["ETag", "Server-Timing", "X-Profile-Id"],
 )
 
 
@@ -64,10 +238,29 @@ class ScenarioRequest(BaseModel):
     date: Optional[str] = None
 
 
+class ViewUpdate(BaseModel):
+    value: float
+    confidence: float
+
+
+class ScenarioBatchRequest(BaseModel):
+    view_sets: List[List[View]]  # each set is evaluated against the same prior
+    date: Optional[str] = None
+
+
+class HistoryRequest(BaseModel):
+    dates: Optional[List[str]] = None  # explicit dates, or...
+    start_date: Optional[str] = None   # ...a range sampled at `freq`
+    end_date: Optional[str] = None
+    freq: str = "M"                    # D / W / M / Q / Y (last trading day of each period)
+    views: List[View] = []
+
+
 class MonteCarloRequest(BaseModel):
     mu: float
     sigma: float
     days: int = 252
+    max_points: Optional[int] = None  # downsample the bands and sample paths (app/downsample.py)
 
 
 class RecommendationResponse(BaseModel):
@@ -81,6 +274,42 @@ class BacktestRequest(BaseModel):
     start_date: str
     end_date: str
     views: List[View]
+    mode: str = "standard"  # "standard" (quarterly), "fast" (any frequency, down to daily) or "triggered"
+    rebalance_freq: Optional[int] = None  # fast: days between rebalances; triggered: longest gap
+    max_points: Optional[int] = None  # downsample the equity curves (app/downsample.py)
+
+
+class BacktestBatchRequest(BaseModel):
+    start_date: str
+    end_date: str
+    view_sets: List[List[View]]  # one backtest per view set (e.g. [] for the baseline)
+    mode: str = "standard"
+    rebalance_freq: Optional[int] = None
+
+
+class MetricWindow(BaseModel):
+    name: Optional[str] = None
+    start_date: Optional[str] = None  # None = first backtest date
+    end_date: Optional[str] = None    # None = last backtest date
+    preset: Optional[str] = None      # "1Y", "3Y", "5Y", "10Y", "YTD", "MAX"
+
+
+class BacktestWindowsRequest(BacktestRequest):
+    windows: List[MetricWindow] = []
+    calendar_years: bool = False
+
+
+class OverlayGridRequest(BacktestRequest):
+    # Full-factorial grid; None in vol_targets / sma_windows switches that rule off.
+    # (each axis at most OVERLAY_MAX_AXIS_VALUES long; the grid, OVERLAY_MAX_VARIANTS).
+    vol_targets: List[Optional[float]] = Field([None, 0.10, 0.12, 0.15], max_length=OVERLAY_MAX_AXIS_VALUES)
+    vol_lookbacks: List[int] = Field([21], max_length=OVERLAY_MAX_AXIS_VALUES)
+    sma_windows: List[Optional[int]] = Field([None, 150, 200], max_length=OVERLAY_MAX_AXIS_VALUES)
+    floors: List[float] = Field([0.0], max_length=OVERLAY_MAX_AXIS_VALUES)
+    caps: List[float] = Field([1.0], max_length=OVERLAY_MAX_AXIS_VALUES)
+    windows: Optional[List[MetricWindow]] = None  # stress windows (None = GFC, COVID, 2022)
+    sort_by: str = "sharpe"
+    top: Optional[int] = 50
 
 
 # --- ENDPOINTS ---
@@ -90,35 +319,413 @@ def read_root():
     return {"status": "System Operational", "model": "Black-Litterman ML"}
 
 
-@app.post("/recommendation/scenario")
-def run_scenario(request: ScenarioRequest):
+@app.get("/health/live")
+def health_live():
+    """Liveness: the engine is loaded and can answer (possibly cold)."""
     if not bl_engine:
+        return JSONResponse(status_code=503, content={"engine_loaded": False})
+    return {"engine_loaded": True, "data_version": bl_engine.data_version}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: engine loaded AND warm-up finished (or disabled)."""
+    ready = bool(bl_engine) and warmup_status["state"] in ("done", "disabled")
+    body = {
+        "ready": ready,
+        "engine_loaded": bool(bl_engine),
+        "warmup": warmup_status,
+        "data_version": bl_engine.data_version if bl_engine else None,
+        "cache": result_cache.stats(),
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+# --- Profiles ---
+def _profile_access(http):
+    if not profiling.authorized(http.headers if http is not None else {}):
+        raise HTTPException(status_code=403, detail="Profiles need the X-Profile admin token.")
+
+
+@app.get("/profiles")
+def list_profiles(http: Request = None):
+    """Stored request profiles, newest first."""
+    _profile_access(http)
+    return {"profiles": profile_store.summaries()}
+
+
+@app.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "json", http: Request = None):
+    """One profile report: JSON (default), the cProfile table as "text", or
+    raw "pstats" data (open with pstats.Stats or snakeviz)."""
+    _profile_access(http)
+    report = profile_store.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired profile id")
+    if format == "pstats":
+        return Response(report["pstats"], media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+    if format == "text":
+        return Response(report["text"], media_type="text/plain")
+    return {k: v for k, v in report.items() if k != "pstats"}
+
+
+# --- Metrics ---
+# Histograms of request and per-stage times come from app/telemetry.py; the
+# gauges below are read when /metrics is scraped.
+def _cache_stat(field):
+    def read():
+        caches = {"result": result_cache, "response_body": response_bodies, "checkpoint": backtest_checkpoints}
+        return {name: cache.stats()[field] for name, cache in caches.items()}
+    return read
+
+
+def _threadpool_stat(field):
+    # Sync endpoints run on AnyIO's worker threads; "waiting" is the queue of
+    # requests for which no thread is free. Only readable on the event loop.
+    return lambda: getattr(anyio.to_thread.current_default_thread_limiter().statistics(), field)
+
+
+telemetry.REGISTRY.gauge("bl_cache_hits_total", "Cache hits.", _cache_stat("hits"), label="cache", kind="counter")
+telemetry.REGISTRY.gauge("bl_cache_misses_total", "Cache misses.", _cache_stat("misses"), label="cache",
+                         kind="counter")
+telemetry.REGISTRY.gauge("bl_cache_entries", "Entries held per cache.", _cache_stat("entries"), label="cache")
+telemetry.REGISTRY.gauge("bl_threadpool_busy", "Worker threads serving requests.", _threadpool_stat("borrowed_tokens"))
+telemetry.REGISTRY.gauge("bl_threadpool_waiting", "Requests queued for a worker thread.",
+                         _threadpool_stat("tasks_waiting"))
+telemetry.REGISTRY.gauge("bl_scenario_sessions", "Open scenario sessions.", lambda: len(scenario_sessions))
+telemetry.REGISTRY.gauge("bl_engine_loaded", "1 once the engine is loaded.", lambda: int(bool(bl_engine)))
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition (async: the thread-pool gauges need the event loop)."""
+    return Response(telemetry.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+def _result_key(kind, request, engine=None):
+    """(engine, result_cache key) for a request; 503 while no engine is loaded.
+
+    Nested lookups pass the outer lookup's ``engine`` so that a refresh
+    between them cannot mix two data versions.
+    """
+    engine = engine or bl_engine
+    if not engine:
         raise HTTPException(status_code=503, detail="Engine not ready")
+    return engine, request_key(kind, request.dict(), engine.data_version, engine.config_fingerprint())
+
+
+def _compute(engine, compute):
+    with telemetry.stage("compute"):
+        return compute(engine)
+
+
+def _compute_cached(engine, key, compute):
+    result = result_cache.get_or_compute(key, lambda: _compute(engine, compute))
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
 
+
+def _cached(kind, request, compute):
+    """``compute(engine)`` served through result_cache; raises the usual HTTP errors."""
+    return _compute_cached(*_result_key(kind, request), compute)
+
+
+def _etag(key, representation):
+    # Weak: the same result in another content coding is still a match.
+    return 'W/"' + hashlib.sha1(f"{key}:{representation}".encode()).hexdigest()[:24] + '"'
+
+
+def _not_modified(http, etag):
+    """True when the request's If-None-Match already names ``etag``."""
+    header = http.headers.get("if-none-match") if http is not None else None
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+def _wants_timings(http):
+    """True when the request asks for a "timings" block (?timings=1 or X-Timings: 1)."""
+    if http is None:
+        return False
+    flag = http.headers.get("x-timings") or getattr(http, "query_params", {}).get("timings")
+    return (flag or "").lower() in ("1", "true", "yes")
+
+
+def _encode_body(result, media_type, coding):
+    with telemetry.stage("serialize"):
+        body = encoding.encode(result, media_type)
+    with telemetry.stage("compress"):
+        packed = encoding.compress(body, coding)
+    return (body, None) if packed is None else (packed, coding)
+
+
+def _respond_profiled(kind, engine, compute, media_type, coding):
+    """``compute(engine)`` afresh (no caches) under the profiler; the report's
+    id is returned in the X-Profile-Id header."""
+    with telemetry.collect(kind) as timings:
+        with profiling.profiled(kind, profile_store) as report:
+            result = _compute(engine, compute)
+            report["timings"] = timings.block()
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        body, applied = _encode_body(result, media_type, coding)
+    headers = {"Cache-Control": "no-store", "Server-Timing": timings.server_timing()}
+    if report["id"] is not None:
+        headers["X-Profile-Id"] = report["id"]
+    if applied:
+        headers["Content-Encoding"] = applied
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _respond(kind, request, compute, http=None, columnar=True, profile=False):
+    """_cached, answered with a pre-encoded body: JSON (default) or the
+    columnar encoding asked for via Accept, compressed when the client
+    accepts it (app/encoding.py). Bypasses FastAPI's jsonable_encoder.
+
+    Results are deterministic given the request and the data, so the ETag
+    is derived from the cache key alone: a client repeating a request with
+    If-None-Match gets a 304 before anything is computed or encoded.
+
+    The request's stages (app/telemetry.py) go to /metrics and the
+    Server-Timing header; with ?timings=1 or X-Timings: 1 they are also
+    added to the body as "timings" (that body is not cached).
+
+    With ``profile``, a request that asks for profiling (app/profiling.py)
+    is computed afresh under the profiler instead."""
+    headers = http.headers if http is not None else {}
+    media_type = encoding.negotiate(headers.get("accept")) if columnar else encoding.JSON
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Supported types: {', '.join(encoding.available_types())}")
+    coding = encoding.content_coding(headers.get("accept-encoding"))
+    engine, key = _result_key(kind, request)
+    if profile and profiling.requested(headers):
+        return _respond_profiled(kind, engine, compute, media_type, coding)
+    etag = _etag(key, media_type)
+    cache_headers = {"ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL, "Vary": "Accept, Accept-Encoding"}
+    with_timings = _wants_timings(http)
+    if with_timings:
+        # A one-off body: neither cacheable nor matching the result's ETag.
+        cache_headers = {"Cache-Control": "no-store", "Vary": cache_headers["Vary"]}
+    elif _not_modified(http, etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    with telemetry.collect(kind) as timings:
+        result = _compute_cached(engine, key, compute)
+        if with_timings:
+            block = {**timings.block(), "cached": "compute" not in timings}
+            body, applied = _encode_body({**result, "timings": block}, media_type, coding)
+        else:
+            body_key = f"{key}:{media_type}:{coding}"
+            entry = response_bodies.get(body_key)
+            if entry is None:
+                entry = _encode_body(result, media_type, coding)
+                response_bodies.put(body_key, entry)
+            body, applied = entry
+    timing = timings.server_timing()
+    if "serialize" not in timings:
+        timing = ", ".join(filter(None, [timing, 'body-cache;desc="hit"']))
+    headers = {**cache_headers, "Server-Timing": timing}
+    if applied:
+        headers["Content-Encoding"] = applied
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _with_max_points(kind, request, compute, downsample):
+    """``compute``, or when ``request.max_points`` is set, ``downsample`` of the
+    full-resolution result, which stays cached under the request without
+    max_points (so every resolution shares one computation)."""
+    if request.max_points is None:
+        return compute
+    full = request.copy(update={"max_points": None})
+    return lambda engine: downsample(_cached(kind, full, compute), request.max_points)
+
+
+def _thin_backtest(result, max_points):
+    return downsample_result(result, max_points, "dates", ("portfolio", "spy"))
+
+
+def _thin_monte_carlo(result, max_points):
+    return downsample_result(result, max_points, "days", ("p05", "p25", "p50", "p75", "p95"), ("sample_paths",))
+
+
+@app.post("/recommendation/scenario")
+def run_scenario(request: ScenarioRequest, http: Request = None):
     # Dashboard scenario usually ignores dates (applies "Now"), but passing just in case
-    result = bl_engine.run_scenario([v.dict() for v in request.views], target_date=request.date)
+    return _respond("scenario", request, lambda engine: engine.run_scenario(
+        [v.dict() for v in request.views], target_date=request.date
+    ), http, profile=True)
+
+
+@app.post("/recommendation/scenario/batch")
+def run_scenario_batch(request: ScenarioBatchRequest):
+    if not bl_engine:
+        raise HTTPException(status_code=503, detail="Engine not ready")
+
+    result = bl_engine.run_scenario_batch(
+        [[v.dict() for v in views] for views in request.view_sets], target_date=request.date
+    )
     if "error" in result:
         raise HTTPException(status_code=400, detail=result["error"])
     return result
 
 
-@app.post("/simulation/monte_carlo")
-def run_monte_carlo(request: MonteCarloRequest):
+@app.post("/recommendation/history")
+def recommendation_history(request: HistoryRequest, http: Request = None):
+    return _respond("history", request, lambda engine: engine.recommendation_history(
+        dates=request.dates,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        freq=request.freq,
+        user_views=[v.dict() for v in request.views],
+    ), http)
+
+
+# --- Interactive scenario sessions ---
+# Open a session once per dashboard visit, then send single-view changes
+# (e.g. slider moves); each answer has the same shape as /recommendation/scenario.
+
+def _session_call(session_id: str, change):
+    """``change(session)`` through the store (which saves a shared session
+    afterwards); 404 for an unknown or expired session."""
+    result = scenario_sessions.update(session_id, change)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return _session_result(result)
+
+
+def _session_result(result):
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+
+@app.post("/recommendation/session")
+def open_scenario_session(request: ScenarioRequest):
     if not bl_engine:
         raise HTTPException(status_code=503, detail="Engine not ready")
-    return bl_engine.run_monte_carlo(request.mu, request.sigma, request.days)
+    session = ScenarioSession.open(bl_engine, target_date=request.date)
+    if isinstance(session, dict):
+        raise HTTPException(status_code=400, detail=session["error"])
+    result = session.set_views([v.dict() for v in request.views])
+    scenario_sessions.add(session)
+    return _session_result(result)
+
+
+@app.put("/recommendation/session/{session_id}/views")
+def replace_session_views(session_id: str, views: List[View]):
+    return _session_call(session_id, lambda session: session.set_views([v.dict() for v in views]))
+
+
+@app.put("/recommendation/session/{session_id}/views/{ticker}")
+def update_session_view(session_id: str, ticker: str, update: ViewUpdate):
+    return _session_call(session_id, lambda session: session.update_view({"ticker": ticker, **update.dict()}))
+
+
+@app.delete("/recommendation/session/{session_id}/views/{ticker}")
+def remove_session_view(session_id: str, ticker: str):
+    return _session_call(session_id, lambda session: session.remove_view(ticker))
+
+
+@app.delete("/recommendation/session/{session_id}")
+def close_scenario_session(session_id: str):
+    if not scenario_sessions.drop(session_id):
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    return {"closed": session_id}
+
+
+@app.post("/simulation/monte_carlo")
+def run_monte_carlo(request: MonteCarloRequest, http: Request = None):
+    # Seeded, so identical requests give identical projections.
+    def compute(engine):
+        return engine.run_monte_carlo(request.mu, request.sigma, request.days)
+
+    return _respond("monte_carlo", request, _with_max_points("monte_carlo", request, compute, _thin_monte_carlo),
+                    http)
+
+
+def _backtest_compute(request):
+    # Pass the full view dictionary (including dates) to the engine
+    return lambda engine: load_or_run_backtest(
+        engine,
+        request.start_date,
+        request.end_date,
+        [v.dict() for v in request.views],
+        mode=request.mode,
+        rebalance_freq=request.rebalance_freq,
+        store=artifact_store,
+    )
 
 
 @app.post("/simulation/backtest")
-def run_backtest(request: BacktestRequest):
+def run_backtest(request: BacktestRequest, http: Request = None):
+    compute = _with_max_points("backtest", request, _backtest_compute(request), _thin_backtest)
+    return _respond("backtest", request, compute, http, profile=True)
+
+
+@app.post("/simulation/backtest/stream")
+def stream_backtest(request: BacktestRequest, http: Request = None):
+    """run_backtest as a stream of progress events (engine.stream_backtest).
+
+    Newline-delimited JSON by default; Server-Sent Events when the client
+    sends ``Accept: text/event-stream``. The last event is {"type": "done",
+    "result": ...} (the same body as /simulation/backtest), which is also
+    cached, so a repeated request streams only that event. ``max_points``
+    only thins the final result; periods stream at full resolution. The
+    ETag works as in _respond.
+    """
+    max_points = request.max_points
+    if max_points is not None and max_points < 2 * DOWNSAMPLE_MIN_POINTS_PER_SERIES:
+        raise HTTPException(status_code=400,
+                            detail=f"max_points must be at least {2 * DOWNSAMPLE_MIN_POINTS_PER_SERIES} for this result.")
+    request = request.copy(update={"max_points": None})
+    engine, key = _result_key("backtest", request)
+    sse = http is not None and "text/event-stream" in (http.headers.get("accept") or "")
+    headers = {"ETag": _etag(key, f"stream:{sse}:{max_points}"), "Cache-Control": HTTP_CACHE_CONTROL, "Vary": "Accept"}
+    if _not_modified(http, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    cached = result_cache.get(key)
+    if cached is not None:
+        events = iter([{"type": "done", "result": cached}])
+    else:
+        events = engine.stream_backtest(
+            request.start_date,
+            request.end_date,
+            [v.dict() for v in request.views],
+            mode=request.mode,
+            rebalance_freq=request.rebalance_freq,
+        )
+        first = next(events)
+        if first["type"] == "error":
+            raise HTTPException(status_code=400, detail=first["error"])
+        events = itertools.chain([first], events)
+
+    def body():
+        for event in events:
+            if event["type"] == "done":
+                result_cache.put(key, event["result"])
+                if max_points is not None:
+                    event = {**event, "result": _thin_backtest(event["result"], max_points)}
+            line = encoding.encode_json(event).decode()
+            yield f"event: {event['type']}\ndata: {line}\n\n" if sse else line + "\n"
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+@app.post("/simulation/backtest/batch")
+def run_backtest_batch(request: BacktestBatchRequest):
     if not bl_engine:
         raise HTTPException(status_code=503, detail="Engine not ready")
 
-    # Pass the full view dictionary (including dates) to the engine
-    result = bl_engine.run_backtest(
+    result = bl_engine.run_backtest_batch(
         request.start_date,
         request.end_date,
-        [v.dict() for v in request.views]
+        [[v.dict() for v in views] for views in request.view_sets],
+        mode=request.mode,
+        rebalance_freq=request.rebalance_freq,
     )
 
     if "error" in result:
@@ -127,6 +734,46 @@ def run_backtest(request: BacktestRequest):
     return result
 
 
+@app.post("/simulation/backtest/windows")
+def backtest_windows(request: BacktestWindowsRequest):
+    """Stats over many windows of one (cached) backtest without re-running it."""
+    backtest = BacktestRequest(**request.dict(exclude={"windows", "calendar_years", "max_points"}))
+    # The range-query index is built once per backtest and cached with it, as
+    # plain arrays (the shared result cache pickles its values). One engine
+    # keys, computes and answers every step.
+    engine, key = _result_key("curve_index", backtest)
+    backtest_key = _result_key("backtest", backtest, engine)[1]
+    curves = _compute_cached(engine, key, lambda engine: engine.curve_arrays(
+        _compute_cached(engine, backtest_key, _backtest_compute(backtest))))
+    result = engine.backtest_windows(
+        curves, [w.dict() for w in request.windows], calendar_years=request.calendar_years
+    )
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+
+@app.post("/simulation/backtest/overlays")
+def backtest_overlays(request: OverlayGridRequest, http: Request = None):
+    """Score a whole grid of vol-target / trend overlays on one backtest."""
+    grid = {k: getattr(request, k) for k in ("vol_targets", "vol_lookbacks", "sma_windows", "floors", "caps")}
+    windows = None if request.windows is None else {
+        w.name or f"{w.start_date or 'start'}..{w.end_date or 'end'}": (w.start_date or "1900-01-01", w.end_date or "2100-12-31")
+        for w in request.windows
+    }
+    return _respond("overlays", request, lambda engine: engine.run_overlay_grid(
+        request.start_date,
+        request.end_date,
+        [v.dict() for v in request.views],
+        grid,
+        windows=windows,
+        mode=request.mode,
+        rebalance_freq=request.rebalance_freq,
+        sort_by=request.sort_by,
+        top=request.top,
+    ), http, columnar=False)
+
+
 if __name__ == "__main__":
 
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
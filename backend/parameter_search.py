@@ -0,0 +1,184 @@
+"""parameter_search.py
+
+Multi-parameter search for the Black-Litterman strategy by successive halving.
+
+parameter_sweep.py changes ONE constant at a time, because a full-factorial grid
+over its SWEEPS would need thousands of full-history backtests. This script
+searches combinations instead, and spends little time on bad ones:
+
+  1. Draw N_CANDIDATES random combinations from SWEEPS (the current
+     configuration is always candidate 0).
+  2. Score every candidate on a short, recent window (RUNG_YEARS[0] years).
+  3. Keep the best 1/ETA by SCORE_METRIC and promote them to the next, longer
+     window; repeat until the survivors run on the full history.
+
+With the defaults (81 candidates, ETA = 3, rungs of 3 / 6 / 12 years / full) that
+is 81 + 27 + 9 + 3 backtests, most of them short, instead of 81 full ones.
+
+Like parameter_sweep.py this does NOT modify the engine or any app code:
+overrides are applied to the engine module's constants inside worker processes
+(WORKERS of them, each with its own engine) and restored after every run.
+
+Progress is saved to STATE_FILE after every finished backtest, so an
+interrupted search picks up where it stopped when you run it again. Pass
+--fresh to discard the saved state. Changing any search setting below also
+requires --fresh.
+
+Run it from the backend/ folder:
+
+    cd backend
+    python parameter_search.py            # or: python parameter_search.py --fresh
+
+It prints the leaderboard of every rung and writes search_results.csv.
+"""
+
+import json
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from app import data_loader
+import app.engine as eng
+from app.engine import BLEngine
+from parameter_sweep import SWEEPS, run_once
+
+N_CANDIDATES = 81
+ETA = 3                          # keep the best 1/ETA at every rung
+RUNG_YEARS = [3, 6, 12, None]    # window length per rung, ending at the last close (None = full history)
+SCORE_METRIC = "sharpe"          # any key of parameter_sweep's metrics; higher is better
+SEED = 0
+WORKERS = int(os.environ.get("BL_SEARCH_WORKERS", "0")) or (os.cpu_count() or 1)
+STATE_FILE = "search_state.json"
+
+_engine = None  # per worker process
+
+
+def _init_worker(prices, inner_workers):
+    global _engine
+    # Each worker already is one of WORKERS processes; don't fan out again.
+    eng.BACKTEST_WORKERS = inner_workers
+    _engine = BLEngine(prices)
+
+
+def _evaluate(cand_id, overrides, start, end):
+    return cand_id, run_once(_engine, start, end, overrides)
+
+
+def draw_candidates(n, seed):
+    """Candidate override dicts: {} (current config) plus n - 1 distinct random combinations."""
+    rng = random.Random(seed)
+    names = sorted(SWEEPS)
+    baseline = {k: getattr(eng, k) for k in names}
+    candidates, seen = [{}], {()}
+    space = math.prod(len(set(SWEEPS[k]) | {baseline[k]}) for k in names)
+    while len(candidates) < min(n, space):
+        overrides = {k: rng.choice(SWEEPS[k]) for k in names}
+        overrides = {k: v for k, v in overrides.items() if v != baseline[k]}
+        key = tuple(sorted(overrides.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(overrides)
+    return candidates
+
+
+def rung_start(years, first, last):
+    if years is None:
+        return first
+    return max(first, last - pd.DateOffset(years=years))
+
+
+def load_state(settings, fresh):
+    if not fresh and os.path.exists(STATE_FILE):
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+        if state.get("settings") != settings:
+            print(f"ERROR: {STATE_FILE} was written with different settings; rerun with --fresh.")
+            sys.exit(1)
+        done = sum(len(r) for r in state["results"].values())
+        print(f"Resuming from {STATE_FILE} ({done} backtests already done).")
+        return state
+    return {"settings": settings, "candidates": draw_candidates(N_CANDIDATES, SEED), "results": {}}
+
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, STATE_FILE)  # atomic: a crash never leaves a half-written state
+
+
+def _score(metrics):
+    if metrics is None:
+        return -np.inf
+    v = metrics.get(SCORE_METRIC)
+    return v if v is not None and np.isfinite(v) else -np.inf
+
+
+def _label(overrides):
+    return ", ".join(f"{k}={v}" for k, v in sorted(overrides.items())) or "(current config)"
+
+
+def main():
+    fresh = "--fresh" in sys.argv[1:]
+    print("Loading price data...")
+    prices = data_loader.load_data()
+    if prices is None or prices.empty:
+        print("ERROR: no price data.")
+        sys.exit(1)
+
+    engine = BLEngine(prices)
+    first, last = engine.asset_prices.index[0], engine.asset_prices.index[-1]
+    settings = {
+        "n_candidates": N_CANDIDATES, "eta": ETA, "rung_years": RUNG_YEARS, "score": SCORE_METRIC,
+        "seed": SEED, "sweeps": {k: list(v) for k, v in SWEEPS.items()}, "data_end": str(last.date()),
+    }
+    state = load_state(settings, fresh)
+    candidates = state["candidates"]
+    survivors = list(range(len(candidates)))
+    print(f"{len(candidates)} candidates, {len(RUNG_YEARS)} rungs, {WORKERS} workers.")
+
+    inner = 1 if WORKERS > 1 else eng.BACKTEST_WORKERS
+    with ProcessPoolExecutor(max_workers=WORKERS, initializer=_init_worker, initargs=(prices, inner)) as pool:
+        for rung, years in enumerate(RUNG_YEARS):
+            start = str(rung_start(years, first, last).date())
+            end = str(last.date())
+            results = state["results"].setdefault(str(rung), {})
+            todo = [c for c in survivors if str(c) not in results]
+            print(f"\n=== Rung {rung}: {len(survivors)} candidates on {start} to {end} "
+                  f"({len(todo)} to run) ===", flush=True)
+            futures = [pool.submit(_evaluate, c, candidates[c], start, end) for c in todo]
+            for fut in as_completed(futures):
+                cand_id, metrics = fut.result()
+                results[str(cand_id)] = metrics
+                save_state(state)
+                print(f"  [{len(results)}/{len(survivors)}] #{cand_id}: {SCORE_METRIC}="
+                      f"{_score(metrics):.3f}", flush=True)
+
+            ranked = sorted(survivors, key=lambda c: _score(results[str(c)]), reverse=True)
+            print(f"\n{'rank':<6}{'cand':<6}{SCORE_METRIC:>9}{'CAGR':>8}{'MaxDD':>8}   overrides")
+            for pos, c in enumerate(ranked[:10]):
+                m = results[str(c)] or {}
+                print(f"{pos + 1:<6}{c:<6}{_score(m):9.3f}{m.get('cagr', np.nan) * 100:7.1f}%"
+                      f"{m.get('max_dd', np.nan) * 100:7.1f}%   {_label(candidates[c])}")
+            if rung < len(RUNG_YEARS) - 1:
+                survivors = ranked[:max(1, math.ceil(len(ranked) / ETA))]
+
+    rows = []
+    for rung, results in state["results"].items():
+        for c, m in results.items():
+            rows.append({"rung": int(rung), "candidate": int(c), "overrides": _label(candidates[int(c)]),
+                         **(m or {"failed": True})})
+    pd.DataFrame(rows).sort_values(["rung", SCORE_METRIC], ascending=[False, False]).to_csv(
+        "search_results.csv", index=False)
+    best = ranked[0]
+    print(f"\nBest configuration: {_label(candidates[best])}")
+    print("Saved search_results.csv in backend/ (final rung first).")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,13 +35,21 @@ import numpy as np
 import pandas as pd
 
 from app import data_loader
+from app.artifacts import default_store, load_or_run_backtest
 import app.engine as eng
 from app.engine import BLEngine
+from app.metrics import metrics_row, performance_matrix, returns_from_curves, years_between
 
 # Set to a date string like "2015-01-01" for faster (shorter) runs, or None to
 # use the full available history.
 FAST_START = None
 
+# "standard" replays the original quarterly walk-forward. "fast" uses the
+# precomputed-signal path, which is quick enough to sweep REBALANCE_FREQ all
+# the way down to daily (e.g. [1, 5, 21, 63]) but holds drifting positions
+# between rebalances, so its numbers are not directly comparable to standard.
+BACKTEST_MODE = "standard"
+
 # Each entry maps a constant name -> candidate values to try. The current
 # baseline value is detected automatically and always shown for comparison.
 SWEEPS = {
@@ -65,14 +73,9 @@ def _metrics_from_backtest(res):
     port = pd.Series(res["portfolio"], index=dates, dtype=float)
     rf = res["metrics"].get("risk_free", 0.0)
 
-    rets = port.pct_change().dropna()
-    years = (port.index[-1] - port.index[0]).days / 365.25
-    cagr = (port.iloc[-1] / port.iloc[0]) ** (1 / years) - 1 if years > 0 else np.nan
-    vol = rets.std() * np.sqrt(252)
-    sharpe = (rets.mean() * 252 - rf) / vol if vol > 0 else 0.0
-    dn = rets[rets < 0].std() * np.sqrt(252)
-    sortino = (rets.mean() * 252 - rf) / dn if dn and dn > 0 else 0.0
-    max_dd = float((port / port.cummax() - 1).min())
+    m = metrics_row(performance_matrix(
+        returns_from_curves(port.to_numpy()), rf, years_between(port.index[0], port.index[-1])
+    ))
 
     cutoff = port.index[-1] - pd.Timedelta(days=365 * 3)
     p3 = port.loc[port.index >= cutoff]
@@ -83,7 +86,7 @@ def _metrics_from_backtest(res):
     winrate = wins / len(yt) if yt else np.nan
 
     return {
-        "cagr": cagr, "sharpe": sharpe, "sortino": sortino, "max_dd": max_dd,
+        "cagr": m["cagr"], "sharpe": m["sharpe"], "sortino": m["sortino"], "max_dd": m["max_dd"],
         "last3yr": last3, "winrate": winrate,
         "total_return": res["metrics"]["total_return"],
     }
@@ -101,7 +104,13 @@ def run_once(engine, start, end, overrides):
     try:
         for k, v in overrides.items():
             setattr(eng, k, v)
-        res = engine.run_backtest(start, end, [])
+        # Stored runs are keyed by the engine constants too, so each variant
+        # (and the baseline shared with the other scripts) is computed once.
+        if BACKTEST_MODE == "fast":
+            res = load_or_run_backtest(engine, start, end, [], mode="fast",
+                                       rebalance_freq=eng.REBALANCE_FREQ, store=default_store())
+        else:
+            res = load_or_run_backtest(engine, start, end, [], store=default_store())
     except Exception as e:
         print(f"    -> run failed, skipping: {type(e).__name__}: {e}", flush=True)
         return None
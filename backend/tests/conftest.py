@@ -0,0 +1,30 @@
+"""Shared fixtures for the backend tests."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+TICKERS = ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK",
+           "XLP", "XLRE", "XLU", "XLV", "XLY"]
+
+
+@pytest.fixture
+def synthetic_prices():
+    """Build a realistic-ish, network-free price panel.
+
+    A shared market factor gives the sectors positive correlation, which keeps
+    the implied-equilibrium returns above the risk-free rate so the max-Sharpe
+    optimizer always has a feasible solution.
+    """
+    rng = np.random.default_rng(7)
+    n_days = 900
+    dates = pd.bdate_range("2017-01-02", periods=n_days)
+    market_factor = rng.normal(0.0004, 0.010, n_days)
+    data = {}
+    for sym in TICKERS + ["SPY", "VNQ", "VOX"]:
+        idio = rng.normal(0.0002, 0.008, n_days)
+        rets = market_factor + idio
+        data[sym] = pd.Series(100.0 * np.exp(np.cumsum(rets)), index=dates)
+    # ^IRX is quoted as an annual percentage yield (e.g. 2.0 == 2%).
+    data["^IRX"] = pd.Series(2.0, index=dates)
+    return pd.DataFrame(data)
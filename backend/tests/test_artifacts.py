@@ -0,0 +1,26 @@
+"""Tests for app/artifacts.py (on-disk store of finished backtests)."""
+
+import numpy as np
+
+from app.artifacts import ArtifactStore, load_or_run_backtest
+from app.engine import BLEngine
+
+
+def test_artifact_store_round_trip(synthetic_prices, tmp_path):
+    store = ArtifactStore(str(tmp_path), max_entries=1)
+    engine = BLEngine(synthetic_prices)
+    first = load_or_run_backtest(engine, "2007-01-01", "2030-01-01", [], store=store)
+    [entry] = store.entries()
+    assert entry["data_version"] == engine.data_version and entry["frames"] == ["daily", "weights"]
+
+    # A fresh engine on the same data loads the stored run instead of recomputing.
+    other = BLEngine(synthetic_prices)
+    other.run_backtest_frames = None
+    loaded = load_or_run_backtest(other, "2007-01-01", "2030-01-01", [], store=store)
+    assert loaded == first
+    result, frames = store.load(entry["key"])
+    assert np.allclose((1 + frames["daily"]["spy"]).prod(), loaded["spy"][-1] / 10000.0)
+
+    # Another request is a different artifact; the oldest entry is pruned.
+    load_or_run_backtest(engine, "2008-01-01", "2030-01-01", [], store=store)
+    assert len(store.entries()) == 1 and store.load(entry["key"]) is None
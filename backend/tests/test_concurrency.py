@@ -0,0 +1,139 @@
+"""Concurrent access to state one engine (or one host) shares across requests.
+
+FastAPI runs the sync endpoints on a threadpool, so every test here calls the
+same object from several threads at once and compares against the same calls
+made one after another.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.engine import BLEngine
+
+THREADS = 6
+
+
+def _in_parallel(calls):
+    """Results of the zero-argument ``calls``, all started together."""
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return [f.result() for f in [pool.submit(call) for call in calls]]
+
+
+def test_fast_backtests_share_the_signal_panel(synthetic_prices):
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}]
+    requests = [("fast", 1, []), ("fast", 5, views), ("triggered", None, []), ("triggered", None, views)] * 2
+    reference = BLEngine(synthetic_prices)
+    expected = [reference.run_backtest("2018-06-01", "2020-06-01", v, mode=m, rebalance_freq=f)
+                for m, f, v in requests]
+
+    # A fresh engine, so the threads also race to build the panel itself.
+    engine = BLEngine(synthetic_prices)
+    got = _in_parallel([
+        lambda m=m, f=f, v=v: engine.run_backtest("2018-06-01", "2020-06-01", v, mode=m, rebalance_freq=f)
+        for m, f, v in requests
+    ])
+    for want, result in zip(expected, got):
+        assert "error" not in result, result
+        assert result["dates"] == want["dates"]
+        np.testing.assert_array_equal(result["portfolio"], want["portfolio"])
+    assert len(engine._signal_panels) == 1
+
+
+def test_concurrent_histories_match_run_scenario(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6}]
+    pair = views + [{"ticker": "XLF", "value": 0.03, "confidence": 0.4}]
+    view_sets = [views, pair, []] * 2
+    histories = _in_parallel([
+        lambda v=v: engine.recommendation_history(start_date="2019-01-01", end_date="2020-02-29", freq="M",
+                                                  user_views=v)
+        for v in view_sets
+    ])
+    no_views = BLEngine(synthetic_prices).recommendation_history(
+        start_date="2019-01-01", end_date="2020-02-29", freq="M")
+    for history, user_views in zip(histories, view_sets):
+        assert "error" not in history and len(history["dates"]) == 14
+        if not user_views:
+            # run_scenario raises where the history holds the anchor, so the
+            # no-view case is checked against a sequential history instead.
+            assert history["weights"] == no_views["weights"]
+            continue
+        for k, date in enumerate(history["dates"]):
+            single = engine.run_scenario(user_views, target_date=date)
+            for t in engine.tickers:
+                assert abs(history["weights"][t][k] - single["weights"][t]) < 1e-6
+            assert np.isclose(history["expected_return"][k], single["metrics"]["expected_return"])
+
+
+def test_attached_panel_serves_concurrent_walks(synthetic_prices, tmp_path):
+    from app import shared
+    from app.cache import SharedResultCache
+
+    root = str(tmp_path / "shared")
+    shared.shared_engine(root, synthetic_prices.copy, BLEngine)
+    # The panel of an attached engine sits on the read-only memory map.
+    engine = shared.shared_engine(root, synthetic_prices.copy, BLEngine)
+    assert not engine.signal_panel().returns.flags.writeable
+    private = BLEngine(synthetic_prices)
+    freqs = [1, 5, 21] * 2
+    expected = [private.run_backtest("2018-06-01", "2020-06-01", [], mode="fast", rebalance_freq=f) for f in freqs]
+    got = _in_parallel([
+        lambda f=f: engine.run_backtest("2018-06-01", "2020-06-01", [], mode="fast", rebalance_freq=f)
+        for f in freqs
+    ])
+    for want, result in zip(expected, got):
+        np.testing.assert_allclose(result["portfolio"], want["portfolio"], rtol=1e-12)
+
+    # The window index goes through the shared (pickling) cache as plain arrays.
+    cache = SharedResultCache(str(tmp_path / "results.sqlite"))
+    curves = cache.get_or_compute("curves", lambda: engine.curve_arrays(got[0]))
+    windows = [{"preset": "MAX"}, {"preset": "1Y"}]
+    assert engine.backtest_windows(cache.get("curves"), windows) == engine.backtest_windows(curves, windows)
+
+
+def test_backtests_off_the_main_thread_run_inline(monkeypatch):
+    import app.engine as eng
+
+    monkeypatch.setattr(eng, "BACKTEST_WORKERS", 2)
+    monkeypatch.setattr(eng, "PARALLEL_MIN_PERIODS", 1)
+    pooled = eng._backtest_executor(10)
+    pooled.shutdown()
+    assert not isinstance(pooled, eng._InlineExecutor)
+    # A request thread never forks, whatever BACKTEST_WORKERS says.
+    assert all(isinstance(e, eng._InlineExecutor) for e in _in_parallel([lambda: eng._backtest_executor(10)] * 2))
+
+
+def test_session_updates_from_many_threads_all_land(synthetic_prices, tmp_path):
+    from app.sessions import ScenarioSession, SessionStore, SharedSessionStore
+
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": t, "value": 0.02 + 0.01 * k, "confidence": 0.5} for k, t in enumerate(engine.tickers[:THREADS])]
+    expected = engine.run_scenario(views)
+    path = str(tmp_path / "sessions.sqlite")
+    # One worker's store, then two workers' stores on the same file.
+    for stores in ([SessionStore()], [SharedSessionStore(path, lambda: engine), SharedSessionStore(path, lambda: engine)]):
+        session = ScenarioSession.open(engine)
+        session.set_views([])
+        stores[0].add(session)
+        _in_parallel([lambda k=k, v=v: stores[k % len(stores)].update(session.id, lambda s: s.update_view(v))
+                      for k, v in enumerate(views)])
+        final = stores[-1].update(session.id, lambda s: s.recommendation())
+        assert sorted(v["ticker"] for v in stores[-1].get(session.id).user_views) == sorted(engine.tickers[:THREADS])
+        for t in engine.tickers:
+            assert abs(final["weights"][t] - expected["weights"][t]) < 1e-6
+
+
+def test_baseline_is_built_once_under_concurrent_scenarios(synthetic_prices, monkeypatch):
+    engine = BLEngine(synthetic_prices)
+    builds = []
+    build = engine._build_baseline
+    monkeypatch.setattr(engine, "_build_baseline", lambda: builds.append(1) or build())
+    expected = BLEngine(synthetic_prices).run_scenario([])
+    view = [{"ticker": "XLK", "value": 0.05, "confidence": 0.5}]
+    with_view = BLEngine(synthetic_prices).run_scenario(view)
+    results = _in_parallel([lambda: engine.run_scenario([]), lambda: engine.run_scenario(view)] * (THREADS // 2)
+                           + [engine.refresh_baseline])
+    assert len(builds) <= 2  # the first reader's build, and the refresh's
+    for k, result in enumerate(results[:-1]):
+        assert result["weights"] == (expected if k % 2 == 0 else with_view)["weights"]
@@ -0,0 +1,36 @@
+"""Tests for app/curves.py (range-query window metrics over equity curves)."""
+
+import numpy as np
+import pandas as pd
+
+from app.curves import CurveIndex
+
+
+def test_curve_index_matches_pandas_windows():
+    rng = np.random.default_rng(3)
+    idx = pd.bdate_range("2015-01-01", periods=900)
+    curve = pd.Series(100 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, len(idx)))), index=idx)
+    index = CurveIndex(curve)
+    for s, e in [(0, 899), (10, 11), (123, 456), (500, 899), (37, 640)]:
+        window = curve.iloc[s:e + 1]
+        rets = window.pct_change().dropna()
+        stats = index.stats(idx[s], idx[e])
+        assert stats["days"] == e - s
+        assert np.isclose(stats["total_return"], window.iloc[-1] / window.iloc[0] - 1)
+        assert np.isclose(stats["max_dd"], (window / window.cummax() - 1).min(), atol=1e-12)
+        if len(rets) > 1:
+            assert np.isclose(stats["vol"], rets.std() * np.sqrt(252))
+            assert np.isclose(stats["sortino"], rets.mean() * 252 / (rets[rets < 0].std() * np.sqrt(252)))
+    assert index.stats(idx[5], idx[5]) is None
+
+
+def test_curve_index_round_trips_through_plain_arrays():
+    import pickle
+
+    rng = np.random.default_rng(4)
+    idx = pd.bdate_range("2018-01-01", periods=300)
+    curve = pd.Series(100 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, len(idx)))), index=idx)
+    index = CurveIndex(curve)
+    restored = CurveIndex.from_arrays(pickle.loads(pickle.dumps(index.arrays())))
+    for start, end in [(None, None), (idx[20], idx[250]), ("2018-03-01", "2018-09-30")]:
+        assert restored.stats(start, end) == index.stats(start, end)
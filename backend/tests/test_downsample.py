@@ -0,0 +1,22 @@
+"""Tests for app/downsample.py (LTTB downsampling of curves)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.downsample import downsample_result
+from app.engine import BLEngine, calc_max_drawdown
+
+
+def test_downsample_keeps_shape_and_drawdown(synthetic_prices):
+    result = BLEngine(synthetic_prices).run_backtest("2007-01-01", "2030-01-01", [])
+    thin = downsample_result(result, 300, "dates", ("portfolio", "spy"))
+    assert thin["downsampled"]["of"] == len(result["dates"]) and len(thin["dates"]) <= 300
+    assert thin["dates"][0] == result["dates"][0] and thin["dates"][-1] == result["dates"][-1]
+    assert set(thin["dates"]) <= set(result["dates"]) and thin["metrics"] == result["metrics"]
+    for k in ("portfolio", "spy"):
+        full, kept = np.array(result[k]), np.array(thin[k])
+        assert kept.max() == full.max() and kept.min() == full.min()
+        assert calc_max_drawdown(pd.Series(kept)) == pytest.approx(calc_max_drawdown(pd.Series(full)))
+    assert downsample_result(result, 10_000, "dates", ("portfolio", "spy")) is result
+    assert "error" in downsample_result(result, 5, "dates", ("portfolio", "spy"))
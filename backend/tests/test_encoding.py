@@ -0,0 +1,75 @@
+"""Tests for app/encoding.py (response media types, JSON encoding, compression)."""
+
+import gzip
+import json
+from types import SimpleNamespace
+
+import msgpack
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from app import encoding
+from app.engine import BLEngine
+
+
+def test_columnar_encodings_round_trip(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    result = engine.run_backtest("2007-01-01", "2030-01-01", [])
+    assert encoding.negotiate(None) == encoding.JSON
+    assert encoding.negotiate("text/html, */*") == encoding.JSON
+
+    assert encoding.negotiate("application/json;q=0.5, application/x-msgpack") == encoding.MSGPACK
+    decoded = encoding.from_columnar(msgpack.unpackb(encoding.encode_msgpack(result)))
+    assert decoded["dates"] == result["dates"]
+    assert np.allclose(decoded["portfolio"], result["portfolio"], rtol=1e-6)
+    assert decoded["metrics"] == result["metrics"] and decoded["yearly_table"] == result["yearly_table"]
+
+    mc = engine.run_monte_carlo(0.08, 0.15, days=252, n_sims=200)
+    table = pa.ipc.open_stream(encoding.encode_arrow(mc)).read_all()
+    assert table.num_rows == 252 and table.column("days").to_pylist() == mc["days"]
+    assert np.allclose(table.column("sample_paths.1").to_numpy(), mc["sample_paths"][1], rtol=1e-6)
+    assert table.schema.metadata[b"result"] == b'{"simulation_count": 200}'
+
+
+def test_unavailable_media_type_is_not_acceptable(synthetic_prices, monkeypatch):
+    import main
+    from fastapi import HTTPException
+
+    monkeypatch.setattr(encoding, "msgpack", None)
+    assert encoding.available_types() == [encoding.JSON, encoding.ARROW]
+    assert encoding.negotiate("application/x-msgpack") is None
+    assert encoding.negotiate("application/x-msgpack, application/json;q=0.1") == encoding.JSON
+    assert encoding.negotiate("application/x-msgpack, */*;q=0.1") == encoding.JSON
+    assert encoding.negotiate("application/x-msgpack, application/vnd.apache.arrow.stream;q=0.5") == encoding.ARROW
+
+    monkeypatch.setattr(main, "bl_engine", BLEngine(synthetic_prices))
+    monkeypatch.setattr(main, "result_cache", main.ResultCache())
+    monkeypatch.setattr(main, "response_bodies", main.ResultCache())
+    request = main.MonteCarloRequest(mu=0.08, sigma=0.15, days=60)
+    with pytest.raises(HTTPException) as err:
+        main.run_monte_carlo(request, SimpleNamespace(headers={"accept": encoding.MSGPACK}))
+    assert err.value.status_code == 406 and encoding.ARROW in err.value.detail
+    arrow = main.run_monte_carlo(request, SimpleNamespace(headers={"accept": encoding.ARROW}))
+    assert arrow.media_type == encoding.ARROW
+
+
+def test_json_encoding_and_compression(monkeypatch):
+    payload = {"dates": ["2020-01-02"] * 500, "values": np.linspace(0.0, 1.0, 500), "n": np.int64(3)}
+    body = encoding.encode_json(payload)
+    assert json.loads(body) == {"dates": payload["dates"], "values": payload["values"].tolist(), "n": 3}
+
+    assert encoding.content_coding(None) is None
+    assert encoding.content_coding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert encoding.content_coding("identity") is None
+    assert encoding.compress(b"{}", "gzip") is None  # below COMPRESS_MIN_BYTES
+    assert gzip.decompress(encoding.compress(body, "gzip")) == body
+    assert encoding.content_coding("gzip, deflate, br") == "br"
+    assert encoding.brotli.decompress(encoding.compress(body, "br")) == body
+
+    # Without orjson and brotli: the same JSON from the stdlib, gzip only.
+    monkeypatch.setattr(encoding, "orjson", None)
+    monkeypatch.setattr(encoding, "brotli", None)
+    assert json.loads(encoding.encode_json(payload)) == json.loads(body)
+    assert encoding.content_coding("gzip, deflate, br") == "gzip"
+    assert encoding.content_coding("br") is None
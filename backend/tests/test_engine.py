@@ -7,7 +7,9 @@ Run from the backend/ directory so that the `app` package is importable:
     pytest                    # or: pytest tests/test_engine.py -v
 
 These tests use synthetic price data, so they do NOT hit the network and do
-not depend on Yahoo Finance being reachable.
+not depend on Yahoo Finance being reachable (the synthetic_prices fixture
+lives in tests/conftest.py). Self-contained app modules are tested in
+their own tests/test_<module>.py.
 """
 
 import numpy as np
@@ -27,32 +29,6 @@ from app.engine import (
     DELTA_MAX,
 )
 
-TICKERS = ["XLB", "XLC", "XLE", "XLF", "XLI", "XLK",
-           "XLP", "XLRE", "XLU", "XLV", "XLY"]
-
-
-@pytest.fixture
-def synthetic_prices():
-    """Build a realistic-ish, network-free price panel.
-
-    A shared market factor gives the sectors positive correlation, which keeps
-    the implied-equilibrium returns above the risk-free rate so the max-Sharpe
-    optimizer always has a feasible solution.
-    """
-    rng = np.random.default_rng(7)
-    n_days = 900
-    dates = pd.bdate_range("2017-01-02", periods=n_days)
-    market_factor = rng.normal(0.0004, 0.010, n_days)
-    data = {}
-    for sym in TICKERS + ["SPY", "VNQ", "VOX"]:
-        idio = rng.normal(0.0002, 0.008, n_days)
-        rets = market_factor + idio
-        data[sym] = pd.Series(100.0 * np.exp(np.cumsum(rets)), index=dates)
-    # ^IRX is quoted as an annual percentage yield (e.g. 2.0 == 2%).
-    data["^IRX"] = pd.Series(2.0, index=dates)
-    return pd.DataFrame(data)
-
-
 # --- Pure helper functions (fully deterministic) ---------------------------
 
 def test_clamp():
@@ -167,3 +143,538 @@ def test_run_backtest_rejects_inverted_dates(synthetic_prices):
     engine = BLEngine(synthetic_prices)
     result = engine.run_backtest("2020-01-01", "2019-01-01", [])
     assert "error" in result
+
+
+def test_run_backtest_parallel_matches_inline(synthetic_prices, monkeypatch):
+    import app.engine as eng
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-01-01"}]
+    monkeypatch.setattr(eng, "BACKTEST_WORKERS", 1)
+    inline = BLEngine(synthetic_prices.copy()).run_backtest("2018-06-01", "2020-06-01", views)
+    monkeypatch.setattr(eng, "BACKTEST_WORKERS", 2)
+    monkeypatch.setattr(eng, "PARALLEL_MIN_PERIODS", 1)
+    pooled = BLEngine(synthetic_prices.copy()).run_backtest("2018-06-01", "2020-06-01", views)
+    assert pooled["dates"] == inline["dates"]
+    assert np.allclose(pooled["portfolio"], inline["portfolio"])
+    assert pooled["yearly_table"] == inline["yearly_table"]
+
+
+# --- Fast mode: precomputed signals + array optimizer ----------------------
+
+def test_signal_panel_matches_engine_helpers(synthetic_prices):
+    from app.engine import equilibrium_inputs, view_signals, TRAIN_WINDOW
+    engine = BLEngine(synthetic_prices)
+    panel = engine.signal_panel()
+    cursor = panel.cursor()
+    for i in (TRAIN_WINDOW, TRAIN_WINDOW + 1, TRAIN_WINDOW + 137, len(panel)):
+        train = engine.asset_prices.iloc[i - TRAIN_WINDOW:i]
+        train_mkt = engine.market_prices.loc[train.index]
+        S, delta_raw, _ = equilibrium_inputs(train, train_mkt)
+        assert np.allclose(cursor.covariance(i), S.to_numpy(), rtol=1e-10, atol=1e-14)
+        assert np.isclose(clamp(panel.delta_raw[i], DELTA_MIN, DELTA_MAX), delta_raw)
+        sig = view_signals(train, train_mkt)
+        assert np.allclose(panel.raw_mom[i], sig["raw_mom"].reindex(panel.tickers).to_numpy())
+        assert np.allclose(panel.raw_rev[i], sig["raw_rev"].reindex(panel.tickers).to_numpy())
+        assert np.allclose(panel.asset_vol[i], sig["asset_vol"].reindex(panel.tickers).to_numpy())
+        assert np.isclose(panel.spy_trend[i], sig["spy_trend"])
+
+
+def test_array_optimizer_matches_pypfopt(synthetic_prices):
+    from app.engine import optimize_bl_arrays
+    engine = BLEngine(synthetic_prices)
+    train = engine.asset_prices.iloc[-504:]
+    train_mkt = engine.market_prices.loc[train.index]
+    S, delta, pi, w_anchor = get_equilibrium_from_anchor(train, train_mkt)
+    view_dict = {"XLK": float(pi["XLK"]) + 0.05, "XLE": float(pi["XLE"]) - 0.03}
+    conf = pd.Series({"XLK": 0.7, "XLE": 0.4})
+    expected, _, _ = optimize_bl_portfolio(
+        S, pi, view_dict, conf, delta, engine.tickers, w_anchor, 0.30, risk_free_rate=0.02,
+    )
+    cols = list(S.columns)
+    view_idx = [cols.index(t) for t in view_dict]
+    weights, _ = optimize_bl_arrays(
+        S.to_numpy(), pi[cols].to_numpy(), view_idx, list(view_dict.values()), conf[list(view_dict)].to_numpy(),
+        delta, w_anchor.to_numpy(), 0.30, risk_free_rate=0.02,
+    )
+    assert np.allclose(weights, expected.reindex(cols).to_numpy(), atol=2e-5)
+
+    # Views pulling every asset below the risk-free rate leave no max-Sharpe
+    # portfolio; the anchor is held without handing pypfopt the problem.
+    from app import optimizer
+    low = [float(pi[t]) - 0.5 for t in cols]
+    conf_all = np.full(len(cols), 0.9)
+    ret_bl, _ = optimizer.bl_posterior(S.to_numpy(), pi[cols].to_numpy(), range(len(cols)), low, conf_all)
+    assert not optimizer.sharpe_feasible(ret_bl, 0.02, 0.30)
+    assert optimizer.sharpe_feasible(pi[cols].to_numpy(), 0.0, 0.30)
+    weights, raw = optimize_bl_arrays(
+        S.to_numpy(), pi[cols].to_numpy(), list(range(len(cols))), low, conf_all,
+        delta, w_anchor.to_numpy(), 0.30, risk_free_rate=0.02,
+    )
+    assert raw is None and np.array_equal(weights, w_anchor.to_numpy())
+
+
+def test_run_backtest_fast_mode_daily(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-01"}]
+    result = engine.run_backtest("2018-06-01", "2020-06-01", views, mode="fast", rebalance_freq=1)
+    assert "error" not in result
+    reb = result["rebalance"]
+    assert reb["mode"] == "fast" and reb["frequency"] == 1
+    assert reb["rebalances"] == len(result["dates"])
+    assert reb["trades"] <= reb["rebalances"]
+    for key in ("sharpe", "max_dd", "volatility", "risk_free"):
+        assert np.isfinite(result["metrics"][key])
+
+
+def test_run_backtest_rejects_unknown_mode(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    assert "error" in engine.run_backtest("2018-06-01", "2020-06-01", [], mode="turbo")
+    assert "error" in engine.run_backtest("2018-06-01", "2020-06-01", [], mode="fast", rebalance_freq=0)
+
+
+def test_run_backtest_triggered_mode(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}]
+    result = engine.run_backtest("2018-06-01", "2020-06-01", views, mode="triggered")
+    assert "error" not in result
+    reb = result["rebalance"]
+    assert reb["mode"] == "triggered"
+    assert sum(reb["triggers"].values()) == reb["rebalances"]
+    assert reb["optimizations"] <= reb["rebalances"]
+    # The view's start date is a trigger in its own right.
+    assert reb["triggers"]["views"] >= 1
+    # Far fewer optimizations than a daily replay of the same span.
+    daily = engine.run_backtest("2018-06-01", "2020-06-01", views, mode="fast", rebalance_freq=1)
+    assert reb["optimizations"] < daily["rebalance"]["optimizations"] / 3
+    # A window edge still triggers behind 64 other dated views.
+    many = [{"ticker": "XLB", "value": 0.01, "confidence": 0.5, "start_date": "2000-01-03"}] * 64 + views
+    crowded = engine.run_backtest("2018-06-01", "2020-06-01", many, mode="triggered")
+    assert crowded["rebalance"]["triggers"]["views"] >= 1
+
+
+def test_run_backtest_batch_matches_individual_runs(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    view_sets = [
+        [],
+        [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}],
+        [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}],
+    ]
+    batch = engine.run_backtest_batch("2018-06-01", "2020-06-01", view_sets)
+    assert "error" not in batch
+    assert len(batch["results"]) == len(view_sets)
+    for views, result in zip(view_sets, batch["results"]):
+        single = engine.run_backtest("2018-06-01", "2020-06-01", views)
+        assert result["dates"] == single["dates"]
+        assert np.allclose(result["portfolio"], single["portfolio"])
+        assert result["yearly_table"] == single["yearly_table"]
+    assert "error" in engine.run_backtest_batch("2018-06-01", "2020-06-01", [])
+
+
+def test_run_backtest_batch_fast_modes_match_individual_runs(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    view_sets = [
+        [],
+        [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}],
+        [{"ticker": "XLE", "value": -0.04, "confidence": 0.5, "end_date": "2019-03-01"}],
+        [{"ticker": "XLK", "value": 0.05, "confidence": 0.6, "start_date": "2019-06-03"}],
+    ]
+    for mode, freq in (("fast", 5), ("triggered", None)):
+        batch = engine.run_backtest_batch("2018-06-01", "2020-06-01", view_sets, mode=mode, rebalance_freq=freq)
+        assert "error" not in batch
+        for views, result in zip(view_sets, batch["results"]):
+            single = engine.run_backtest("2018-06-01", "2020-06-01", views, mode=mode, rebalance_freq=freq)
+            assert result["dates"] == single["dates"]
+            # Triggered sets decide on different rows, so a set's smoothed
+            # delta path can round differently from a lone run's.
+            np.testing.assert_allclose(result["portfolio"], single["portfolio"], rtol=1e-12)
+            for key in ("rebalances", "optimizations", "trades", "triggers"):
+                assert result["rebalance"].get(key) == single["rebalance"].get(key)
+
+
+def test_run_scenario_batch_matches_run_scenario(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    view_sets = [
+        [],
+        [{"ticker": "XLK", "value": 0.10, "confidence": 0.7}],
+        [{"ticker": "XLE", "value": 0.05, "confidence": 0.5}, {"ticker": "ZZZZ", "value": 0.05, "confidence": 0.5}],
+    ]
+    batch = engine.run_scenario_batch(view_sets)
+    assert "error" not in batch
+    assert len(batch["results"]) == len(view_sets)
+    for views, result in zip(view_sets, batch["results"]):
+        single = engine.run_scenario(views)
+        for t in engine.tickers:
+            assert abs(result["weights"][t] - single["weights"][t]) < 1e-6
+        assert np.isclose(result["metrics"]["expected_return"], single["metrics"]["expected_return"])
+        assert np.isclose(result["exposure"]["invested"], single["exposure"]["invested"])
+        assert result["warnings"] == single["warnings"]
+    assert "error" in engine.run_scenario_batch([])
+
+
+def test_scenario_session_incremental_updates_match_run_scenario(synthetic_prices):
+    from app.sessions import ScenarioSession
+    engine = BLEngine(synthetic_prices)
+    session = ScenarioSession.open(engine)
+    views = {}
+    for ticker, value, conf in [("XLK", 0.10, 0.7), ("XLE", 0.05, 0.5), ("XLK", 0.02, 0.3)]:
+        views[ticker] = {"ticker": ticker, "value": value, "confidence": conf}
+        result = session.update_view(views[ticker])
+        expected = engine.run_scenario(list(views.values()))
+        for t in engine.tickers:
+            assert abs(result["weights"][t] - expected["weights"][t]) < 1e-6
+        assert np.isclose(result["metrics"]["expected_return"], expected["metrics"]["expected_return"])
+    del views["XLE"]
+    result = session.remove_view("XLE")
+    expected = engine.run_scenario(list(views.values()))
+    for t in engine.tickers:
+        assert abs(result["weights"][t] - expected["weights"][t]) < 1e-6
+    assert result["session_id"] == session.id
+
+
+def test_shared_session_store_serves_any_worker(synthetic_prices, tmp_path):
+    from app.sessions import ScenarioSession, SharedSessionStore
+    engine = BLEngine(synthetic_prices)
+    path = str(tmp_path / "sessions.sqlite")
+    # Two workers: each its own store (and engine) on the same file.
+    first = SharedSessionStore(path, lambda: engine)
+    second = SharedSessionStore(path, lambda: BLEngine(synthetic_prices))
+    session = ScenarioSession.open(engine)
+    session.set_views([])
+    first.add(session)
+    xlk = {"ticker": "XLK", "value": 0.10, "confidence": 0.7}
+    xle = {"ticker": "XLE", "value": 0.05, "confidence": 0.5}
+    second.update(session.id, lambda s: s.update_view(xlk))
+    # The first worker's in-memory copy is stale; it reloads the saved one.
+    result = first.update(session.id, lambda s: s.update_view(xle))
+    expected = engine.run_scenario([xlk, xle])
+    for t in engine.tickers:
+        assert abs(result["weights"][t] - expected["weights"][t]) < 1e-6
+    assert len(second) == 1 and [v["ticker"] for v in second.get(session.id).user_views] == ["XLK", "XLE"]
+    assert second.drop(session.id) and first.update(session.id, lambda s: s.remove_view("XLK")) is None
+
+
+def test_latest_baseline_serves_no_view_scenarios(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    fresh = engine._recommend(engine._build_scenario_inputs(), [{"ticker": "XLK", "value": 0.05, "confidence": 0.5}])
+    baseline = engine.refresh_baseline()
+    assert baseline["recommendation"]["date"] == str(engine.asset_prices.index[-1].date())
+    first = engine.run_scenario([])
+    first["weights"]["XLK"] = -1.0  # callers get a copy, not the cached object
+    assert engine.run_scenario([]) == baseline["recommendation"]
+    # User views applied on top of the cached inputs match a from-scratch build.
+    cached = engine.run_scenario([{"ticker": "XLK", "value": 0.05, "confidence": 0.5}])
+    assert cached["weights"] == fresh["weights"]
+    assert engine.run_scenario([], target_date=str(engine.asset_prices.index[-1].date())) == baseline["recommendation"]
+
+    # Readers racing a refresh get the old or the new baseline, never None.
+    import threading
+    seen = []
+    readers = [threading.Thread(target=lambda: seen.extend(engine._latest_baseline() for _ in range(200)))
+               for _ in range(4)]
+    for t in readers:
+        t.start()
+    engine.refresh_baseline()
+    for t in readers:
+        t.join()
+    assert None not in seen
+    cold = BLEngine(synthetic_prices)
+    assert cold._latest_baseline()["recommendation"] == baseline["recommendation"]
+
+
+def test_recommendation_history_matches_run_scenario(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": "XLK", "value": 0.05, "confidence": 0.6}]
+    history = engine.recommendation_history(start_date="2019-01-01", end_date="2020-02-29", freq="M",
+                                            user_views=views)
+    assert "error" not in history
+    assert len(history["dates"]) == 14
+    for k, date in enumerate(history["dates"]):
+        single = engine.run_scenario(views, target_date=date)
+        assert single["date"] == date
+        for t in engine.tickers:
+            assert abs(history["weights"][t][k] - single["weights"][t]) < 1e-6
+        assert np.isclose(history["expected_return"][k], single["metrics"]["expected_return"])
+        assert np.isclose(history["invested"][k], single["exposure"]["invested"])
+        assert history["regime"][k] == single["regime"]["volatility"]
+    early = engine.recommendation_history(dates=["2017-03-01", "2019-03-01"])
+    assert early["dates"] == ["2019-03-01"] and early["warnings"]
+
+
+def test_result_cache_keys_on_data_version(synthetic_prices):
+    from app.cache import ResultCache, request_key
+
+    engine = BLEngine(synthetic_prices)
+    other = BLEngine(synthetic_prices.iloc[:-5])
+    assert engine.data_version != other.data_version
+    assert engine.data_version == BLEngine(synthetic_prices.copy()).data_version
+    payload = {"views": [], "date": None}
+    key = request_key("scenario", payload, engine.data_version, engine.config_fingerprint())
+    assert key != request_key("scenario", payload, other.data_version, engine.config_fingerprint())
+
+    cache = ResultCache(max_entries=2)
+    calls = []
+    compute = lambda: calls.append(1) or {"value": len(calls)}
+    assert cache.get_or_compute(key, compute) == cache.get_or_compute(key, compute) == {"value": 1}
+    assert cache.get_or_compute("bad", lambda: {"error": "x"}) == {"error": "x"}
+    assert cache.get("bad") is None  # errors are never cached
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get(key) is None and len(cache) == 2  # least recently used evicted
+
+
+def test_backtest_resumes_from_checkpoint(synthetic_prices):
+    from app.cache import ResultCache
+
+    store = ResultCache()
+    views = [{"ticker": "XLK", "value": 0.04, "confidence": 0.6}]
+    old = BLEngine(synthetic_prices.iloc[:-100].copy(), checkpoints=store)
+    first = old.run_backtest("2007-01-01", "2030-01-01", views)
+    assert first["rebalance"]["resumed_periods"] == 0 and len(store) == 1
+
+    new = BLEngine(synthetic_prices, checkpoints=store)
+    extended = new.run_backtest("2007-01-01", "2030-01-01", views)
+    fresh = BLEngine(synthetic_prices).run_backtest("2007-01-01", "2030-01-01", views)
+    assert extended["rebalance"]["resumed_periods"] > 0
+    for k in ("dates", "portfolio", "spy", "metrics", "yearly_table"):
+        assert extended[k] == fresh[k]
+
+    # A revised history (not just appended closes) starts over.
+    revised = synthetic_prices.copy()
+    revised.iloc[600:, 0] *= 1.01
+    rerun = BLEngine(revised, checkpoints=store).run_backtest("2007-01-01", "2030-01-01", views)
+    assert rerun["rebalance"]["resumed_periods"] == 0
+
+
+def test_backtest_windows_presets_and_years(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    result = engine.run_backtest("2007-01-01", "2030-01-01", [])
+    curves = engine.curve_arrays(result)
+    assert all(isinstance(a, np.ndarray) for arrays in curves.values() for a in arrays.values())
+    out = engine.backtest_windows(curves, [{"preset": "MAX"}, {"name": "crash", "start_date": "2008-01-01",
+                                                                "end_date": "2008-06-30"}], calendar_years=True)
+    full = out["windows"][0]["portfolio"]
+    assert np.isclose(full["total_return"], result["portfolio"][-1] / result["portfolio"][0] - 1)
+    assert np.isclose(full["max_dd"], result["metrics"]["max_dd"])
+    yearly = {str(row["year"]): row["portfolio"] for row in result["yearly_table"]}
+    for w in out["windows"][3:]:  # full calendar years after the first (partial) one
+        assert np.isclose(w["portfolio"]["total_return"], yearly[w["name"]])
+    assert "error" in engine.backtest_windows(curves, [{"preset": "2W"}])
+
+
+def test_stream_backtest_events_rebuild_run_backtest(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    views = [{"ticker": "XLK", "value": 0.04, "confidence": 0.6}]
+    expected = engine.run_backtest("2007-01-01", "2030-01-01", views)
+
+    events = list(BLEngine(synthetic_prices).stream_backtest("2007-01-01", "2030-01-01", views))
+    periods = [e for e in events if e["type"] == "period"]
+    assert events[0]["type"] == "start" and events[0]["periods"] == len(periods)
+    assert len(periods) == expected["rebalance"]["rebalances"]
+    assert sum((e["dates"] for e in periods), []) == expected["dates"]
+    assert np.allclose(sum((e["portfolio"] for e in periods), []), expected["portfolio"])
+    assert np.isclose(periods[-1]["metrics"]["max_dd"], expected["metrics"]["max_dd"])
+
+    done = events[-1]
+    assert done["type"] == "done"
+    for k in ("dates", "portfolio", "spy", "metrics", "yearly_table", "warnings"):
+        assert done["result"][k] == expected[k]
+
+    [error] = list(engine.stream_backtest("2030-01-01", "2007-01-01", views))
+    assert error["type"] == "error"
+
+
+def test_conditional_requests_skip_computation(synthetic_prices, monkeypatch):
+    import main
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(main, "bl_engine", BLEngine(synthetic_prices))
+    monkeypatch.setattr(main, "result_cache", main.ResultCache())
+    monkeypatch.setattr(main, "response_bodies", main.ResultCache())
+    request = main.MonteCarloRequest(mu=0.08, sigma=0.15, days=60)
+    first = main.run_monte_carlo(request)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"]
+
+    main.result_cache.clear()
+    http = SimpleNamespace(headers={"if-none-match": etag})
+    again = main.run_monte_carlo(request, http)
+    assert again.status_code == 304 and again.headers["etag"] == etag and len(main.result_cache) == 0
+
+    other = main.run_monte_carlo(main.MonteCarloRequest(mu=0.09, sigma=0.15, days=60), http)
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+
+def test_stage_timings_cross_workers_and_reach_metrics(synthetic_prices, monkeypatch):
+    import json
+    from types import SimpleNamespace
+    import app.engine as eng
+    import main
+    from app import telemetry
+
+    with telemetry.stage("ignored"):
+        pass  # no collector: nothing to record into
+    monkeypatch.setattr(eng, "BACKTEST_WORKERS", 2)
+    monkeypatch.setattr(eng, "PARALLEL_MIN_PERIODS", 1)
+    with telemetry.collect("test_backtest") as timings:
+        BLEngine(synthetic_prices).run_backtest("2018-06-01", "2020-06-01", [])
+    # Covariance and signals run in the worker processes; their time comes back.
+    assert timings["covariance"][1] >= 2 and timings["signals"][1] >= 2
+    assert {"max_sharpe", "report"} <= set(timings) and "ignored" not in timings
+    text = telemetry.REGISTRY.render()
+    assert 'bl_stage_seconds_count{endpoint="test_backtest",stage="covariance"} 1' in text
+    assert 'bl_request_seconds_bucket{endpoint="test_backtest",le="+Inf"} 1' in text
+
+    monkeypatch.setattr(main, "bl_engine", BLEngine(synthetic_prices))
+    monkeypatch.setattr(main, "result_cache", main.ResultCache())
+    monkeypatch.setattr(main, "response_bodies", main.ResultCache())
+    request = main.MonteCarloRequest(mu=0.08, sigma=0.15, days=60)
+    plain = main.run_monte_carlo(request)
+    assert "timings" not in json.loads(plain.body) and "monte_carlo" in plain.headers["server-timing"]
+    timed = main.run_monte_carlo(request, SimpleNamespace(headers={"x-timings": "1"}))
+    block = json.loads(timed.body)["timings"]
+    assert block["cached"] and "etag" not in timed.headers
+
+
+def test_profiled_request_stores_retrievable_report(synthetic_prices, monkeypatch):
+    import marshal
+    from types import SimpleNamespace
+    from fastapi import HTTPException
+    import main
+    from app import profiling
+
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(main, "bl_engine", BLEngine(synthetic_prices))
+    monkeypatch.setattr(main, "result_cache", main.ResultCache())
+    monkeypatch.setattr(main, "profile_store", profiling.ProfileStore())
+    request = main.ScenarioRequest(views=[{"ticker": "XLK", "value": 0.05, "confidence": 0.6}])
+    plain = main.run_scenario(request, SimpleNamespace(headers={"x-profile": "wrong"}))
+    assert "x-profile-id" not in plain.headers and len(main.profile_store) == 0
+
+    admin = SimpleNamespace(headers={"x-profile": "secret"})
+    profiled = main.run_scenario(request, admin)  # a cache hit is still recomputed
+    assert profiled.body == plain.body and profiled.headers["cache-control"] == "no-store"
+    report = main.get_profile(profiled.headers["x-profile-id"], http=admin)
+    assert report["endpoint"] == "scenario" and report["peak_memory_bytes"] > 0
+    assert any("run_scenario" in row["function"] for row in report["top_functions"])
+    assert "max_sharpe" in report["timings"]["stages"]
+    raw = main.get_profile(report["id"], format="pstats", http=admin)
+    assert marshal.loads(raw.body)
+    with pytest.raises(HTTPException) as denied:
+        main.list_profiles(SimpleNamespace(headers={}))
+    assert denied.value.status_code == 403
+
+
+def test_benchmark_panels_and_baseline_comparison():
+    from benchmarks.panels import synthetic_panel
+    from benchmarks.run import compare
+
+    prices, tickers = synthetic_panel(700, 40, seed=1)
+    assert prices.shape == (700, 42) and tickers[0] == "A000"
+    assert prices.equals(synthetic_panel(700, 40, seed=1)[0])
+    engine = BLEngine(prices, tickers=tickers)
+    assert engine.tickers == tickers and engine.asset_prices.shape == (700, 40)
+
+    def doc(*rows):
+        return {"results": [{"id": i, "seconds": {"median": s}, "peak_memory_bytes": m} for i, s, m in rows]}
+
+    baseline = doc(("a", 1.0, 10 << 20), ("b", 1.0, 10 << 20), ("c", 1.0, 10 << 20), ("d", 0.001, 1 << 20))
+    current = doc(("a", 1.1, 10 << 20), ("b", 1.5, 10 << 20), ("c", 0.5, 20 << 20), ("d", 0.002, 1 << 20),
+                  ("e", 1.0, None))
+    baseline["results"].append({"id": "f", "seconds": {"median": 1.0}})
+    current["results"].append({"id": "f", "error": "OptimizationError: infeasible"})
+    status = {row["id"]: row["status"] for row in compare(current, baseline)}
+    # "d" doubled but by 1 ms: below MIN_TIME_DELTA, so noise rather than a regression.
+    assert status == {"a": "ok", "b": "regression", "c": "regression", "d": "ok", "e": "new", "f": "failed"}
+
+
+def test_benchmark_checks_the_fast_latency_target(synthetic_prices, monkeypatch):
+    import app.engine as eng
+    from app import data_loader
+    from benchmarks import run
+
+    monkeypatch.setattr(data_loader, "_read_cache", lambda: None)
+    assert run.check_fast_latency(log=lambda *a, **k: None) is None
+    monkeypatch.setattr(data_loader, "_read_cache", lambda: synthetic_prices.copy())
+    assert run.check_fast_latency(log=lambda *a, **k: None)["ok"]
+    monkeypatch.setattr(eng, "FAST_LATENCY_TARGET_S", 0.0)
+    missed = run.check_fast_latency(log=lambda *a, **k: None)
+    assert not missed["ok"] and missed["target"] == 0.0
+
+
+def test_load_test_drives_app_and_reports_percentiles(synthetic_prices, monkeypatch):
+    import asyncio
+    import httpx
+    import main
+    from benchmarks.loadtest import drive, parse_mix, request_bodies, summarize
+
+    monkeypatch.setattr(main, "bl_engine", BLEngine(synthetic_prices))
+    monkeypatch.setattr(main, "result_cache", main.ResultCache())
+    monkeypatch.setattr(main, "response_bodies", main.ResultCache())
+    mix = parse_mix("scenario=2,monte_carlo=1")
+    with pytest.raises(ValueError):
+        parse_mix("unknown=1")
+    bodies = request_bodies(2, synthetic_prices.index)
+    assert len(bodies["scenario"]) == 2 and bodies["scenario"][0] != bodies["scenario"][1]
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+            return await drive(client, bodies, mix, concurrency=3, duration=None, max_requests=12)
+
+    records = asyncio.run(run())
+    assert 12 <= len(records) < 15 and all(status == 200 for _, status, _, _ in records)
+    report = summarize(records, wall=2.0)
+    assert report["all"]["requests"] == len(records) and report["all"]["errors"] == 0
+    assert set(report) <= {"scenario", "monte_carlo", "all"}
+    assert report["all"]["p50_ms"] <= report["all"]["p95_ms"] <= report["all"]["p99_ms"] <= report["all"]["max_ms"]
+
+
+def test_shared_panel_and_result_cache_across_workers(synthetic_prices, tmp_path, monkeypatch):
+    from app import shared
+    from app.cache import SharedResultCache
+
+    loads = []
+
+    def load():
+        loads.append(1)
+        return synthetic_prices.copy()
+
+    root = str(tmp_path / "shared")
+    engine = shared.shared_engine(root, load, BLEngine)
+    # A second worker of the same server attaches without loading anything.
+    other = shared.shared_engine(root, load, BLEngine)
+    assert loads == [1] and other.data_version == engine.data_version
+    # A restart (any other generation, even from the same shell) reloads.
+    import os
+    assert shared.generation() != str(os.getppid())
+    current = shared.read_current(root)
+    shared._write_current(root, {**current, "generation": f"{os.getppid()}-0"})
+    shared.shared_engine(root, load, BLEngine)
+    assert loads == [1, 1]
+    assert not other.asset_prices.to_numpy().flags.writeable
+    private = BLEngine(synthetic_prices.copy())
+    assert engine.data_version == private.data_version
+    np.testing.assert_array_equal(engine.signal_panel().realized_vol, private.signal_panel().realized_vol)
+    a = engine.run_backtest("2018-06-01", "2020-06-01", [], mode="fast", rebalance_freq=21)
+    b = private.run_backtest("2018-06-01", "2020-06-01", [], mode="fast", rebalance_freq=21)
+    assert a["metrics"] == pytest.approx(b["metrics"], rel=1e-9)
+    # An older refresh check triggers a reload; unchanged data keeps the engine.
+    assert shared.shared_engine(root, load, BLEngine, current_engine=other, max_age=0) is other
+    assert len(loads) == 3
+
+    path = str(tmp_path / "results.sqlite")
+    first, second = SharedResultCache(path, max_entries=2), SharedResultCache(path, max_entries=2)
+    assert first.get_or_compute("k1", lambda: {"value": 1}) == {"value": 1}
+    assert second.get("k1") == {"value": 1} and second.stats()["hits"] == 1
+    second.get_or_compute("bad", lambda: {"error": "x"})
+    first.put("k2", {"value": 2})
+    second.put("k3", {"value": 3})
+    assert len(first) == 2 and first.get("k1") is None
+    # Hits only write (refresh the LRU stamp) once the stamp is SHARED_CACHE_TOUCH_S old.
+    import app.cache
+    stamp = "SELECT used FROM results WHERE key = 'k3'"
+    used = first._db().execute(stamp).fetchone()[0]
+    first.get("k3")
+    assert first._db().execute(stamp).fetchone()[0] == used
+    monkeypatch.setattr(app.cache, "SHARED_CACHE_TOUCH_S", -1.0)
+    first.get("k3")
+    assert first._db().execute(stamp).fetchone()[0] > used
@@ -0,0 +1,23 @@
+"""Tests for app/metrics.py (vectorized performance metrics)."""
+
+import numpy as np
+import pandas as pd
+
+from app.metrics import performance_matrix
+
+
+def test_performance_matrix_matches_series_formulas():
+    rng = np.random.default_rng(7)
+    R = rng.normal(0.0004, 0.01, size=(5, 700))
+    m = performance_matrix(R, rf_ann=0.02)
+    for i, row in enumerate(R):
+        rets = pd.Series(row)
+        eq = (1 + rets).cumprod()
+        vol = rets.std() * np.sqrt(252)
+        assert np.isclose(m["vol"][i], vol)
+        assert np.isclose(m["sharpe"][i], (rets.mean() * 252 - 0.02) / vol)
+        assert np.isclose(m["sortino"][i], (rets.mean() * 252 - 0.02) / (rets[rets < 0].std() * np.sqrt(252)))
+        assert np.isclose(m["max_dd"][i], min(0.0, (eq / eq.cummax().clip(lower=1.0) - 1).min()))
+        assert np.isclose(m["cagr"][i], eq.iloc[-1] ** (252 / len(rets)) - 1)
+    flat = performance_matrix(np.zeros(10))
+    assert flat["sharpe"][0] == 0.0 and flat["max_dd"][0] == 0.0 and np.isnan(flat["calmar"][0])
@@ -0,0 +1,37 @@
+"""Tests for app/overlay.py and the overlay search built on it."""
+
+import time
+
+import numpy as np
+import pytest
+
+from app.engine import BLEngine
+from app.overlay import grid_params, grid_size
+
+
+def test_overlay_grid_matches_builtin_vol_target(synthetic_prices):
+    engine = BLEngine(synthetic_prices)
+    result = engine.run_backtest("2007-01-01", "2030-01-01", [])
+    grid = {"vol_targets": [None, 0.10, 0.15], "vol_lookbacks": [21, 63], "sma_windows": [None, 200],
+            "floors": [0.0, 0.2], "caps": [1.0]}
+    out = engine.run_overlay_grid("2007-01-01", "2030-01-01", [], grid, top=None)
+    assert out["count"] == len(grid_params(**grid)) == 20
+    sharpes = [v["sharpe"] for v in out["variants"]]
+    assert sharpes == sorted(sharpes, reverse=True)
+    # The built-in VOL_TARGET overlay is one variant of the grid.
+    builtin = next(v for v in out["variants"] if v["vol_target"] == 0.10 and v["vol_lookback"] == 21
+                   and v["sma_window"] is None and v["floor"] == 0.0)
+    assert np.isclose(builtin["total_return"], result["metrics"]["total_return"])
+    assert set(builtin["windows"]) == {"GFC 07-09", "COVID 20", "2022 bear"}
+    assert min(v["avg_exposure"] for v in out["variants"] if v["floor"] == 0.2) >= 0.2
+    assert "error" in engine.run_overlay_grid("2007-01-01", "2030-01-01", [], {"floors": [0.5], "caps": [0.4]})
+    # Oversized grids are sized, not expanded, before being rejected.
+    import pydantic
+    import main
+    with pytest.raises(pydantic.ValidationError):
+        main.OverlayGridRequest(start_date="2007-01-01", end_date="2030-01-01", views=[], caps=[1.0] * 65)
+    assert grid_size(**grid) == 20 and grid_size(vol_targets=[None, None, 0.1], floors=[0, 0.0]) == 2
+    huge = {axis: list(range(1, 101)) for axis in ("vol_targets", "vol_lookbacks", "sma_windows", "caps")}
+    t0 = time.perf_counter()
+    assert "At most" in engine.run_overlay_grid("2007-01-01", "2030-01-01", [], huge)["error"]
+    assert time.perf_counter() - t0 < 0.5
@@ -0,0 +1,39 @@
+import axios from 'axios';
+
+// Conditional requests for the API's deterministic POST endpoints.
+// Browsers only revalidate GETs on their own, so the last few responses are
+// kept in localStorage with their ETag and sent back as If-None-Match; the
+// server answers 304 (no computation, no body) while the data is unchanged.
+const STORE_KEY = 'bl-etag-cache';
+const MAX_ENTRIES = 8;
+
+const load = () => {
+  try { return JSON.parse(localStorage.getItem(STORE_KEY)) || []; } catch { return []; }
+};
+
+const entryKey = (url, body) => `${url} ${JSON.stringify(body)}`;
+
+export const cachedResponse = (url, body) => load().find(e => e.key === entryKey(url, body));
+
+export const storeResponse = (url, body, etag, data) => {
+  if (!etag) return;
+  const key = entryKey(url, body);
+  let entries = [{ key, etag, data }, ...load().filter(e => e.key !== key)].slice(0, MAX_ENTRIES);
+  // Drop the oldest entries until it fits the browser's storage quota.
+  while (entries.length) {
+    try { localStorage.setItem(STORE_KEY, JSON.stringify(entries)); return; } catch { entries = entries.slice(0, -1); }
+  }
+};
+
+// axios.post that revalidates a stored response; resolves to { data } either way.
+export const postCached = (url, body) => {
+  const hit = cachedResponse(url, body);
+  return axios.post(url, body, {
+    headers: hit ? { 'If-None-Match': hit.etag } : {},
+    validateStatus: (s) => (s >= 200 && s < 300) || s === 304,
+  }).then(res => {
+    if (res.status === 304 && hit) return { data: hit.data };
+    storeResponse(url, body, res.headers.etag, res.data);
+    return { data: res.data };
+  });
+};
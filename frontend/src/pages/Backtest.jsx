@@ -1,11 +1,15 @@
 import { useState } from 'react';
-import axios from 'axios';
 import { API_BASE } from '../config';
+import { cachedResponse, storeResponse } from '../api';
 import { LineChart, Line, AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import { Play, Activity, Calendar, Plus, TrendingUp, AlertTriangle, HelpCircle, Info } from 'lucide-react';
 
 const SECTOR_MAP = Object.keys({'XLK':1,'XLF':1,'XLE':1,'XLV':1,'XLI':1,'XLC':1,'XLP':1,'XLU':1,'XLY':1,'XLB':1,'XLRE':1});
 
+// The final curves are thinned server-side to about this many points (peaks
+// and drawdowns are kept), plenty for a chart this wide.
+const CHART_MAX_POINTS = 1000;
+
 export default function Backtest() {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState(null);
@@ -38,28 +42,84 @@ export default function Backtest() {
     const u = [...views]; u.splice(i, 1); setViews(u);
   };
 
-  const runBacktest = () => {
+  const toPoints = (data) => data.dates.map((date, i) => ({
+    date,
+    Portfolio: parseFloat(data.portfolio[i].toFixed(0)),
+    SPY: parseFloat(data.spy[i].toFixed(0))
+  }));
+
+  // Running metrics of a streamed period, in the shape of result.metrics.
+  const liveMetrics = (m) => ({
+    total_return: m.total_return ?? 0, spy_total_return: m.spy_total_return ?? 0,
+    sharpe: m.sharpe ?? 0, spy_sharpe: m.spy_sharpe ?? 0,
+    max_dd: m.max_dd ?? 0, spy_max_dd: m.spy_max_dd ?? 0,
+    volatility: m.vol ?? 0, spy_volatility: m.spy_vol ?? 0,
+  });
+
+  // Streams /simulation/backtest/stream (newline-delimited JSON events) so the
+  // equity curve grows period by period; the final "done" event carries the
+  // same result as /simulation/backtest.
+  const runBacktest = async () => {
     setLoading(true);
-    axios.post(`${API_BASE}/simulation/backtest`, {
-      start_date: startDate,
-      end_date: endDate,
-      views: views
-    })
-    .then(res => {
-      const points = res.data.dates.map((date, i) => ({
-        date,
-        Portfolio: parseFloat(res.data.portfolio[i].toFixed(0)),
-        SPY: parseFloat(res.data.spy[i].toFixed(0))
-      }));
-      setResult({ points, ...res.data });
-      setLoading(false);
-    })
-    .catch(err => {
+    setResult(null);
+    const url = `${API_BASE}/simulation/backtest/stream`;
+    const request = {
+      start_date: startDate, end_date: endDate, max_points: CHART_MAX_POINTS,
+      views: views.map(({ id, ...view }) => view),  // ids are client-side only
+    };
+    // A backtest seen before on the same data comes back as a 304.
+    const hit = cachedResponse(url, request);
+    try {
+      const res = await fetch(url, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Accept': 'application/x-ndjson',
+          ...(hit ? { 'If-None-Match': hit.etag } : {}),
+        },
+        body: JSON.stringify(request)
+      });
+      if (res.status === 304 && hit) {
+        setResult({ points: toPoints(hit.data), ...hit.data });
+        setLoading(false);
+        return;
+      }
+      if (!res.ok) {
+        const body = await res.json().catch(() => ({}));
+        throw new Error(body.detail || `HTTP ${res.status}`);
+      }
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "", points = [], warnings = [], progress = null;
+      const handle = (event) => {
+        if (event.type === "start") {
+          warnings = event.warnings || [];
+          progress = { done: 0, total: event.periods };
+        } else if (event.type === "period") {
+          points = points.concat(toPoints(event));
+          progress = { ...progress, done: event.index };
+          setResult({ partial: true, progress, points, warnings, metrics: liveMetrics(event.metrics) });
+        } else if (event.type === "done") {
+          setResult({ points: toPoints(event.result), ...event.result });
+          storeResponse(url, request, res.headers.get('ETag'), event.result);
+        } else if (event.type === "error") {
+          throw new Error(event.error);
+        }
+      };
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.filter(l => l.trim()).forEach(l => handle(JSON.parse(l)));
+      }
+      if (buffer.trim()) handle(JSON.parse(buffer));
+    } catch (err) {
       console.error(err);
-      const detail = err?.response?.data?.detail;
-      alert(detail ? `Backtest error: ${detail}` : "Error running backtest.");
-      setLoading(false);
-    });
+      alert(err.message ? `Backtest error: ${err.message}` : "Error running backtest.");
+    }
+    setLoading(false);
   };
 
   const ddPoints = result
@@ -146,7 +206,9 @@ export default function Backtest() {
       </div>
 
       <button onClick={runBacktest} disabled={loading} className="w-full bg-blue-600 hover:bg-blue-500 text-white font-bold py-4 rounded-xl shadow-lg flex items-center justify-center gap-3 transition">
-        {loading ? "Running Simulation..." : <><Play size={20} /> Run Backtest Engine</>}
+        {loading ? (result?.partial && result.progress.total
+          ? `Running Simulation... ${result.progress.done}/${result.progress.total} periods`
+          : "Running Simulation...") : <><Play size={20} /> Run Backtest Engine</>}
       </button>
 
       {/* RESULTS */}
@@ -226,6 +288,7 @@ export default function Backtest() {
           </div>
 
           {/* YEARLY TABLE */}
+          {result.yearly_table && (
           <div className="bg-slate-800 rounded-xl border border-slate-700 overflow-hidden">
              <div className="p-4 border-b border-slate-700 font-bold text-white">Yearly Performance</div>
              <table className="w-full text-sm text-left text-slate-300">
@@ -255,6 +318,7 @@ export default function Backtest() {
                </tbody>
              </table>
           </div>
+          )}
         </div>
       )}
     </div>
@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react'
 import axios from 'axios'
 import { API_BASE } from '../config'
+import { postCached } from '../api'
 import {
   PieChart, Pie, Cell, Tooltip, ResponsiveContainer, Legend,
   AreaChart, Area, Line, XAxis, YAxis, CartesianGrid, BarChart, Bar
@@ -39,16 +40,25 @@ export default function Dashboard() {
   const [pairView, setPairView] = useState({ assetA: 'XLK', assetB: 'XLE', diff: 0.05, confidence: 0.50 });
   const [error, setError] = useState(null);
   const [mcLoading, setMcLoading] = useState(false);
+  const [session, setSession] = useState(null);
 
   const today = new Date().toISOString().split("T")[0];
 
   useEffect(() => { runScenario(); }, []);
 
+  // The server keeps the prior for a date in a session, so re-running with
+  // edited views only updates the posterior instead of rebuilding everything.
+  const openSession = () => axios.post(`${API_BASE}/recommendation/session`, { views: scenarioViews, date: targetDate || null })
+    .then(res => { setSession({ id: res.data.session_id, date: targetDate }); return res; });
+
   const runScenario = () => {
-    const payload = { views: scenarioViews, date: targetDate || null };
     setLoading(true);
     setError(null);
-    axios.post(`${API_BASE}/recommendation/scenario`, payload)
+    const request = session && session.date === targetDate
+      ? axios.put(`${API_BASE}/recommendation/session/${session.id}/views`, scenarioViews)
+          .catch(err => (err.response && err.response.status === 404 ? openSession() : Promise.reject(err)))
+      : openSession();
+    request
       .then(res => { setData(res.data); setLoading(false); setMcData(null); })
       .catch(err => {
         console.error(err);
@@ -60,7 +70,7 @@ export default function Dashboard() {
   const runMonteCarlo = () => {
     if (!data) return;
     setMcLoading(true);
-    axios.post(`${API_BASE}/simulation/monte_carlo`, {
+    postCached(`${API_BASE}/simulation/monte_carlo`, {
       mu: data.metrics.expected_return,
       sigma: data.metrics.volatility,
       days: 252